@@ -0,0 +1,261 @@
+import shlex
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CamstreamConfigCache:
+    """
+    In-memory cache of the camera stream config files on the robot.
+    All configs are fetched in one remote command. Configs whose remote mtime matches the
+    cached copy are not sent again.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # name -> (remote mtime or None if unknown, config text)
+        self.__configs: Dict[str, Tuple[Optional[int], str]] = {}
+
+    def fetch_command(self, directory: str) -> str:
+        # Shell command that prints a framed record for each config file in directory
+        #   @@same <mtime> <name>               (cached copy is current)
+        #   @@file <mtime> <size> <name>\n<data> (size bytes of data follow the header)
+        with self.__lock:
+            known = "/".join("{0}:{1}".format(m, n) for n, (m, _) in self.__configs.items() if m is not None)
+        return (
+            "cd {dir} 2>/dev/null || exit 0; "
+            "known={known}; "
+            "for f in *.txt; do "
+                "[ -f \"$f\" ] || continue; "
+                "m=$(stat -c %Y \"$f\"); "
+                "case \"/$known/\" in "
+                    "*\"/$m:${{f%.txt}}/\"*) printf '@@same %s %s\\n' \"$m\" \"${{f%.txt}}\" ;; "
+                    "*) c=$(cat \"$f\"; echo x); c=${{c%x}}; "
+                        "printf '@@file %s %s %s\\n%s' \"$m\" \"$(printf %s \"$c\" | wc -c)\" \"${{f%.txt}}\" \"$c\" ;; "
+                "esac; "
+            "done"
+        ).format(dir=shlex.quote(directory), known=shlex.quote(known))
+
+    def apply_fetch_output(self, data: bytes) -> List[str]:
+        # Update the cache from the output of fetch_command. Returns sorted names of all configs.
+        fetched: Dict[str, Tuple[Optional[int], str]] = {}
+        same: List[str] = []
+        pos = 0
+        while pos < len(data):
+            end = data.find(b"\n", pos)
+            if end == -1:
+                break
+            header = data[pos:end].decode(errors="replace")
+            pos = end + 1
+            if header.startswith("@@same "):
+                _, mtime, name = header.split(" ", 2)
+                same.append(name)
+            elif header.startswith("@@file "):
+                _, mtime, size, name = header.split(" ", 3)
+                size = int(size.strip())
+                fetched[name] = (int(mtime), data[pos:pos+size].decode(errors="replace"))
+                pos += size
+
+        with self.__lock:
+            configs = {}
+            for name in same:
+                if name in self.__configs:
+                    configs[name] = self.__configs[name]
+            configs.update(fetched)
+            self.__configs = configs
+            return sorted(configs.keys())
+
+    def get(self, name: str) -> Optional[str]:
+        with self.__lock:
+            entry = self.__configs.get(name, None)
+        return None if entry is None else entry[1]
+
+    def put(self, name: str, config: str):
+        # After writing a config. Remote mtime is unknown, so it is fetched again on the next refresh.
+        with self.__lock:
+            self.__configs[name] = (None, config)
+
+    def remove(self, name: str):
+        with self.__lock:
+            self.__configs.pop(name, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__configs.clear()
+
+
+class CamstreamOption:
+    def __init__(self, name: str, kind: type):
+        # kind is str, int, float, or bool (bool options are flags without a value)
+        self.name = name
+        self.kind = kind
+
+
+# All options understood by the ArPiRobot-Camstream service (in the order they are written)
+CAMSTREAM_OPTIONS = [
+    CamstreamOption("--driver", str),
+    CamstreamOption("--device", str),
+    CamstreamOption("--iomode", str),
+    CamstreamOption("--vconvert", bool),
+    CamstreamOption("--width", int),
+    CamstreamOption("--height", int),
+    CamstreamOption("--framerate", int),
+    CamstreamOption("--vflip", bool),
+    CamstreamOption("--hflip", bool),
+    CamstreamOption("--rotate", int),
+    CamstreamOption("--gain", float),
+    CamstreamOption("--format", str),
+    CamstreamOption("--h264encoder", str),
+    CamstreamOption("--profile", str),
+    CamstreamOption("--bitrate", int),
+    CamstreamOption("--quality", int),
+    CamstreamOption("--netmode", str),
+    CamstreamOption("--address", str),
+    CamstreamOption("--port", int),
+    CamstreamOption("--rtspkey", str),
+]
+CAMSTREAM_OPTIONS_BY_NAME = {o.name: o for o in CAMSTREAM_OPTIONS}
+
+# Encoders using the Pi's hardware H.264 block
+HARDWARE_H264_ENCODERS = ["omx", "libav-omx"]
+
+# H.264 level 4.1 limits (highest level supported by the Pi's hardware encoder; 1080p30)
+H264_MAX_FRAME_MACROBLOCKS = 8192
+H264_MAX_MACROBLOCKS_PER_SEC = 245760
+HARDWARE_H264_MAX_BITRATE = 25000000
+
+
+class CamstreamConfig:
+    """
+    Typed model of a camera stream config file.
+    Values are kept as the text they were read as, so a config that is parsed and
+    written again without changes is identical. Unknown arguments are preserved.
+    """
+    def __init__(self):
+        # option name -> value text ("" for flags). Order is the order options were read / set.
+        self.__values: Dict[str, str] = {}
+        self.__extra: List[str] = []
+
+    @staticmethod
+    def parse(text: str) -> 'CamstreamConfig':
+        # Single pass over whitespace separated tokens
+        config = CamstreamConfig()
+        tokens = text.split()
+        i = 0
+        while i < len(tokens):
+            option = CAMSTREAM_OPTIONS_BY_NAME.get(tokens[i], None)
+            if option is None:
+                config.__extra.append(tokens[i])
+            elif option.kind is bool:
+                config.__values[option.name] = ""
+            elif i + 1 < len(tokens) and tokens[i+1] not in CAMSTREAM_OPTIONS_BY_NAME:
+                config.__values[option.name] = tokens[i+1]
+                i += 1
+            i += 1
+        return config
+
+    def serialize(self) -> str:
+        lines = []
+        for name, value in self.__values.items():
+            lines.append(name if CAMSTREAM_OPTIONS_BY_NAME[name].kind is bool else "{0} {1}".format(name, value))
+        if len(self.__extra) > 0:
+            lines.append(" ".join(self.__extra))
+        return "".join("{0}\n".format(l) for l in lines)
+
+    def copy(self) -> 'CamstreamConfig':
+        config = CamstreamConfig()
+        config.__values = dict(self.__values)
+        config.__extra = list(self.__extra)
+        return config
+
+    def get(self, name: str, default: Any = None) -> Any:
+        # Typed value of an option. Returns default if not set or not valid for the option's type.
+        option = CAMSTREAM_OPTIONS_BY_NAME[name]
+        if option.kind is bool:
+            return name in self.__values
+        if name not in self.__values:
+            return default
+        try:
+            return option.kind(self.__values[name])
+        except ValueError:
+            return default
+
+    def get_text(self, name: str, default: str = "") -> str:
+        return self.__values.get(name, default)
+
+    def set(self, name: str, value: Any):
+        # None, False, and empty strings remove the option
+        option = CAMSTREAM_OPTIONS_BY_NAME[name]
+        if value is None or value is False or (isinstance(value, str) and value.strip() == ""):
+            self.__values.pop(name, None)
+        elif option.kind is bool:
+            self.__values[name] = ""
+        else:
+            self.__values[name] = str(value).strip()
+
+    def diff(self, other: 'CamstreamConfig') -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        # Options that differ: name -> (value in self, value in other). None if not set.
+        changes = {}
+        for name in CAMSTREAM_OPTIONS_BY_NAME:
+            mine = self.__values.get(name, None)
+            theirs = other.__values.get(name, None)
+            if mine != theirs:
+                changes[name] = (mine, theirs)
+        if self.__extra != other.__extra:
+            changes["extra"] = (" ".join(self.__extra), " ".join(other.__extra))
+        return changes
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CamstreamConfig):
+            return NotImplemented
+        return len(self.diff(other)) == 0
+
+    def stream_url(self, robot_address: str) -> str:
+        # URL a player on this PC uses to receive the stream
+        netmode = self.get_text("--netmode", "rtsp")
+        if netmode == "rtsp":
+            return "rtsp://{0}:{1}/{2}".format(robot_address, self.get("--port", 8554), self.get_text("--rtspkey", "stream"))
+        elif netmode == "tcp":
+            return "tcp://{0}:{1}".format(robot_address, self.get("--port", 5008))
+        else:
+            # UDP streams are sent to this PC
+            return "udp://127.0.0.1:{0}".format(self.get("--port", 5008))
+
+    def validate(self) -> List[str]:
+        # Returns a list of problems that would stop the stream from starting (empty if valid)
+        errors = []
+        for name, value in self.__values.items():
+            kind = CAMSTREAM_OPTIONS_BY_NAME[name].kind
+            if kind is not bool and self.get(name) is None:
+                errors.append("{0} must be a number (got '{1}').".format(name, value))
+
+        width = self.get("--width")
+        height = self.get("--height")
+        framerate = self.get("--framerate")
+        bitrate = self.get("--bitrate")
+        for name, value in [("--width", width), ("--height", height), ("--framerate", framerate), ("--bitrate", bitrate)]:
+            if value is not None and value <= 0:
+                errors.append("{0} must be greater than zero.".format(name))
+        if self.get("--rotate", 0) not in [0, 90, 180, 270]:
+            errors.append("--rotate must be 0, 90, 180, or 270.")
+        port = self.get("--port")
+        if port is not None and (port < 0 or port > 65535):
+            errors.append("--port must be between 0 and 65535.")
+        if self.get_text("--netmode", "rtsp") not in ["tcp", "udp", "rtsp"]:
+            errors.append("--netmode must be tcp, udp, or rtsp.")
+        if self.get_text("--format", "h264") not in ["h264", "mjpeg"]:
+            errors.append("--format must be h264 or mjpeg.")
+        if len(errors) > 0:
+            return errors
+
+        if self.get_text("--format", "h264") == "h264" and width is not None and height is not None:
+            if width % 2 != 0 or height % 2 != 0:
+                errors.append("Width and height must be even numbers for h264 streams.")
+            if self.get_text("--h264encoder") in HARDWARE_H264_ENCODERS:
+                macroblocks = ((width + 15) // 16) * ((height + 15) // 16)
+                if macroblocks > H264_MAX_FRAME_MACROBLOCKS:
+                    errors.append("{0}x{1} is larger than the hardware h264 encoder supports (max 1920x1080).".format(width, height))
+                elif framerate is not None and macroblocks * framerate > H264_MAX_MACROBLOCKS_PER_SEC:
+                    max_fps = H264_MAX_MACROBLOCKS_PER_SEC // macroblocks
+                    errors.append("The hardware h264 encoder supports at most {0} fps at {1}x{2}.".format(max_fps, width, height))
+                if bitrate is not None and bitrate > HARDWARE_H264_MAX_BITRATE:
+                    errors.append("The hardware h264 encoder supports bitrates up to {0} bits / sec.".format(HARDWARE_H264_MAX_BITRATE))
+        return errors
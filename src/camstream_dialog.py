@@ -3,7 +3,7 @@ from PySide6.QtWidgets import QDialog, QMessageBox
 from PySide6.QtGui import QIntValidator, QDoubleValidator, QRegularExpressionValidator
 from ui_camstream_dialog import Ui_CamstreamDialog
 from util import settings_manager
-import re
+from camstream_config import CamstreamConfig
 
 class CamstreamDialog(QDialog):
     def __init__(self, parent = None) -> None:
@@ -12,6 +12,9 @@ class CamstreamDialog(QDialog):
         self.ui = Ui_CamstreamDialog()
         self.ui.setupUi(self)
 
+        # Config being edited. Options not shown in the UI (and unknown arguments) are kept as read.
+        self.model = CamstreamConfig()
+
         self.ui.txt_width.setValidator(QIntValidator(0, 7680, self))
         self.ui.txt_height.setValidator(QIntValidator(0, 4320, self))
         self.ui.txt_framerate.setValidator(QIntValidator(0, 360, self))
@@ -28,8 +31,19 @@ class CamstreamDialog(QDialog):
             dialog.setWindowTitle(self.tr("Configuration not Named"))
             dialog.setStandardButtons(QMessageBox.Ok)
             dialog.exec()
-        else:
-            return super().accept()
+            return
+
+        # Catch settings the encoder on the Pi can't handle before they are saved
+        errors = self.get_config().validate()
+        if len(errors) > 0:
+            dialog = QMessageBox(parent=self)
+            dialog.setIcon(QMessageBox.Warning)
+            dialog.setText("\n".join(errors))
+            dialog.setWindowTitle(self.tr("Configuration Invalid"))
+            dialog.setStandardButtons(QMessageBox.Ok)
+            dialog.exec()
+            return
+        return super().accept()
     
     def disable_edit_config_name(self):
         self.ui.txt_config_name.setEnabled(False)
@@ -42,52 +56,23 @@ class CamstreamDialog(QDialog):
 
     def from_config(self, config: str):
         # Parse a config file and populate the UI from it
-        config = re.sub("\s", " ", config)
-        items = config.split(" ")
-        vflip = False
-        hflip = False
-        self.ui.combox_vconvert.setCurrentText(self.tr("Disabled"))
-        for i in range(len(items)):
-            if items[i] == "--driver":
-                self.ui.combox_driver.setCurrentText(items[i+1])
-            elif items[i] == "--device":
-                self.ui.txt_device.setText(items[i+1])
-            elif items[i] == "--iomode":
-                self.ui.combox_iomode.setCurrentText(items[i+1])
-            elif items[i] == "--vconvert":
-                self.ui.combox_vconvert.setCurrentText(self.tr("Enabled"))
-            elif items[i] == "--width":
-                self.ui.txt_width.setText(items[i+1])
-            elif items[i] == "--height":
-                self.ui.txt_height.setText(items[i+1])
-            elif items[i] == "--framerate":
-                self.ui.txt_framerate.setText(items[i+1])
-            elif items[i] == "--vflip":
-                vflip = True
-            elif items[i] == "--hflip":
-                hflip = True
-            elif items[i] == "--rotate":
-                self.ui.combox_rotate.setCurrentText("{0}°".format(items[i+1]))
-            elif items[i] == "--gain":
-                self.ui.txt_gain.setText(items[i+1])
-            elif items[i] == "--format":
-                self.ui.combox_format.setCurrentText(items[i+1])
-            elif items[i] == "--h264encoder":
-                self.ui.combox_encoder.setCurrentText(items[i+1])
-            elif items[i] == "--profile":
-                self.ui.combox_profile.setCurrentText(items[i+1])
-            elif items[i] == "--bitrate":
-                self.ui.txt_bitrate.setText(items[i+1])
-            elif items[i] == "--quality":
-                self.ui.txt_quality.setText(items[i+1])
-            elif items[i] == "--netmode":
-                self.ui.combox_netmode.setCurrentText(items[i+1])
-            elif items[i] == "--address":
-                self.ui.txt_address.setText(items[i+1])
-            elif items[i] == "--port":
-                self.ui.txt_port.setText(items[i+1])
-            elif items[i] == "--rtspkey":
-                self.ui.txt_rtspkey.setText(items[i+1])
+        model = CamstreamConfig.parse(config)
+        self.model = model
+        self.ui.combox_vconvert.setCurrentText(self.tr("Enabled") if model.get("--vconvert") else self.tr("Disabled"))
+        for option, combox in [("--driver", self.ui.combox_driver), ("--iomode", self.ui.combox_iomode), ("--format", self.ui.combox_format),
+                ("--h264encoder", self.ui.combox_encoder), ("--profile", self.ui.combox_profile), ("--netmode", self.ui.combox_netmode)]:
+            if model.get_text(option) != "":
+                combox.setCurrentText(model.get_text(option))
+        for option, txt in [("--device", self.ui.txt_device), ("--width", self.ui.txt_width), ("--height", self.ui.txt_height),
+                ("--framerate", self.ui.txt_framerate), ("--gain", self.ui.txt_gain), ("--bitrate", self.ui.txt_bitrate),
+                ("--quality", self.ui.txt_quality), ("--address", self.ui.txt_address), ("--port", self.ui.txt_port),
+                ("--rtspkey", self.ui.txt_rtspkey)]:
+            if model.get_text(option) != "":
+                txt.setText(model.get_text(option))
+        if model.get_text("--rotate") != "":
+            self.ui.combox_rotate.setCurrentText("{0}°".format(model.get_text("--rotate")))
+        vflip = model.get("--vflip")
+        hflip = model.get("--hflip")
         if not vflip and not hflip:
             self.ui.combox_flip.setCurrentText("None")
         elif vflip and not hflip:
@@ -97,55 +82,33 @@ class CamstreamDialog(QDialog):
         else:
             self.ui.combox_flip.setCurrentText("Both")
 
-    def to_config(self) -> str:
-        # Converts the settings from the UI into a config file for the ArPiRobot-Camstream service
+    def get_config(self) -> CamstreamConfig:
+        # Converts the settings from the UI into a config for the ArPiRobot-Camstream service
+        # (applied on top of the config read by from_config)
         flip_txt = self.ui.combox_flip.currentText()
-        vflip = flip_txt == self.tr("Vertical") or flip_txt == self.tr("Both")
-        hflip = flip_txt == self.tr("Horizontal") or flip_txt == self.tr("Both")
-        config = (
-            "--driver {driver}\n"
-            "--device {device}\n"
-            "--iomode {iomode}\n"
-            "{vconvert}\n"
-            "--width {width}\n"
-            "--height {height}\n"
-            "--framerate {framerate}\n"
-            "{vflip}\n"
-            "{hflip}\n"
-            "--rotate {rotation}\n"
-            "--gain {gain}\n"
-            "--format {format}\n"
-            "--h264encoder {encoder}\n"
-            "--profile {profile}\n"
-            "--bitrate {bitrate}\n"
-            "--quality {quality}\n"
-            "--netmode {netmode}\n"
-            "--address {address}\n"
-            "--port {port}\n"
-            "--rtspkey {rtspkey}\n"
-        ).format(
-            driver = self.ui.combox_driver.currentText(),
-            device = self.ui.txt_device.text(),
-            iomode = self.ui.combox_iomode.currentText(),
-            vconvert = "--vconvert" if self.ui.combox_vconvert.currentText() == self.tr("Enabled") else "",
-            width = self.ui.txt_width.text(),
-            height = self.ui.txt_height.text(),
-            framerate = self.ui.txt_framerate.text(),
-            vflip = "--vflip" if vflip else "",
-            hflip = "--hflip" if hflip else "",
-            rotation = self.ui.combox_rotate.currentText().replace("°", ""),
-            gain = self.ui.txt_gain.text(),
-            format = self.ui.combox_format.currentText(),
-            encoder = self.ui.combox_encoder.currentText(),
-            profile = self.ui.combox_profile.currentText(),
-            bitrate = self.ui.txt_bitrate.text(),
-            quality = self.ui.txt_quality.text(),
-            netmode = self.ui.combox_netmode.currentText(),
-            address = self.ui.txt_address.text(),
-            port = self.ui.txt_port.text(),
-            rtspkey = self.ui.txt_rtspkey.text()
-        )
-
-        # Remove blank lines
-        return re.sub(r"(?<=\n)\s+", "", config, re.MULTILINE)
+        model = self.model.copy()
+        model.set("--driver", self.ui.combox_driver.currentText())
+        model.set("--device", self.ui.txt_device.text())
+        model.set("--iomode", self.ui.combox_iomode.currentText())
+        model.set("--vconvert", self.ui.combox_vconvert.currentText() == self.tr("Enabled"))
+        model.set("--width", self.ui.txt_width.text())
+        model.set("--height", self.ui.txt_height.text())
+        model.set("--framerate", self.ui.txt_framerate.text())
+        model.set("--vflip", flip_txt == self.tr("Vertical") or flip_txt == self.tr("Both"))
+        model.set("--hflip", flip_txt == self.tr("Horizontal") or flip_txt == self.tr("Both"))
+        model.set("--rotate", self.ui.combox_rotate.currentText().replace("°", ""))
+        model.set("--gain", self.ui.txt_gain.text())
+        model.set("--format", self.ui.combox_format.currentText())
+        model.set("--h264encoder", self.ui.combox_encoder.currentText())
+        model.set("--profile", self.ui.combox_profile.currentText())
+        model.set("--bitrate", self.ui.txt_bitrate.text())
+        model.set("--quality", self.ui.txt_quality.text())
+        model.set("--netmode", self.ui.combox_netmode.currentText())
+        model.set("--address", self.ui.txt_address.text())
+        model.set("--port", self.ui.txt_port.text())
+        model.set("--rtspkey", self.ui.txt_rtspkey.text())
+        return model
 
+    def to_config(self) -> str:
+        # Converts the settings from the UI into a config file for the ArPiRobot-Camstream service
+        return self.get_config().serialize()
@@ -0,0 +1,113 @@
+import os
+import shlex
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+class DeployPlan:
+    """
+    Files to upload for a deploy. Built before anything on the robot is changed so the
+    total size is known up front.
+    """
+    def __init__(self, remote_root: str):
+        self.remote_root = remote_root.rstrip("/")
+        # remote file -> (local file, size)
+        self.__files: Dict[str, Tuple[str, int]] = {}
+        self.__directories = set()
+
+    def add_file(self, local_file: str, remote_dir: str):
+        # A remote file matched more than once is only uploaded once (the last match is used)
+        remote_file = "{0}/{1}".format(remote_dir.rstrip("/"), os.path.basename(local_file))
+        self.__directories.add(remote_dir.rstrip("/"))
+        self.__files[remote_file] = (local_file, os.path.getsize(local_file))
+
+    def add_directory(self, local_dir: str, remote_dir: str):
+        # The local directory is uploaded (recursively) into remote_dir
+        local_dir = local_dir.replace("\\", "/").rstrip("/")
+        dest = "{0}/{1}".format(remote_dir.rstrip("/"), os.path.basename(local_dir))
+        self.__directories.add(dest)
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            rel = os.path.relpath(root, local_dir).replace("\\", "/")
+            remote_root = dest if rel == "." else "{0}/{1}".format(dest, rel)
+            self.__directories.add(remote_root)
+            for file in sorted(files):
+                self.add_file(os.path.join(root, file), remote_root)
+
+    @property
+    def files(self) -> List[Tuple[str, str, int]]:
+        # (local file, remote file, size) in the order they were added
+        return [(local, remote, size) for remote, (local, size) in self.__files.items()]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self.__files.values())
+
+    def prepare_command(self) -> str:
+        # Shell command that creates an empty remote root and every directory the files are uploaded to
+        dirs = sorted(self.__directories | {self.remote_root})
+        return "rm -rf {0}; mkdir -p {1}".format(shlex.quote(self.remote_root), " ".join(shlex.quote(d) for d in dirs))
+
+
+# Called with (bytes done, bytes total, bytes / sec or None, seconds remaining or None, current file)
+TransferCallback = Callable[[int, int, Optional[float], Optional[float], str], None]
+
+
+class TransferProgress:
+    """
+    Tracks progress of uploading a known number of bytes. Callbacks are rate limited so
+    per-packet transfer callbacks don't flood the UI. Speed is averaged over a sliding window.
+    """
+    def __init__(self, total: int, callback: TransferCallback, interval: float = 0.2, window: float = 3.0):
+        self.__total = total
+        self.__callback = callback
+        self.__interval = interval
+        self.__window = window
+        self.__samples: Deque[Tuple[float, int]] = deque()
+        self.__base = 0
+        self.__done = 0
+        self.__name = ""
+        self.__last = 0.0
+
+    def start_file(self, name: str, size: int):
+        # Bytes of the previous file are counted as done
+        self.__base = self.__done
+        self.__name = name
+        self.__report(force=True)
+
+    def update(self, sent: int, size: int):
+        # paramiko put() callback (bytes of current file sent, size of current file)
+        self.__done = self.__base + sent
+        self.__report()
+
+    def __report(self, force: bool = False):
+        now = time.monotonic()
+        self.__samples.append((now, self.__done))
+        while len(self.__samples) > 2 and now - self.__samples[0][0] > self.__window:
+            self.__samples.popleft()
+        if not force and now - self.__last < self.__interval:
+            return
+        self.__last = now
+
+        rate = None
+        eta = None
+        t0, d0 = self.__samples[0]
+        if now - t0 > 0.5:
+            rate = (self.__done - d0) / (now - t0)
+            if rate > 0:
+                eta = (self.__total - self.__done) / rate
+        self.__callback(self.__done, self.__total, rate, eta, self.__name)
+
+
+def format_bytes(count: float) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if count < 1024:
+            return "{0:.0f} {1}".format(count, unit) if unit == "B" else "{0:.1f} {1}".format(count, unit)
+        count /= 1024
+    return "{0:.1f} GB".format(count)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds + 0.5)
+    return "{0}:{1:02d}".format(seconds // 60, seconds % 60)
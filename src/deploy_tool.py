@@ -1,80 +1,88 @@
-
-from ast import Tuple
+from __future__ import annotations
 from genericpath import isdir
 import socket
-import re
+import threading
 from threading import local
 import traceback
-from typing import Any, Callable, List, Optional
-from PySide6.QtCore import QDir, QFile, QFileInfo, QIODevice, QObject, QRegularExpression, QRegularExpressionMatch, QRunnable, QTextStream, QThreadPool, QTimer, Qt, Signal
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from PySide6.QtCore import QDir, QFile, QIODevice, QObject, QRegularExpression, QRegularExpressionMatch, QTimer, Qt, Signal
 from PySide6.QtGui import QPalette, QShowEvent, QCloseEvent, QGuiApplication, QIntValidator, QTextCursor, QRegularExpressionValidator, QValidator, QFont
-from PySide6.QtWidgets import QDialog, QFileDialog, QMainWindow, QMessageBox, QProgressDialog, QApplication, QWidget
-from paramiko.pkey import PKey
-from paramiko.sftp import SFTPError
-from paramiko.sftp_client import SFTPClient
-from camstream_dialog import CamstreamDialog
-from log_dialog import LogDialog
-from playstream_dialog import PlayStreamDialog
+from PySide6.QtWidgets import QDialog, QFileDialog, QInputDialog, QLineEdit, QMainWindow, QMessageBox, QProgressDialog, QApplication, QTableWidgetItem, QWidget
+from camstream_config import CamstreamConfig, CamstreamConfigCache
 from ui_deploy_tool import Ui_DeployTool
-from about_dialog import AboutDialog
-from settings_dialog import SettingsDialog
-from paramiko.client import SSHClient, MissingHostKeyPolicy
-from paramiko.ssh_exception import SSHException
-from util import settings_manager, WIFI_COUNTRY_CODES
-from zipfile import ZipFile
+from util import settings_manager, ConnectionProfile, WIFI_COUNTRY_CODES
+from version_cache import version_cache
+from path_index import path_index
+import services
+from network_config import NetworkConfig
+import network_config
+import wifi_survey
+from link_probe import LinkHistory, LinkSample, RttEstimator, measure_rtt, probe_link, OP_COMMAND, OP_CONNECT, OP_PROGRAM, OP_QUERY, OP_SCAN, OP_UPDATE
+from manifest import ManifestBuilder, VerifyResult, verify_tree
+from deploy_plan import DeployPlan, TransferProgress, format_bytes, format_duration
+from writable import WritableSession, WritableState, WritableStateCache, MOUNT_WATCH_COMMAND, parse_mount_options
+from tasks import Task, TaskExecutor, current_task, report_progress, DEFAULT_QUEUE, FETCH_QUEUE, SSH_QUEUE, STREAM_QUEUE
+from tab_cache import TabDataCache
+import tab_cache
 import time
 import os
 import subprocess
-import sys
 import shutil
+import shlex
 import json
 import pathlib
 import platform
-from enum import Enum, auto
+import random
 
+# Dialogs, paramiko, and the installer (tarfile / zipfile) are imported when first used to keep startup fast
+if TYPE_CHECKING:
+    from paramiko.client import SSHClient
+    from paramiko.sftp_client import SFTPClient
+    from playstream_dialog import PlayStreamDialog
+    from latency_dialog import LatencyDialog
 
 
-class DTProgressDialog(QProgressDialog):
-    def __init__(self, parent: Optional[QWidget]):
-        super().__init__(parent=parent)
-        self.setCancelButton(None)
-    
-    def closeEvent(self, event: QCloseEvent) -> None:
-        event.ignore()
+class ParamikoNotLoaded(Exception):
+    # Stands in for paramiko's exception types until paramiko is loaded
+    # Nothing can raise paramiko exceptions before then, so except clauses using these match nothing
+    pass
 
 
-class WritableState(Enum):
-    Unknown = auto()
-    Readonly = auto()
-    ReadWrite = auto()
+SSHException = ParamikoNotLoaded
+SFTPError = ParamikoNotLoaded
+BadHostKeyException = ParamikoNotLoaded
+AuthenticationException = ParamikoNotLoaded
+paramiko_lock = threading.Lock()
 
+# Program log on the robot (shown on the log tab)
+PROGRAM_LOG_FILE = "/tmp/arpirobot_program.log"
 
-class Task(QRunnable, QObject):
-    task_complete = Signal(object)
-    task_exception = Signal(Exception)
-    def __init__(self, parent, target: Callable, *args, **kwargs):
-        QRunnable.__init__(self)
-        QObject.__init__(self, parent=parent)
-        self.__target = target
-        self.__args = args
-        self.__kwargs = kwargs
+# Printed before the log when following it has to start over (see log_command)
+LOG_RESET_MARKER = "@@log-reset"
 
-        self.setAutoDelete(True)
-    
-    def run(self):
-        try:
-            res = self.__target(*self.__args, **self.__kwargs)
-            self.task_complete.emit(res)
-        except Exception as e:
-            try:
-                self.task_exception.emit(e)
-            except:
-                pass
+# Automatic reconnect: first delay (seconds), max delay (doubles after each failed attempt), and how long to keep trying
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 8.0
+RECONNECT_GIVE_UP = 120.0
 
+# Keepalive interval (seconds) of a pre-warmed connection waiting to be used
+PREWARM_KEEPALIVE = 15
+
+def load_paramiko():
+    # Import paramiko (if not already done). Can call from any thread.
+    global SSHException, SFTPError, BadHostKeyException, AuthenticationException
+    with paramiko_lock:
+        from ssh_support import SSHException, SFTPError, BadHostKeyException, AuthenticationException
 
-class AcceptMissingKeyPolicy(MissingHostKeyPolicy):
-    def missing_host_key(self, client: SSHClient, hostname: str, key: PKey):
-        pass
+
+
+class DTProgressDialog(QProgressDialog):
+    def __init__(self, parent: Optional[QWidget]):
+        super().__init__(parent=parent)
+        self.setCancelButton(None)
+    
+    def closeEvent(self, event: QCloseEvent) -> None:
+        event.ignore()
 
 
 class WifiPassValidator(QRegularExpressionValidator):
@@ -135,8 +143,9 @@ class DeployToolWindow(QMainWindow):
     append_log_sig = Signal(str)
     set_versions_sig = Signal(str, str, str)
     update_status_sig = Signal(float, int, int, WritableState)
-    update_net_info_sig = Signal(str, str, str, str, str)
     clear_robot_log_sig = Signal()
+    update_service_states_sig = Signal(object)
+    run_on_ssh_queue_sig = Signal(object)
 
     ############################################################################
     # General UI & Helper functions
@@ -156,41 +165,86 @@ class DeployToolWindow(QMainWindow):
             self.setWindowTitle(self.windowTitle() + " v" + ver)
         version_file.close()
 
-        self.ui.txt_wifi_ssid.setValidator(WifiSsidValidator(self))
-        self.ui.txt_wifi_pass.setValidator(WifiPskValidator(self))
-        self.ui.txt_wifi_country.setValidator(WifiCountryValidator(self))
-        self.ui.txt_wifi_channel.setValidator(QIntValidator(1, 14, self))
-
         # SSH setup and initial state
-        self.ssh: SSHClient = SSHClient()
-        self.ssh.set_missing_host_key_policy(AcceptMissingKeyPolicy())
+        # The client is created on first connect (paramiko is imported in the background after startup)
+        self.ssh: Optional[SSHClient] = None
         self.ssh_check_timer = QTimer()
         self.ssh_connected = False
 
+        # Automatic reconnect after the connection is lost
+        self.reconnecting = False
+        self.reconnect_attempt = 0
+        self.reconnect_started = 0.0
+        self.reconnect_timer = QTimer()
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.attempt_reconnect)
+
+        # Bytes of the program log shown so far (the log is resumed from here after reconnecting)
+        self.log_offset = 0
+
+        # Connection opened in the background at startup: ((address, user, password), client)
+        self.prewarm_lock = threading.Lock()
+        self.prewarmed: Optional[Tuple[Tuple[str, str, str], SSHClient]] = None
+
         # Populate connection fields with default information
         self.ui.txt_address.setText(settings_manager.robot_address)
         self.ui.txt_username.setText(settings_manager.robot_user)
         self.ui.txt_password.setText("arpirobot")
-        self.ui.cbx_longer_timeouts.setChecked(settings_manager.longer_timeouts)
+        self.ui.cbx_auto_reconnect.setChecked(settings_manager.auto_reconnect)
+
+        # Round trip time to the robot (timeouts are computed from this)
+        self.rtt = RttEstimator()
+        self.rtt.restore(settings_manager.rtt_estimate)
 
         # Progress dialog (shared between tasks)
         self.pdialog = DTProgressDialog(parent=self)
         self.pdialog.cancel()
         self.pdialog.hide()
 
-        # Active background tasks
-        self.tasks: List[Task] = []
+        # Background tasks
+        self.executor = TaskExecutor(self)
 
         # Active dialogs for playing streams
         self.camstreams: List[PlayStreamDialog] = []
+        self.latency_dialogs: List[LatencyDialog] = []
+
+        # Shared window during which the robot's filesystem is writable (see WritableSession)
+        self.writable = WritableSession(self.do_writable_check, self.do_make_robot_writable, self.do_make_robot_readonly,
+            self.run_on_ssh_queue)
+
+        # Last known writable state (kept up to date by the mount watcher while connected)
+        self.writable_state = WritableStateCache()
+
+        # Link tests run on the current connection
+        self.link_history = LinkHistory()
+
+        # Network settings last read from (or applied to) the connected robot
+        self.network_config = NetworkConfig()
+
+        # Network settings last shown on the network tab (fields differing from these were edited by the user)
+        self.network_config_shown = NetworkConfig()
+
+        # Robot data shown on tabs. Read after connecting and refreshed in the background when stale.
+        self.tab_data = TabDataCache()
+
+        # Tab data key -> (read data (runs on fetch queue), show data (UI thread))
+        self.tab_data_sources: Dict[str, Tuple[Callable[[], Any], Callable[[Any], None]]] = {
+            tab_cache.VERSIONS: (self.do_fetch_versions, self.show_versions),
+            tab_cache.NETWORK: (self.do_fetch_network_settings, self.show_network_settings),
+            tab_cache.STREAMS: (self.do_fetch_streams, self.show_streams)
+        }
+
+        # Camera stream configs on the connected robot
+        self.camstream_configs = CamstreamConfigCache()
 
         # Signal / Slot setup
         self.change_progress_msg_sig.connect(self.do_change_progress_msg)
         self.append_log_sig.connect(self.do_append_robot_log)
         self.set_versions_sig.connect(self.do_set_versions)
         self.update_status_sig.connect(self.do_update_status)
-        self.update_net_info_sig.connect(self.do_update_network_info)
         self.clear_robot_log_sig.connect(self.do_clear_robot_log)
+        self.update_service_states_sig.connect(self.do_update_service_states)
+        self.run_on_ssh_queue_sig.connect(self.do_run_on_ssh_queue)
 
         self.ui.act_settings.triggered.connect(self.open_settings)
         self.ui.act_about.triggered.connect(self.open_about)
@@ -201,8 +255,59 @@ class DeployToolWindow(QMainWindow):
 
         self.ui.btn_install_update.clicked.connect(self.install_update_package)
         self.ui.btn_install_toolchain.clicked.connect(self.install_toolchain_package)
+        self.ui.btn_verify_install.clicked.connect(self.verify_installation)
 
         self.ui.btn_connect.clicked.connect(self.toggle_connection)
+        self.ui.btn_test_link.clicked.connect(self.test_link)
+        self.ui.btn_find_robots.clicked.connect(self.find_robots)
+        self.ui.btn_install_key.clicked.connect(self.install_key)
+        self.ui.combox_profile.activated.connect(self.profile_selected)
+        self.ui.btn_save_profile.clicked.connect(self.save_profile)
+        self.ui.btn_delete_profile.clicked.connect(self.delete_profile)
+        self.ui.txt_address.textEdited.connect(self.connection_fields_edited)
+        self.ui.txt_username.textEdited.connect(self.connection_fields_edited)
+        self.ui.cbx_use_key.clicked.connect(self.connection_fields_edited)
+
+        # Robot tabs are set up when first enabled (see setup_robot_tabs)
+        self.robot_tabs_ready = False
+
+        # Startup
+        self.disable_robot_tabs()
+        self.ssh_check_timer.start(1000)
+
+        # Load last used connection settings
+        self.ui.txt_address.setText(settings_manager.robot_address)
+        self.ui.txt_username.setText(settings_manager.robot_user)
+        self.ui.cbx_use_key.setChecked(settings_manager.robot_use_key)
+        self.ui.cbx_prewarm.setChecked(settings_manager.prewarm_connection)
+        self.populate_profiles(settings_manager.last_profile)
+
+        self.__on_color_change()
+        self.__set_font_size()
+
+        # Runs once the event loop starts (after the window is first shown)
+        QTimer.singleShot(0, self.after_startup)
+
+    def after_startup(self):
+        # Work that does not need to delay the window being shown
+        self.verify_installation_quick()
+
+        # Import paramiko in the background so connecting does not have to wait for it
+        self.start_task(Task(self, load_paramiko))
+
+        if self.ui.cbx_prewarm.isChecked():
+            self.start_prewarm()
+
+    def setup_robot_tabs(self):
+        # Only done once, the first time the robot tabs are enabled
+        if self.robot_tabs_ready:
+            return
+        self.robot_tabs_ready = True
+
+        self.ui.txt_wifi_ssid.setValidator(WifiSsidValidator(self))
+        self.ui.txt_wifi_pass.setValidator(WifiPskValidator(self))
+        self.ui.txt_wifi_country.setValidator(WifiCountryValidator(self))
+        self.ui.txt_wifi_channel.setValidator(QIntValidator(1, 14, self))
 
         self.ui.btn_proj_browse.clicked.connect(self.choose_proj_folder)
         self.ui.btn_proj_deploy.clicked.connect(self.deploy_program)
@@ -212,17 +317,18 @@ class DeployToolWindow(QMainWindow):
         self.ui.btn_shutdown.clicked.connect(self.shutdown_robot)
         self.ui.btn_reboot.clicked.connect(self.reboot_robot)
         self.ui.btn_restart_program.clicked.connect(self.restart_robot_program)
-        self.ui.btn_make_writable.clicked.connect(self.make_robot_writable)
-        self.ui.btn_readonly.clicked.connect(self.make_robot_readonly)
+        self.ui.btn_make_writable.clicked.connect(self.user_make_robot_writable)
+        self.ui.btn_readonly.clicked.connect(self.user_make_robot_readonly)
 
-        self.ui.btn_wifi_apply.clicked.connect(self.apply_network_settings)
-        self.ui.btn_change_hostname.clicked.connect(self.apply_hostname)
+        self.ui.btn_network_apply.clicked.connect(self.apply_network_settings)
+        self.ui.btn_wifi_survey.clicked.connect(self.survey_wifi_channels)
 
         self.ui.btn_new_camstream.clicked.connect(self.new_camstream)
         self.ui.btn_delete_camstream.clicked.connect(self.delete_camstream)
         self.ui.btn_edit_camstream.clicked.connect(self.edit_camstream)
         self.ui.combox_camstream_player.currentTextChanged.connect(self.change_player_download_link)
         self.ui.btn_play_camstream.clicked.connect(self.play_stream)
+        self.ui.btn_measure_latency.clicked.connect(self.measure_latency)
         self.ui.btn_camstream_start.clicked.connect(self.start_camstream)
         self.ui.btn_camstream_stop.clicked.connect(self.stop_camstream)
         self.ui.btn_rtsp_start.clicked.connect(self.start_rtsp)
@@ -232,18 +338,6 @@ class DeployToolWindow(QMainWindow):
         self.ui.btn_camstream_log.clicked.connect(self.show_camstream_log)
         self.ui.btn_rtsp_log.clicked.connect(self.show_rtsp_log)
 
-        # Startup
-        self.disable_robot_tabs()
-        self.ssh_check_timer.start(1000)
-
-        # Load last used connection settings
-        self.ui.txt_address.setText(settings_manager.robot_address)
-        self.ui.txt_username.setText(settings_manager.robot_user)
-        self.ui.cbx_longer_timeouts.setChecked(settings_manager.longer_timeouts)
-
-        self.__on_color_change()
-        self.__set_font_size()
-
     def __on_color_change(self):
         pass
 
@@ -265,17 +359,30 @@ class DeployToolWindow(QMainWindow):
         self.ui.tabs_main.setCurrentIndex(1)
 
     def closeEvent(self, event: QCloseEvent):
+        self.stop_reconnect()
+        self.executor.cancel()
+        self.end_writable_session()
         self.ssh_connected = False
-        self.ssh.close()
+        if self.ssh is not None:
+            self.run_on_ssh_queue(self.ssh.close)
+        self.close_prewarmed()
+
+        # Give the read-only restore (if any) a chance to finish before exiting
+        self.executor.wait(SSH_QUEUE, int(self.timeout(OP_COMMAND) * 1000))
 
         # Save last used connection settings
         settings_manager.robot_address = self.ui.txt_address.text()
         settings_manager.robot_user = self.ui.txt_username.text()
-        settings_manager.longer_timeouts = self.ui.cbx_longer_timeouts.isChecked()
+        settings_manager.robot_use_key = self.ui.cbx_use_key.isChecked()
+        settings_manager.prewarm_connection = self.ui.cbx_prewarm.isChecked()
+        settings_manager.last_profile = self.ui.combox_profile.currentText()
+        settings_manager.rtt_estimate = self.rtt.save()
+        settings_manager.auto_reconnect = self.ui.cbx_auto_reconnect.isChecked()
 
         return super().closeEvent(event)
 
     def open_settings(self):
+        from settings_dialog import SettingsDialog
         dialog = SettingsDialog(self)
         res = dialog.exec()
         if res == QDialog.Accepted:
@@ -283,6 +390,7 @@ class DeployToolWindow(QMainWindow):
             self.__set_font_size()
 
     def open_about(self):
+        from about_dialog import AboutDialog
         dialog = AboutDialog(self)
         dialog.exec()
 
@@ -297,8 +405,14 @@ class DeployToolWindow(QMainWindow):
         self.ui.txt_address.setEnabled(True)
         self.ui.txt_username.setEnabled(True)
         self.ui.txt_password.setEnabled(True)
+        self.ui.btn_find_robots.setEnabled(True)
+        self.ui.combox_profile.setEnabled(True)
+        self.update_profile_buttons()
+        self.ui.btn_test_link.setEnabled(False)
+        self.ui.btn_install_key.setEnabled(False)
     
     def enable_robot_tabs(self):
+        self.setup_robot_tabs()
         self.ui.tabs_main.setTabEnabled(2, True)
         self.ui.tabs_main.setTabEnabled(3, True)
         self.ui.tabs_main.setTabEnabled(4, True)
@@ -309,10 +423,16 @@ class DeployToolWindow(QMainWindow):
         self.ui.txt_address.setEnabled(False)
         self.ui.txt_username.setEnabled(False)
         self.ui.txt_password.setEnabled(False)
-
-    def start_task(self, task: Task):
-        self.tasks.append(task)
-        QThreadPool.globalInstance().start(task)
+        self.ui.btn_find_robots.setEnabled(False)
+        self.ui.combox_profile.setEnabled(False)
+        self.update_profile_buttons()
+        self.ui.btn_test_link.setEnabled(True)
+        self.ui.btn_install_key.setEnabled(True)
+
+    def start_task(self, task: Task, queue: str = DEFAULT_QUEUE):
+        # Progress reported by tasks is shown in the progress dialog
+        task.task_progress.connect(self.do_change_progress_value)
+        self.executor.start(task, queue)
     
     def show_progress(self, title: str, msg: str):
         self.pdialog.hide()
@@ -334,6 +454,22 @@ class DeployToolWindow(QMainWindow):
         # Can call from any thread
         self.change_progress_msg_sig.emit(msg)
 
+    def do_change_progress_value(self, done: int, total: int):
+        # This can only be called from UI thread
+        # Connected to the progress signal of each task (see start_task)
+        # Byte counts can exceed the range of the progress dialog, so show tenths of a percent
+        # A total of zero shows a busy indicator
+        if total <= 0:
+            self.pdialog.setMaximum(0)
+            self.pdialog.setValue(0)
+        else:
+            self.pdialog.setMaximum(1000)
+            self.pdialog.setValue(int(1000 * min(done, total) / total))
+
+    def change_progress_value(self, done: int, total: int):
+        # Call from a task. Reports progress of the task running on the calling thread.
+        report_progress(done, total)
+
     def hide_progress(self):
         self.pdialog.hide()
 
@@ -343,60 +479,68 @@ class DeployToolWindow(QMainWindow):
         elif idx == 2:
             self.populate_program_tab()
         elif idx == 5:
-            self.populate_network_settings()
+            self.show_tab_data(tab_cache.NETWORK)
         elif idx == 6:
-            self.populate_streams()
-        
-    @property
-    def command_timeout(self) -> float:
-        if self.ui.cbx_longer_timeouts.isChecked():
-            return 5
-        else:
-            return 3
+            self.show_tab_data(tab_cache.STREAMS)
+
+    def timeout(self, operation: str) -> float:
+        # Timeout for an operation (one of the link_probe.OP_* constants) based on measured round trip time
+        return self.rtt.timeout(operation)
+
+    def show_tab_data(self, key: str):
+        # Cached data is shown immediately. Stale data is then refreshed in the background.
+        data = self.tab_data.get(key)
+        if data is not None:
+            self.tab_data_sources[key][1](data)
+        if self.tab_data.is_stale(key):
+            self.fetch_tab_data(key)
+
+    def fetch_tab_data(self, key: str):
+        # Does nothing if this data is already being read
+        if not self.ssh_connected:
+            return
+        fetch = self.tab_data.start_fetch(key)
+        if fetch is None:
+            return
+        task = Task(self, self.tab_data_sources[key][0])
+        task.task_complete.connect(lambda data: self.handle_tab_data_fetched(task, key, data))
+        task.task_exception.connect(lambda e: print(e))
+        task.task_finished.connect(lambda: self.tab_data.end_fetch(key, fetch))
+        self.start_task(task, FETCH_QUEUE)
+
+    def handle_tab_data_fetched(self, task: Task, key: str, data: Any):
+        if task.token.cancelled or not self.ssh_connected:
+            # Read from a connection that has since been closed
+            return
+        self.tab_data.put(key, data)
+        self.tab_data_sources[key][1](data)
+
+    def prefetch(self):
+        # Read data for all robot tabs at once (instead of when each tab is first shown)
+        for key in self.tab_data_sources:
+            self.fetch_tab_data(key)
+        self.validate_proj_folder()
 
     ############################################################################
     # SFTP Functions
     ############################################################################
-    def sftp_upload_file(self, sftp: SFTPClient, local_file: str, remote_dest: str):
-        # Note: remote_dest is a directory and must exist
-        sftp.put(local_file, "{0}/{1}".format(remote_dest, os.path.basename(local_file)))
-
-    def sftp_mkdir_recursive(self, sftp: SFTPClient, remote_directory: str):
-        remote_directory.replace("\\", "/")
-        if remote_directory == '/':
-            sftp.chdir('/')
-            return
-        if remote_directory == '':
-            return
-        try:
-            sftp.chdir(remote_directory)
-        except IOError:
-            dirname, basename = os.path.split(remote_directory.rstrip('/'))
-            self.sftp_mkdir_recursive(sftp, dirname)
-            sftp.mkdir(basename)
-            sftp.chdir(basename)
-            return True
-
-    def sftp_upload_directory(self, sftp: SFTPClient, local_dir: str, remote_dest: str):
-        # Note: remote_dest is a directory and must exist
-        # The local directory is recursively uploaded to the remote location
-
-        # Use only forward slashes. Remove trailing slash as it messes up os.path.basename
-        local_dir = local_dir.replace("\\", "/").rstrip("/")
-
-        remote_dest = "{0}/{1}".format(remote_dest, os.path.basename(local_dir))
-
-        # Copy each item in this directory recursively
-        for root, dirs, files in os.walk(local_dir):
-            for file in files:
-                local_file = "{0}/{1}".format(root, file).replace("\\", "/")
-                remote_file = local_file.replace(local_dir, remote_dest)
-                self.sftp_mkdir_recursive(sftp, os.path.dirname(remote_file))
-                sftp.put(local_file, remote_file)
-            for dir in dirs:
-                local_file = os.path.join(root, dir).replace("\\", "/")
-                remote_file = local_file.replace(local_dir, remote_dest)
-                self.sftp_upload_directory(sftp, local_file, os.path.dirname(remote_file))   
+    def sftp_upload_plan(self, sftp: SFTPClient, plan: DeployPlan):
+        # Note: directories in the plan must exist (see DeployPlan.prepare_command)
+        progress = TransferProgress(plan.total_bytes, self.report_upload_progress)
+        for local_file, remote_file, size in plan.files:
+            current_task().token.check()
+            progress.start_file(os.path.basename(local_file), size)
+            sftp.put(local_file, remote_file, callback=progress.update)
+
+    def report_upload_progress(self, done: int, total: int, rate: Optional[float], eta: Optional[float], name: str):
+        # Can call from any thread
+        msg = self.tr("Uploading new project to robot...\n{0}\n{1} / {2}").format(name, format_bytes(done), format_bytes(total))
+        if rate is not None:
+            msg += self.tr(" ({0}/s)").format(format_bytes(rate))
+        if eta is not None:
+            msg += self.tr(", {0} remaining").format(format_duration(eta))
+        self.change_progress_msg(msg)
+        self.change_progress_value(done, total)
 
     def sftp_list_directory(self, sftp: SFTPClient, remote_dir: str) -> List[str]:
         dirs = sftp.listdir(remote_dir)
@@ -420,113 +564,19 @@ class DeployToolWindow(QMainWindow):
         task.task_exception.connect(self.handle_populate_this_pc_exec)
         self.start_task(task)
 
-    # Copied from cpython shutil source
-    # https://github.com/python/cpython/blob/main/Lib/shutil.py
-    # Adapted too return all instances of the command in the path
-    # Instead of just the first one found
-    # Mimics behavior of Linux "which -a"
-    def which_all(self, cmd, mode=os.F_OK | os.X_OK, path=None):
-        # Check that a given file can be accessed with the correct mode.
-        # Additionally check that `file` is not a directory, as on Windows
-        # directories pass the os.access check.
-        def _access_check(fn, mode):
-            return (os.path.exists(fn) and os.access(fn, mode)
-                    and not os.path.isdir(fn))
-        """Given a command, mode, and a PATH string, return the path which
-        conforms to the given mode on the PATH, or None if there is no such
-        file.
-        `mode` defaults to os.F_OK | os.X_OK. `path` defaults to the result
-        of os.environ.get("PATH"), or can be overridden with a custom search
-        path.
-        """
-        # If we're given a path with a directory part, look it up directly rather
-        # than referring to PATH directories. This includes checking relative to the
-        # current directory, e.g. ./script
-        if os.path.dirname(cmd):
-            if _access_check(cmd, mode):
-                return cmd
-            return None
-
-        use_bytes = isinstance(cmd, bytes)
-
-        if path is None:
-            path = os.environ.get("PATH", None)
-            if path is None:
-                try:
-                    path = os.confstr("CS_PATH")
-                except (AttributeError, ValueError):
-                    # os.confstr() or CS_PATH is not available
-                    path = os.defpath
-            # bpo-35755: Don't use os.defpath if the PATH environment variable is
-            # set to an empty string
-
-        # PATH='' doesn't match, whereas PATH=':' looks in the current directory
-        if not path:
-            return None
-
-        if use_bytes:
-            path = os.fsencode(path)
-            path = path.split(os.fsencode(os.pathsep))
-        else:
-            path = os.fsdecode(path)
-            path = path.split(os.pathsep)
-
-        if sys.platform == "win32":
-            # The current directory takes precedence on Windows.
-            curdir = os.curdir
-            if use_bytes:
-                curdir = os.fsencode(curdir)
-            if curdir not in path:
-                path.insert(0, curdir)
-
-            # PATHEXT is necessary to check on Windows.
-            pathext_source = os.getenv("PATHEXT") or ".COM;.EXE;.BAT;.CMD;.VBS;.JS;.WS;.MSC"
-            pathext = [ext for ext in pathext_source.split(os.pathsep) if ext]
-
-            if use_bytes:
-                pathext = [os.fsencode(ext) for ext in pathext]
-            # See if the given file matches any of the expected path extensions.
-            # This will allow us to short circuit when given "python.exe".
-            # If it does match, only test that one, otherwise we have to try
-            # others.
-            if any(cmd.lower().endswith(ext.lower()) for ext in pathext):
-                files = [cmd]
-            else:
-                files = [cmd + ext for ext in pathext]
-        else:
-            # On other platforms you don't have things like PATHEXT to tell you
-            # what file suffixes are executable, so just pass on cmd as-is.
-            files = [cmd]
-
-        seen = set()
-        found = []
-        for dir in path:
-            normdir = os.path.normcase(dir)
-            if not normdir in seen:
-                seen.add(normdir)
-                for thefile in files:
-                    name = os.path.join(dir, thefile)
-                    if _access_check(name, mode):
-                        found.append(name)
-        return found
-
     def do_populate_this_pc(self):
         # Show then hide too fast causes issues on Ubuntu 22.04 
         # (and likely other systems using XCB backend)
         time.sleep(0.1)
 
         # Load CoreLib version
-        path = QDir.homePath() + "/.arpirobot/corelib/version.txt"
-        if QFileInfo(path).exists():
-            file = QFile(path)
-            if file.open(QIODevice.ReadOnly):
-                instream = QTextStream(file)
-                version = instream.readLine()
-                self.ui.txt_corelib_version.setText(version)
-            else:
-                self.ui.txt_corelib_version.setText("Unknown Version")
-        else:
+        version = version_cache.file_version(QDir.homePath() + "/.arpirobot/corelib/version.txt")
+        if version is None:
             self.ui.txt_corelib_version.setText("Not Installed")
+        elif version == "unknown":
+            self.ui.txt_corelib_version.setText("Unknown Version")
+        else:
+            self.ui.txt_corelib_version.setText(version)
         
         if platform.system() == "Windows":
             startupinfo = subprocess.STARTUPINFO()
@@ -535,29 +585,26 @@ class DeployToolWindow(QMainWindow):
             startupinfo = None
 
         # Load cmake version
-        if shutil.which('cmake') is None:
+        cmake = path_index.which('cmake')
+        if cmake is None:
             self.ui.txt_cmake_version.setText(self.tr("Not Installed"))
         else:
-            cmd = subprocess.Popen(["cmake", "--version"], startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             # First line of output is cmake version [VERSION]
-            self.ui.txt_cmake_version.setText(cmd.stdout.readline().decode()[14:].strip())
+            self.ui.txt_cmake_version.setText(version_cache.tool_version(cmake, ["--version"], lambda l: l[14:].strip(), startupinfo))
 
         # Load make version
         if platform.system() == "Windows":
             self.ui.lbl_make_download.show()
         else:
             self.ui.lbl_make_download.hide()
-        if shutil.which('gmake') is None:
-            if shutil.which('make') is None:
-                self.ui.txt_make_version.setText(self.tr("Not Installed"))
-            else:
-                cmd = subprocess.Popen(["make", "--version"], startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                # First line of output is make version [VERSION]
-                self.ui.txt_make_version.setText(cmd.stdout.readline().decode()[9:].strip())
+        make = path_index.which('gmake')
+        if make is None:
+            make = path_index.which('make')
+        if make is None:
+            self.ui.txt_make_version.setText(self.tr("Not Installed"))
         else:
-            cmd = subprocess.Popen(["gmake", "--version"], startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             # First line of output is make version [VERSION]
-            self.ui.txt_make_version.setText(cmd.stdout.readline().decode()[9:].strip())
+            self.ui.txt_make_version.setText(version_cache.tool_version(make, ["--version"], lambda l: l[9:].strip(), startupinfo))
         
         # Check for installed toolchains
         found_toolchains = []
@@ -565,14 +612,8 @@ class DeployToolWindow(QMainWindow):
         if os.path.exists(path):
             for f in os.listdir(path):
                 if os.path.isdir("{0}/{1}".format(path, f)) and not f.startswith("."):
-                    verfile = "{0}/{1}/version.txt".format(path, f)
-                    if os.path.isfile(verfile):
-                        try:
-                            with open(verfile, 'r') as verfileobj:
-                                version = verfileobj.readline().replace("\r", "").replace("\n", "")
-                        except:
-                            version = "unknown"
-                    else:
+                    version = version_cache.file_version("{0}/{1}/version.txt".format(path, f))
+                    if version is None:
                         version = "unknown"
                     found_toolchains.append("{} ({})".format(f, version))
         if len(found_toolchains) == 0:
@@ -588,11 +629,16 @@ class DeployToolWindow(QMainWindow):
             python_exe_names.append("python3.{0}".format(i))
             python_exe_names.append("python3{0}".format(i))
         for name in python_exe_names:
-            interpreters.extend(self.which_all(name))
+            interpreters.extend(path_index.which_all(name))
+        # Many names in path are links to the same interpreter. Only probe each once.
+        interpreters = list(dict.fromkeys(os.path.realpath(i.replace("\r", "").replace("\n", "")) for i in interpreters))
         for interpreter in interpreters:
-            cmd = subprocess.Popen([interpreter.replace("\r", "").replace("\n", ""), "--version"], startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             # Output: Python [VERSION]
-            versions.append(cmd.stdout.readline().decode()[7:].strip())
+            version = version_cache.tool_version(interpreter, ["--version"], lambda l: l[7:].strip(), startupinfo)
+            if version is not None:
+                versions.append(version)
+        version_cache.save()
+
         # Remove duplicate version numbers
         versions = list(dict.fromkeys(versions))
         if len(versions) == 0:
@@ -605,25 +651,31 @@ class DeployToolWindow(QMainWindow):
             self.ui.txt_pc_python_version.setText(v_str)
 
     def do_update_package_installation(self, filename: str):
+        import installer
+        from zipfile import ZipFile
         with ZipFile(filename) as zfile:
             if "what.txt" in zfile.namelist():
                 what = zfile.read("what.txt").strip().decode()
-                dest = "{0}/.arpirobot/{1}/".format(QDir.homePath(), what)
-                self.change_progress_msg("Installing update package for component '{0}'".format(what))
-                
-                # Delete direcotry if it exists
-                if os.path.exists(dest):
-                    shutil.rmtree(dest)
-                
-                # Make empty directory
-                os.mkdir(dest)
-
-                # Extract zip to directory
-                zfile.extractall(dest)
-
             else:
                 raise Exception(self.tr("The selected zip file is not an ArPiRobot update package."))
 
+        dest = "{0}/.arpirobot/{1}".format(QDir.homePath(), what)
+        staging = "{0}/.{1}-staging".format(os.path.dirname(dest), os.path.basename(dest))
+        self.change_progress_msg(self.tr("Installing update package for component '{0}'").format(what))
+
+        # Extract zip to a staging directory, recording a hash of each file
+        # The installed component is left untouched until extraction succeeds. The staging directory is kept
+        # if extraction fails so the next attempt can resume. Files unchanged from the installed copy are reused.
+        installer.recover_interrupted_swap(dest)
+        manifest = ManifestBuilder(staging)
+        installer.extract_zip(filename, staging, self.report_extract_progress, manifest, reuse_dir=dest if os.path.isdir(dest) else None)
+        manifest.write()
+
+        # Replace installed component
+        self.change_progress_msg(self.tr("Replacing installed component '{0}'...").format(what))
+        self.change_progress_value(0, 0)
+        installer.swap_directory(staging, dest)
+
     def handle_update_installed(self, res: Any):
         self.hide_progress()
         # No longer needed. Extension generates env file
@@ -733,41 +785,116 @@ class DeployToolWindow(QMainWindow):
         with open(filename, "a") as fp:
             fp.write("{0}={1}:${0}\n".format(var, value))
 
+    def report_extract_progress(self, done: int, total: int, name: str):
+        # Can call from any thread
+        if total > 0:
+            self.change_progress_msg(self.tr("Extracting package ({0}%)...\n{1}").format(int(100 * done / total), name))
+        self.change_progress_value(done, total)
+
     def do_install_toolchain_package(self, filename: str):
+        import installer
         tmp_path = QDir.homePath() + "/.arpirobot/toolchain-tmp"
         
-        
         if os.path.exists(tmp_path):
             shutil.rmtree(tmp_path)
 
-        # Extract archive to the toolchain directory
-        shutil.unpack_archive(filename, tmp_path)
+        # Stream archive into a staging directory. Permissions are set from archive metadata as files are extracted.
+        manifest = ManifestBuilder(tmp_path)
+        installer.extract_archive(filename, tmp_path, self.report_extract_progress, manifest)
 
         # Determine final directory (toolchain/device)
         what_path = "{}/what.txt".format(tmp_path)
         if not os.path.exists(what_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
             raise Exception("Archive does not contain 'what.txt' file.")
         with open(what_path, 'r') as f:
             what = f.readline().strip()
         if not what.startswith("toolchain/"):
+            shutil.rmtree(tmp_path, ignore_errors=True)
             raise Exception("Not a valid toolchain archive.")
         final_path = QDir.homePath() + "/.arpirobot/toolchain/{0}".format(what[10:])
 
-        # Delete old toolchain if installed
-        if os.path.exists(final_path):
-            shutil.rmtree(final_path)
+        # Replace old toolchain (if installed) with the new one
+        self.change_progress_msg(self.tr("Installing toolchain..."))
+        self.change_progress_value(0, 0)
+        manifest.write()
+        installer.swap_directory(tmp_path, final_path)
+
+    def installed_components(self) -> List[str]:
+        # Root directory of each installed component that can be verified
+        components = []
+        base = QDir.homePath() + "/.arpirobot"
+        if os.path.isdir(base + "/corelib"):
+            components.append(base + "/corelib")
+        if os.path.isdir(base + "/toolchain"):
+            for f in sorted(os.listdir(base + "/toolchain")):
+                if os.path.isdir("{0}/toolchain/{1}".format(base, f)) and not f.startswith("."):
+                    components.append("{0}/toolchain/{1}".format(base, f))
+        return components
+
+    def do_verify_installation(self, full: bool) -> List[VerifyResult]:
+        results = []
+        for root in self.installed_components():
+            if full:
+                self.change_progress_msg(self.tr("Verifying {0}...").format(os.path.basename(root)))
+            results.append(verify_tree(root, full))
+        return results
+
+    def format_verify_results(self, results: List[VerifyResult]) -> str:
+        lines = []
+        for res in results:
+            name = os.path.relpath(res.root, QDir.homePath() + "/.arpirobot")
+            if not res.has_manifest:
+                lines.append(self.tr("{0}: No manifest (the install is incomplete or from an older version). Reinstall it.").format(name))
+            elif res.ok:
+                lines.append(self.tr("{0}: OK ({1} files)").format(name, res.checked))
+            else:
+                lines.append(self.tr("{0}: {1} missing, {2} modified").format(name, len(res.missing), len(res.modified)))
+                for f in res.missing:
+                    lines.append("    missing: {0}".format(f))
+                for f in res.modified:
+                    lines.append("    modified: {0}".format(f))
+        if len(lines) == 0:
+            lines.append(self.tr("No components are installed."))
+        return "\n".join(lines)
+
+    def handle_verify_complete(self, results: List[VerifyResult]):
+        self.hide_progress()
+        from log_dialog import LogDialog
+        dialog = LogDialog(self, self.tr("Installation Verification"), self.format_verify_results(results))
+        dialog.exec()
+
+    def handle_startup_verify_complete(self, results: List[VerifyResult]):
+        # Only bother the user if an install is damaged, incomplete, or can't be checked (no manifest)
+        damaged = [r for r in results if not r.ok]
+        if len(damaged) == 0:
+            return
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(self.tr("Some installed components are incomplete or damaged. Reinstall them before deploying.\n\n{0}")
+                .format(self.format_verify_results(damaged)))
+        dialog.setWindowTitle(self.tr("Installation Damaged"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
 
-        # Move directory
-        shutil.move(tmp_path, final_path)
+    def handle_verify_failure(self, e: Exception):
+        self.hide_progress()
+        print(e)
 
-        # Allow all toolchain binaries to execute on macos
-        if platform.system() == "Darwin":
-            os.system("zsh -c 'chmod -R +x {}'".format(final_path))
-            os.system("zsh -c 'xattr -dr {}'".format(final_path))
+    def verify_installation(self):
+        # Full check. Re-hashes every installed file.
+        self.show_progress(self.tr("Verifying Installation"), self.tr("Verifying installed components..."))
+        task = Task(self, self.do_verify_installation, True)
+        task.task_complete.connect(self.handle_verify_complete)
+        task.task_exception.connect(self.handle_verify_failure)
+        self.start_task(task)
 
-        # Allow all toolchain binaries to execute on linux
-        if platform.system() == "Linux":
-            os.system("zsh -c 'chmod -R +x {}'".format(final_path))
+    def verify_installation_quick(self):
+        # Quick check run at startup. Only re-hashes files whose size or mtime changed.
+        task = Task(self, self.do_verify_installation, False)
+        task.task_complete.connect(self.handle_startup_verify_complete)
+        task.task_exception.connect(print)
+        self.start_task(task)
 
     def convert_formats(self, formats) -> str:
         fmt_str = ""
@@ -819,8 +946,20 @@ class DeployToolWindow(QMainWindow):
         # Hide progress dialog if shown
         self.hide_progress()
 
-        # Disconnect from robot
-        self.ssh.close()
+        # Stop tasks using the connection
+        self.stop_reconnect()
+        self.executor.cancel(SSH_QUEUE)
+        self.executor.cancel(STREAM_QUEUE)
+        self.executor.cancel(FETCH_QUEUE)
+        self.tab_data.clear()
+
+        # Restore read-only state if a writable session is still lingering
+        self.end_writable_session()
+        self.writable_state.clear()
+
+        # Disconnect from robot (on the ssh queue, so after the restore)
+        if self.ssh is not None:
+            self.run_on_ssh_queue(self.ssh.close)
         self.ssh_connected = False
 
         # Restore UI to valid state
@@ -828,13 +967,113 @@ class DeployToolWindow(QMainWindow):
         self.ui.tabs_main.setCurrentIndex(1)
         self.ui.btn_connect.setText(self.tr("Connect"))
 
-    def handle_connected(self, res: Any):
+    def end_writable_session(self):
+        # The restore runs on the ssh queue (see run_on_ssh_queue)
+        # Nothing can be restored if the connection was lost
+        if self.ssh_connected:
+            self.writable.flush()
+        else:
+            self.writable.reset()
+
+    def do_run_on_ssh_queue(self, target: Callable[[], None]):
+        task = Task(self, target)
+        task.task_exception.connect(print)
+        self.start_task(task, SSH_QUEUE)
+
+    def run_on_ssh_queue(self, target: Callable[[], None]):
+        # Can call from any thread
+        self.run_on_ssh_queue_sig.emit(target)
+
+    def do_connect(self, addr: str, user: str, pwd: str, use_key: bool) -> SSHClient:
+        # Waits for the background import if it has not finished yet
+        load_paramiko()
+        from ssh_support import new_client, load_key
+
+        client = self.take_prewarmed(addr, user, pwd)
+        if client is not None:
+            return client
+
+        # paramiko tries the key first, then the password (if the robot does not accept the key)
+        key = None
+        if use_key:
+            try:
+                key = load_key()
+            except (IOError, SSHException) as e:
+                print(e)
+
+        timeout = self.timeout(OP_CONNECT)
+        client = new_client()
+        try:
+            client.connect(hostname=addr, port=22, username=user, password=pwd, pkey=key,
+                allow_agent=False, look_for_keys=False, timeout=timeout, auth_timeout=timeout)
+        except:
+            client.close()
+            raise
+        return client
+
+    def do_prewarm(self, addr: str, user: str, pwd: str, use_key: bool):
+        client = self.do_connect(addr, user, pwd, use_key)
+        client.get_transport().set_keepalive(PREWARM_KEEPALIVE)
+        with self.prewarm_lock:
+            if not current_task().token.cancelled:
+                self.prewarmed = ((addr, user, pwd), client)
+                return
+        # Closing
+        client.close()
+
+    def start_prewarm(self):
+        # Connect to the last used robot in the background. Connecting with the same settings then uses this connection.
+        # Runs on the ssh queue, so connecting while this is still running waits for it instead of connecting twice.
+        task = Task(self, self.do_prewarm, self.ui.txt_address.text(), self.ui.txt_username.text(),
+            self.ui.txt_password.text(), self.ui.cbx_use_key.isChecked())
+        task.task_exception.connect(lambda e: print("Background connection failed: {0}".format(e)))
+        self.start_task(task, SSH_QUEUE)
+
+    def take_prewarmed(self, addr: str, user: str, pwd: str) -> Optional[SSHClient]:
+        # Can call from any thread. A pre-warmed connection to a different robot (or one that dropped) is closed.
+        with self.prewarm_lock:
+            prewarmed, self.prewarmed = self.prewarmed, None
+        if prewarmed is None:
+            return None
+        target, client = prewarmed
+        transport = client.get_transport()
+        if target == (addr, user, pwd) and transport is not None and transport.is_active():
+            transport.set_keepalive(0)
+            return client
+        client.close()
+        return None
+
+    def close_prewarmed(self):
+        with self.prewarm_lock:
+            prewarmed, self.prewarmed = self.prewarmed, None
+        if prewarmed is not None:
+            prewarmed[1].close()
+
+    def use_client(self, client: SSHClient):
+        if self.ssh is not None and self.ssh is not client:
+            self.ssh.close()
+        self.ssh = client
+
+    def handle_connected(self, client: SSHClient):
+        self.use_client(client)
         self.enable_robot_tabs()
         self.ui.btn_connect.setText(self.tr("Disconnect"))
         self.ssh_connected = True
         self.hide_progress()
+        self.camstream_configs.clear()
+        self.tab_data.clear()
 
         # Don't keep data from old connections
+        self.network_config = NetworkConfig()
+        self.network_config_shown = NetworkConfig()
+        self.do_update_network_info("", "", "", "", "")
+        self.ui.btn_network_apply.setEnabled(False)
+        self.ui.combox_stream_source.clear()
+        self.do_set_versions("", "", "")
+        self.log_offset = 0
+        self.ui.txt_robot_log.clear()
+        self.link_history.clear()
+        self.show_link_results()
         self.ui.pbar_cpu_usage.setValue(0)
         self.ui.pbar_cpu_usage.setFormat(self.tr("Unknown"))
         self.ui.pbar_mem_usage.setValue(0)
@@ -845,13 +1084,24 @@ class DeployToolWindow(QMainWindow):
         self.ui.pnl_readonly_status.style().polish(self.ui.pnl_readonly_status)
 
 
+        self.start_connection_tasks()
+
+    def start_connection_tasks(self):
         # Start these tasks once connected
-        # They run until disconnect
+        # They run until disconnect (or until the connection is lost)
+        self.writable_state.clear()
+        self.watch_writable()
         self.populate_program_log()
         self.populate_robot_status()
 
+        # Tab data is read now so tabs don't have to wait for it when shown
+        self.prefetch()
+
     def handle_connection_failure(self, e: Exception):
         self.hide_progress()
+        if isinstance(e, BadHostKeyException):
+            self.confirm_forget_host_key(e.hostname)
+            return
         dialog = QMessageBox(parent=self)
         dialog.setIcon(QMessageBox.Warning)
         dialog.setWindowTitle("Connect Failed!")
@@ -863,19 +1113,106 @@ class DeployToolWindow(QMainWindow):
                 .format(str(e)))
         dialog.exec()
 
+    def connection_lost(self):
+        self.do_disconnect()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText("Connection to the robot was lost.")
+        dialog.setWindowTitle("Disconnected")
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+
     def check_ssh_connection(self):
-        if self.ssh_connected and not self.ssh.get_transport().is_active():
+        transport = self.ssh.get_transport() if self.ssh is not None else None
+        if self.ssh_connected and (transport is None or not transport.is_active()):
             # Connection lost
+            if self.ui.cbx_auto_reconnect.isChecked():
+                self.start_reconnect()
+            else:
+                self.connection_lost()
+
+    def set_robot_tabs_interactive(self, interactive: bool):
+        # Robot tabs stay visible (with the last data shown) but can't be used while reconnecting
+        for idx in range(2, self.ui.tabs_main.count()):
+            self.ui.tabs_main.widget(idx).setEnabled(interactive)
+
+    def show_reconnect_status(self, msg: str):
+        # Non-modal, so the user can keep working (eg on the program tab) while reconnecting
+        self.statusBar().setVisible(msg != "")
+        self.statusBar().showMessage(msg)
+
+    def start_reconnect(self):
+        # Stop everything using the old connection. The UI is left as is so it can continue after reconnecting.
+        self.ssh_connected = False
+        self.executor.cancel(SSH_QUEUE)
+        self.executor.cancel(STREAM_QUEUE)
+        self.executor.cancel(FETCH_QUEUE)
+        self.tab_data.cancel_fetches()
+        self.hide_progress()
+        self.writable.reset()
+        self.writable_state.clear()
+        if self.ssh is not None:
+            # Unblocks tasks still waiting on the old connection
+            self.ssh.close()
+
+        self.reconnecting = True
+        self.reconnect_attempt = 0
+        self.reconnect_started = time.monotonic()
+        self.set_robot_tabs_interactive(False)
+        self.show_reconnect_status(self.tr("Connection to the robot was lost. Reconnecting..."))
+        self.reconnect_timer.start(int(RECONNECT_INITIAL_DELAY * 1000))
+
+    def stop_reconnect(self):
+        if not self.reconnecting:
+            return
+        self.reconnecting = False
+        self.reconnect_timer.stop()
+        self.set_robot_tabs_interactive(True)
+        self.show_reconnect_status("")
+
+    def attempt_reconnect(self):
+        if not self.reconnecting:
+            return
+        self.reconnect_attempt += 1
+        self.show_reconnect_status(self.tr("Connection to the robot was lost. Reconnecting (attempt {0})...").format(self.reconnect_attempt))
+        task = Task(self, self.do_connect, self.ui.txt_address.text(), self.ui.txt_username.text(), self.ui.txt_password.text(),
+            self.ui.cbx_use_key.isChecked())
+        task.task_complete.connect(self.handle_reconnected)
+        task.task_exception.connect(self.handle_reconnect_failure)
+        self.start_task(task, SSH_QUEUE)
+
+    def handle_reconnected(self, client: SSHClient):
+        if not self.reconnecting:
+            # Reconnect was cancelled (user disconnected) while this attempt was running
+            client.close()
+            return
+        self.stop_reconnect()
+        self.use_client(client)
+        self.ssh_connected = True
+
+        # Log continues from where it was. Status sampling starts again and tab data is refreshed.
+        self.start_connection_tasks()
+
+    def handle_reconnect_failure(self, e: Exception):
+        if not self.reconnecting:
+            return
+        print(e)
+        if isinstance(e, (AuthenticationException, BadHostKeyException)):
+            # Retrying won't help (password or key changed, or a different device answered)
             self.do_disconnect()
-            dialog = QMessageBox(parent=self)
-            dialog.setIcon(QMessageBox.Warning)
-            dialog.setText("Connection to the robot was lost.")
-            dialog.setWindowTitle("Disconnected")
-            dialog.setStandardButtons(QMessageBox.Ok)
-            dialog.exec()
+            self.handle_connection_failure(e)
+            return
+        if time.monotonic() - self.reconnect_started > RECONNECT_GIVE_UP:
+            self.connection_lost()
+            return
+        # Exponential backoff with jitter (so several tools reconnecting to one robot don't do so in lockstep)
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_INITIAL_DELAY * 2 ** self.reconnect_attempt)
+        delay *= random.uniform(0.75, 1.0)
+        self.show_reconnect_status(self.tr("Connection to the robot was lost. Retrying in {0:.0f} s...").format(delay))
+        self.reconnect_timer.start(int(delay * 1000))
 
     def toggle_connection(self):
-        if self.ssh_connected:
+        if self.ssh_connected or self.reconnecting:
             # Disconnect from robot
             self.do_disconnect()
         else:
@@ -884,18 +1221,196 @@ class DeployToolWindow(QMainWindow):
             user = self.ui.txt_username.text()
             pwd = self.ui.txt_password.text()
 
-            if self.ui.cbx_longer_timeouts.isChecked():
-                timeout = 8
-            else:
-                timeout = 3
-
             self.show_progress("Connecting", "Connecting to the robot at {0}".format(addr)) 
 
-
-            task = Task(self, self.ssh.connect, hostname=addr, port=22, username=user, password=pwd, allow_agent=False, look_for_keys=False, timeout=timeout, auth_timeout=timeout)
+            task = Task(self, self.do_connect, addr, user, pwd, self.ui.cbx_use_key.isChecked())
             task.task_complete.connect(self.handle_connected)
             task.task_exception.connect(self.handle_connection_failure)
-            self.start_task(task)
+            self.start_task(task, SSH_QUEUE)
+
+    def find_robots(self):
+        from discovery_dialog import DiscoveryDialog
+        dialog = DiscoveryDialog(self.ui.txt_username.text(), self.ui.txt_password.text(), self.timeout(OP_CONNECT),
+            self.timeout(OP_QUERY), self)
+        if dialog.exec() == QDialog.Accepted and dialog.selected_address() is not None:
+            self.ui.txt_address.setText(dialog.selected_address())
+            self.connection_fields_edited()
+
+    def confirm_forget_host_key(self, hostname: str):
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(self.tr("The robot at {0} identified itself with a different key than last time. "
+            "This happens if the robot's SD card was re-imaged, but could also mean another device is pretending to be the robot.\n\n"
+            "Forget the old key and connect anyway?").format(hostname))
+        dialog.setWindowTitle(self.tr("Robot Key Changed"))
+        dialog.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        dialog.setDefaultButton(QMessageBox.No)
+        if dialog.exec() == QMessageBox.Yes:
+            from ssh_support import forget_host_key
+            forget_host_key(hostname)
+            self.toggle_connection()
+
+    def populate_profiles(self, selected: str):
+        self.ui.combox_profile.clear()
+        self.ui.combox_profile.addItems(settings_manager.profile_names())
+        # No selection (-1) if selected is not a saved profile
+        self.ui.combox_profile.setCurrentIndex(self.ui.combox_profile.findText(selected))
+        self.update_profile_buttons()
+
+    def update_profile_buttons(self):
+        self.ui.btn_delete_profile.setEnabled(self.ui.combox_profile.isEnabled() and self.ui.combox_profile.currentIndex() >= 0)
+
+    def profile_selected(self, index: int):
+        profile = settings_manager.profile(self.ui.combox_profile.itemText(index))
+        if profile is not None:
+            self.ui.txt_address.setText(profile.address)
+            self.ui.txt_username.setText(profile.user)
+            self.ui.cbx_use_key.setChecked(profile.use_key)
+        self.update_profile_buttons()
+
+    def connection_fields_edited(self):
+        # The selected profile no longer describes the connection once its settings are changed
+        profile = settings_manager.profile(self.ui.combox_profile.currentText())
+        if profile is not None and (profile.address != self.ui.txt_address.text() or profile.user != self.ui.txt_username.text() \
+                or profile.use_key != self.ui.cbx_use_key.isChecked()):
+            self.ui.combox_profile.setCurrentIndex(-1)
+            self.update_profile_buttons()
+
+    def save_profile(self):
+        current = self.ui.combox_profile.currentText()
+        name, ok = QInputDialog.getText(self, self.tr("Save Profile"), self.tr("Profile name"), QLineEdit.Normal,
+            current if current != "" else self.ui.txt_address.text())
+        name = name.strip()
+        if not ok or name == "":
+            return
+        if "/" in name or "\\" in name:
+            # Names are settings group names
+            dialog = QMessageBox(parent=self)
+            dialog.setIcon(QMessageBox.Warning)
+            dialog.setText(self.tr("Profile names can't contain slashes."))
+            dialog.setWindowTitle(self.tr("Invalid Profile Name"))
+            dialog.setStandardButtons(QMessageBox.Ok)
+            dialog.exec()
+            return
+        settings_manager.save_profile(ConnectionProfile(name, self.ui.txt_address.text(), self.ui.txt_username.text(),
+            self.ui.cbx_use_key.isChecked()))
+        self.populate_profiles(name)
+
+    def delete_profile(self):
+        name = self.ui.combox_profile.currentText()
+        if name == "":
+            return
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Question)
+        dialog.setText(self.tr("Are you sure you want to delete the profile '{0}'?").format(name))
+        dialog.setWindowTitle(self.tr("Confirm Delete"))
+        dialog.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        if dialog.exec() == QMessageBox.Yes:
+            settings_manager.remove_profile(name)
+            self.populate_profiles("")
+
+    def do_install_key(self, addr: str, user: str):
+        from ssh_support import new_client, load_key, authorize_key_command
+        key = load_key(create=True)
+        with self.writable:
+            _, stdout, _ = self.ssh.exec_command(authorize_key_command(key), timeout=self.timeout(OP_COMMAND))
+            res = stdout.channel.recv_exit_status()
+        if res != 0:
+            raise Exception(self.tr("Failed to add the key to the robot."))
+
+        # Make sure the robot accepts the key (without the password)
+        timeout = self.timeout(OP_CONNECT)
+        client = new_client()
+        try:
+            client.connect(hostname=addr, port=22, username=user, pkey=key, allow_agent=False, look_for_keys=False,
+                timeout=timeout, auth_timeout=timeout)
+        finally:
+            client.close()
+
+    def handle_key_installed(self, res):
+        self.hide_progress()
+        self.ui.cbx_use_key.setChecked(True)
+        # The selected profile logs in with the key from now on
+        profile = settings_manager.profile(self.ui.combox_profile.currentText())
+        if profile is not None:
+            profile.use_key = True
+            settings_manager.save_profile(profile)
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Information)
+        dialog.setText(self.tr("This computer can now log in to the robot without a password."))
+        dialog.setWindowTitle(self.tr("Key Installed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+
+    def handle_key_install_failure(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(self.tr("Unable to set up key login on the robot. {0}").format(str(e)))
+        dialog.setWindowTitle(self.tr("Install Key Failed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+
+    def install_key(self):
+        self.show_progress(self.tr("Installing Key"), self.tr("Adding this computer's key to the robot..."))
+        task = Task(self, self.do_install_key, self.ui.txt_address.text(), self.ui.txt_username.text())
+        task.task_complete.connect(self.handle_key_installed)
+        task.task_exception.connect(self.handle_key_install_failure)
+        self.start_task(task, SSH_QUEUE)
+
+    def do_test_link(self) -> LinkSample:
+        messages = {
+            "rtt": self.tr("Measuring round trip time..."),
+            "upload": self.tr("Measuring upload speed..."),
+            "download": self.tr("Measuring download speed...")
+        }
+        sample = probe_link(self.ssh.get_transport(), self.timeout(OP_COMMAND), status=lambda step: self.change_progress_msg(messages[step]))
+        for rtt in sample.rtts:
+            self.rtt.add(rtt)
+        return sample
+
+    def handle_test_link_complete(self, sample: LinkSample):
+        self.hide_progress()
+        self.link_history.add(sample)
+        self.show_link_results()
+
+    def handle_test_link_failure(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(self.tr("Testing the connection failed: {0}").format(e))
+        dialog.setWindowTitle(self.tr("Test Connection Failed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+
+    def test_link(self):
+        self.show_progress(self.tr("Testing Connection"), self.tr("Measuring round trip time..."))
+        task = Task(self, self.do_test_link)
+        task.task_complete.connect(self.handle_test_link_complete)
+        task.task_exception.connect(self.handle_test_link_failure)
+        self.start_task(task, SSH_QUEUE)
+
+    def show_link_results(self):
+        samples = self.link_history.all()
+        if len(samples) == 0:
+            self.ui.lbl_link_rtt.setText(self.tr("Not measured"))
+            self.ui.lbl_link_upload.setText(self.tr("Not measured"))
+            self.ui.lbl_link_download.setText(self.tr("Not measured"))
+        else:
+            latest = samples[0]
+            self.ui.lbl_link_rtt.setText(self.tr("{0:.1f} ms median, {1:.1f} ms p90, {2:.1f} ms max").format(
+                latest.rtt_p50 * 1000, latest.rtt_p90 * 1000, latest.rtt_max * 1000))
+            self.ui.lbl_link_upload.setText("{0}/s".format(format_bytes(latest.upload)))
+            self.ui.lbl_link_download.setText("{0}/s".format(format_bytes(latest.download)))
+
+        self.ui.tbl_link_history.setRowCount(len(samples))
+        for row, sample in enumerate(samples):
+            values = [sample.time]
+            values.extend("{0:.1f}".format(rtt * 1000) for rtt in [sample.rtt_p50, sample.rtt_p90, sample.rtt_max])
+            values.extend("{0}/s".format(format_bytes(rate)) for rate in [sample.upload, sample.download])
+            for col, value in enumerate(values):
+                self.ui.tbl_link_history.setItem(row, col, QTableWidgetItem(value))
+        self.ui.tbl_link_history.resizeColumnsToContents()
 
 
     ############################################################################
@@ -906,11 +1421,23 @@ class DeployToolWindow(QMainWindow):
         self.ui.txt_proj_folder.setText(settings_manager.last_proj_folder)
         self.validate_proj_folder()
 
-    def validate_proj_folder(self):
-        valid = os.path.exists(settings_manager.last_proj_folder) and os.path.isdir(settings_manager.last_proj_folder)
+    def do_validate_proj_folder(self, folder: str) -> bool:
+        # Runs in the background since the folder may be on a slow (eg network) drive
+        valid = os.path.exists(folder) and os.path.isdir(folder)
         if valid:
-            valid = os.path.exists(os.path.join(settings_manager.last_proj_folder, "arpirobot-proj.json"))
-        self.ui.btn_proj_deploy.setEnabled(valid)
+            valid = os.path.exists(os.path.join(folder, "arpirobot-proj.json"))
+        return valid
+
+    def handle_proj_folder_validated(self, folder: str, valid: bool):
+        # Ignore results for a folder that is no longer selected
+        if folder == settings_manager.last_proj_folder:
+            self.ui.btn_proj_deploy.setEnabled(valid)
+
+    def validate_proj_folder(self):
+        folder = settings_manager.last_proj_folder
+        task = Task(self, self.do_validate_proj_folder, folder)
+        task.task_complete.connect(lambda valid: self.handle_proj_folder_validated(folder, valid))
+        self.start_task(task)
     
     def choose_proj_folder(self):
         if settings_manager.last_proj_folder != "" and os.path.exists(settings_manager.last_proj_folder):
@@ -924,24 +1451,22 @@ class DeployToolWindow(QMainWindow):
             self.validate_proj_folder()
 
     def do_writable_check(self) -> WritableState:
+        # Use the cached state if known. Only ask the robot if the watcher has not reported yet.
+        state = self.writable_state.state
+        if state != WritableState.Unknown:
+            return state
         try:
             _, stdout, _ = self.ssh.exec_command("mount | grep \"on / \"")
         except SSHException:
             return WritableState.Unknown
         line = stdout.readline().strip()
-        opts_list = []
         try:
             spos = line.index("(")
-            line = line[spos+1:-1]
-            opts_list = line.split(",")
-            if "ro" in opts_list:
-                return WritableState.Readonly
-            elif "rw" in opts_list:
-                return WritableState.ReadWrite
-            else:
-                return WritableState.Unknown
-        except:
+            state = parse_mount_options(line[spos+1:-1])
+        except ValueError:
             return WritableState.Unknown
+        self.writable_state.set(state)
+        return state
 
     def custom_glob(self, expression: str, base_path: str, old_dt_compat: bool) -> List[str]:
         # Old deploy tool treated src/** as src/**/* would be treated (more or less)
@@ -954,34 +1479,7 @@ class DeployToolWindow(QMainWindow):
             matches.append(str(match))
         return matches
 
-    def do_deploy_program(self, proj_folder: str):
-
-        self.change_progress_msg(self.tr("Ensuring robot filesystem is writable..."))
-        orig_state = self.do_writable_check()
-        if(orig_state != WritableState.ReadWrite):
-            self.make_robot_writable()
-        
-        self.change_progress_msg(self.tr("Stopping old robot program..."))
-        _, stdout, _ = self.ssh.exec_command("dt-stop_program.sh", timeout=self.command_timeout)
-        res = stdout.channel.recv_exit_status()
-        if res != 0:
-            raise Exception(self.tr("Failed to stop old program."))
-
-        # Clear log when program is redeployed
-        self.clear_robot_log()
-        time.sleep(0.1)
-
-        self.change_progress_msg(self.tr("Deleting old project..."))
-        _, stdout, _ = self.ssh.exec_command("dt-delete_program.sh", timeout=self.command_timeout)
-        res = stdout.channel.recv_exit_status()
-        if res != 0:
-            raise Exception(self.tr("Failed to delete old program."))
-
-        self.change_progress_msg(self.tr("Uploading new project to robot..."))
-
-        # Do Deploy
-        sftp = self.ssh.open_sftp()
-    
+    def build_deploy_plan(self, proj_folder: str) -> DeployPlan:
         # Make sure project file is of a known version
         all_files: List[str] = []
         try:
@@ -1006,39 +1504,68 @@ class DeployToolWindow(QMainWindow):
         else:
             raise Exception(self.tr("Invalid project version. Update the deploy tool and try again."))
 
-        # Make empty directory to upload to exists
-        _, stdout, _ = self.ssh.exec_command("rm -rf /tmp/robot_proj/;mkdir -p /tmp/robot_proj")
-        res = stdout.channel.recv_exit_status()
+        plan = DeployPlan("/tmp/robot_proj")
+        for file in all_files:
+            if not os.path.isdir(file):
+                plan.add_file(file, plan.remote_root)
+            else:
+                plan.add_directory(file, plan.remote_root)
+        return plan
 
-        # Upload each item to the remote directory using sftp
-        try:
-            for file in all_files:               
-                if not os.path.isdir(file):
-                    self.sftp_upload_file(sftp, file, "/tmp/robot_proj/")
-                else:
-                    self.sftp_upload_directory(sftp, file, "/tmp/robot_proj/")
-        except SFTPError as e:
-            print(str(e))
-            raise Exception(self.tr("Unable to copy files to the robot."))
-
-        sftp.close()
-
-        _, stdout, _ = self.ssh.exec_command("dt-update_program.sh /tmp/robot_proj", timeout=self.command_timeout)
-        res = stdout.channel.recv_exit_status()
-        if res != 0:
-            raise Exception(self.tr("Unable to update program on the robot."))
+    def do_deploy_program(self, proj_folder: str):
+        # Everything to upload is found before the robot is changed
+        plan = self.build_deploy_plan(proj_folder)
 
-        self.change_progress_msg("Starting new robot program...")
-        _, stdout, _ = self.ssh.exec_command("dt-start_program.sh", timeout=self.command_timeout)
-        res = stdout.channel.recv_exit_status()
+        # The filesystem is made writable once for the whole deploy. The original state is restored
+        # shortly after the deploy ends (even if it fails), unless another operation starts first.
+        self.change_progress_msg(self.tr("Ensuring robot filesystem is writable..."))
+        with self.writable:
+            self.change_progress_msg(self.tr("Stopping old robot program..."))
+            _, stdout, _ = self.ssh.exec_command("dt-stop_program.sh", timeout=self.timeout(OP_COMMAND))
+            res = stdout.channel.recv_exit_status()
+            if res != 0:
+                raise Exception(self.tr("Failed to stop old program."))
+
+            # Clear log when program is redeployed
+            self.clear_robot_log()
+            time.sleep(0.1)
+
+            self.change_progress_msg(self.tr("Deleting old project..."))
+            _, stdout, _ = self.ssh.exec_command("dt-delete_program.sh", timeout=self.timeout(OP_UPDATE))
+            res = stdout.channel.recv_exit_status()
+            if res != 0:
+                raise Exception(self.tr("Failed to delete old program."))
+
+            self.change_progress_msg(self.tr("Uploading new project to robot..."))
+
+            # Make empty directory to upload to (and all directories in it)
+            _, stdout, _ = self.ssh.exec_command(plan.prepare_command(), timeout=self.timeout(OP_COMMAND))
+            res = stdout.channel.recv_exit_status()
+            if res != 0:
+                raise Exception(self.tr("Failed to create program directories on the robot."))
+
+            # Upload each file to the remote directory using sftp
+            sftp = self.ssh.open_sftp()
+            try:
+                self.sftp_upload_plan(sftp, plan)
+            except (SFTPError, IOError) as e:
+                print(str(e))
+                raise Exception(self.tr("Unable to copy files to the robot."))
+            finally:
+                sftp.close()
+            self.change_progress_value(0, 0)
 
-        if res != 0:
-            raise Exception(self.tr("Failed to start new program on robot."))
+            _, stdout, _ = self.ssh.exec_command("dt-update_program.sh {0}".format(plan.remote_root), timeout=self.timeout(OP_UPDATE))
+            res = stdout.channel.recv_exit_status()
+            if res != 0:
+                raise Exception(self.tr("Unable to update program on the robot."))
 
-        self.change_progress_msg("Restoring filesystem state...")
-        # Restore readonly status
-        if(orig_state == WritableState.Readonly):
-            self.make_robot_readonly()
+            self.change_progress_msg("Starting new robot program...")
+            _, stdout, _ = self.ssh.exec_command("dt-start_program.sh", timeout=self.timeout(OP_COMMAND))
+            res = stdout.channel.recv_exit_status()
+
+            if res != 0:
+                raise Exception(self.tr("Failed to start new program on robot."))
 
     def deploy_complete(self, res: Any):
         self.hide_progress()
@@ -1057,7 +1584,7 @@ class DeployToolWindow(QMainWindow):
         task = Task(self, self.do_deploy_program, self.ui.txt_proj_folder.text())
         task.task_complete.connect(self.deploy_complete)
         task.task_exception.connect(self.deploy_failed)
-        self.start_task(task)
+        self.start_task(task, SSH_QUEUE)
 
 
     ############################################################################
@@ -1068,6 +1595,8 @@ class DeployToolWindow(QMainWindow):
         self.ui.txt_robot_log.clear()
 
     def clear_robot_log(self):
+        # The log is cleared when the program is restarted (the log file on the robot starts over)
+        self.log_offset = 0
         self.clear_robot_log_sig.emit()
 
     def do_append_robot_log(self, txt: str):
@@ -1078,24 +1607,38 @@ class DeployToolWindow(QMainWindow):
     def append_robot_log(self, txt: str):
         self.append_log_sig.emit(txt)
 
+    def log_command(self, offset: int) -> str:
+        # Follows the program log starting after the first offset bytes (already shown).
+        # If the log is shorter than that it was replaced (eg robot rebooted), so the marker is printed
+        # and the whole log is followed again.
+        return "f={0}; s=$(stat -c %s \"$f\" 2>/dev/null || echo 0); " \
+            "if [ \"$s\" -lt {1} ]; then echo {2}; exec tail -f -c +1 \"$f\"; else exec tail -f -c +{3} \"$f\"; fi".format(
+            PROGRAM_LOG_FILE, offset, LOG_RESET_MARKER, offset + 1)
+
     def do_populate_log(self):
-        while self.ssh_connected:
+        token = current_task().token
+        while self.ssh_connected and not token.cancelled:
             # Outter loop ensures that if this command is killed (for any reason), 
-            # but SSH is still active, logging continues to work
+            # but SSH is still active, logging continues to work (without repeating what was already shown)
             try:
-                _, stdout, _ = self.ssh.exec_command("tail -f -n +1 /tmp/arpirobot_program.log", timeout=None)
-                while self.ssh_connected:
+                _, stdout, _ = self.ssh.exec_command(self.log_command(self.log_offset), timeout=None)
+                while self.ssh_connected and not token.cancelled:
                     line = stdout.readline()
                     if line == "":
                         # EOF, therefore connection either closed or command was terminated
                         break
+                    if line.rstrip("\n") == LOG_RESET_MARKER:
+                        self.clear_robot_log()
+                        continue
+                    self.log_offset += len(line.encode())
                     self.append_robot_log(line)
+                token.wait(1)
             except SSHException:
-                pass
+                token.wait(1)
 
     def populate_program_log(self):
         task = Task(self, self.do_populate_log)
-        self.start_task(task)
+        self.start_task(task, STREAM_QUEUE)
 
     def copy_log(self):
         QGuiApplication.clipboard().setText(self.ui.txt_robot_log.toPlainText())
@@ -1113,6 +1656,16 @@ class DeployToolWindow(QMainWindow):
     def set_versions(self, img_ver: str, py_ver: str, tool_ver: str):
         self.set_versions_sig.emit(img_ver, py_ver, tool_ver)
 
+    def do_fetch_versions(self) -> Tuple[str, str, str]:
+        _, stdout, _ = self.ssh.exec_command("dt-getversions.sh", timeout=self.timeout(OP_QUERY))
+        img_version = stdout.readline().strip()
+        py_version = stdout.readline().strip()
+        tool_version = stdout.readline().strip()
+        return img_version, py_version, tool_version
+
+    def show_versions(self, versions: Tuple[str, str, str]):
+        self.do_set_versions(*versions)
+
     def do_update_status(self, cpu: float, mem_used: int, mem_avail: int, writable: WritableState):
         self.ui.pbar_cpu_usage.setValue(int(100.0 - cpu))
         self.ui.pbar_cpu_usage.setFormat("{0:.2f} %".format(100.0 - cpu))
@@ -1128,18 +1681,17 @@ class DeployToolWindow(QMainWindow):
         self.update_status_sig.emit(cpu, mem_used, mem_avail, writable)
 
     def do_populate_status(self):
-        # Read versions once after connecting
-        _, stdout, _ = self.ssh.exec_command("dt-getversions.sh", timeout=self.command_timeout)
-        img_version = stdout.readline().strip()
-        py_version = stdout.readline().strip()
-        tool_version = stdout.readline().strip()
-        self.set_versions(img_version, py_version, tool_version)
-
-        # Periodically read CPU usage, memory usage, and readonly status
-        while self.ssh_connected:
+        # Versions are read by prefetch. Periodically read CPU usage, memory usage, and readonly status
+        token = current_task().token
+        while self.ssh_connected and not token.cancelled:
             try:
-                _, stdout_cpu, _ = self.ssh.exec_command("dt-getidlecpu.sh", timeout=self.command_timeout)
-                _, stdout_mem, _ = self.ssh.exec_command("dt-getmeminfo.sh", timeout=self.command_timeout)
+                # One round trip sample per update keeps the timeout estimate current
+                rtt = measure_rtt(self.ssh.get_transport(), self.timeout(OP_QUERY))
+                if rtt is not None:
+                    self.rtt.add(rtt)
+
+                _, stdout_cpu, _ = self.ssh.exec_command("dt-getidlecpu.sh", timeout=self.timeout(OP_QUERY))
+                _, stdout_mem, _ = self.ssh.exec_command("dt-getmeminfo.sh", timeout=self.timeout(OP_QUERY))
                 
                 writable_state = self.do_writable_check()
 
@@ -1156,25 +1708,47 @@ class DeployToolWindow(QMainWindow):
                     mem_avail = 0
                 
                 self.update_status(cpu, mem_used, mem_avail, writable_state)
-                time.sleep(1)
-            except SSHException:
-                pass
+                token.wait(1)
+            except (SSHException, socket.timeout):
+                # A slow update (timeout) is skipped instead of ending status updates
+                token.wait(1)
 
     def populate_robot_status(self):
         task = Task(self, self.do_populate_status)
-        self.start_task(task)
+        self.start_task(task, STREAM_QUEUE)
+
+    def do_watch_writable(self):
+        # Streams the root filesystem's mount options as they change (see MOUNT_WATCH_COMMAND)
+        token = current_task().token
+        while self.ssh_connected and not token.cancelled:
+            try:
+                _, stdout, _ = self.ssh.exec_command(MOUNT_WATCH_COMMAND, timeout=None)
+                while self.ssh_connected and not token.cancelled:
+                    line = stdout.readline()
+                    if line == "":
+                        break
+                    self.writable_state.set(parse_mount_options(line))
+            except SSHException:
+                pass
+            # Not watching any more, so the cached state can't be trusted
+            self.writable_state.clear()
+            token.wait(1)
+
+    def watch_writable(self):
+        task = Task(self, self.do_watch_writable)
+        self.start_task(task, STREAM_QUEUE)
 
     def shutdown_robot(self):
-        _, stdout, _ = self.ssh.exec_command("nohup dt-shutdown.sh > /dev/null 2>&1 &", timeout=self.command_timeout)
+        _, stdout, _ = self.ssh.exec_command("nohup dt-shutdown.sh > /dev/null 2>&1 &", timeout=self.timeout(OP_QUERY))
         stdout.channel.recv_exit_status()
     
     def reboot_robot(self):
-        _, stdout, _ = self.ssh.exec_command("nohup dt-reboot.sh > /dev/null 2>&1 &", timeout=self.command_timeout)
+        _, stdout, _ = self.ssh.exec_command("nohup dt-reboot.sh > /dev/null 2>&1 &", timeout=self.timeout(OP_QUERY))
         stdout.channel.recv_exit_status()
     
     def do_restart_program(self):
         try:
-            _, stdout, _ = self.ssh.exec_command("dt-stop_program.sh", timeout=10)
+            _, stdout, _ = self.ssh.exec_command("dt-stop_program.sh", timeout=self.timeout(OP_PROGRAM))
             stdout.channel.recv_exit_status()
         except SSHException:
             raise Exception("Failed to stop robot program.")
@@ -1185,7 +1759,7 @@ class DeployToolWindow(QMainWindow):
         
         self.change_progress_msg(self.tr("Starting robot program..."))
         try:
-            _, stdout, _ = self.ssh.exec_command("dt-start_program.sh", timeout=10)
+            _, stdout, _ = self.ssh.exec_command("dt-start_program.sh", timeout=self.timeout(OP_PROGRAM))
             stdout.channel.recv_exit_status()
         except SSHException:
             raise Exception(self.tr("Failed to stop robot program."))
@@ -1207,16 +1781,43 @@ class DeployToolWindow(QMainWindow):
         task = Task(self, self.do_restart_program)
         task.task_complete.connect(self.restart_program_success)
         task.task_exception.connect(self.restart_program_fail)
-        self.start_task(task)
+        self.start_task(task, SSH_QUEUE)
 
     def make_robot_writable(self):
-        _, stdout, _ = self.ssh.exec_command("nohup dt-rw.sh > /dev/null 2>&1 &", timeout=self.command_timeout)
+        _, stdout, _ = self.ssh.exec_command("nohup dt-rw.sh > /dev/null 2>&1 &", timeout=self.timeout(OP_COMMAND))
         stdout.channel.recv_exit_status()
+
+    def do_make_robot_writable(self):
+        # Used by writable sessions. Waits for the remount to finish since the session's work depends on it.
+        _, stdout, _ = self.ssh.exec_command("dt-rw.sh > /dev/null 2>&1", timeout=self.timeout(OP_COMMAND))
+        if stdout.channel.recv_exit_status() == 0:
+            self.writable_state.set(WritableState.ReadWrite)
+        else:
+            self.writable_state.clear()
     
     def make_robot_readonly(self):
-        _, stdout, _ = self.ssh.exec_command("nohup dt-ro.sh > /dev/null 2>&1 &", timeout=self.command_timeout)
+        _, stdout, _ = self.ssh.exec_command("nohup dt-ro.sh > /dev/null 2>&1 &", timeout=self.timeout(OP_COMMAND))
         stdout.channel.recv_exit_status()
 
+    def do_make_robot_readonly(self):
+        # Used by writable sessions. Waits for the remount so the cached state is correct for the next session.
+        _, stdout, _ = self.ssh.exec_command("dt-ro.sh > /dev/null 2>&1", timeout=self.timeout(OP_COMMAND))
+        if stdout.channel.recv_exit_status() == 0:
+            self.writable_state.set(WritableState.Readonly)
+        else:
+            self.writable_state.clear()
+
+    def user_make_robot_writable(self):
+        # Remount runs in the background. The watcher reports the new state once it is done.
+        self.writable.user_changed()
+        self.writable_state.clear()
+        self.make_robot_writable()
+
+    def user_make_robot_readonly(self):
+        self.writable.user_changed()
+        self.writable_state.clear()
+        self.make_robot_readonly()
+
 
     ############################################################################
     # Network settings tab
@@ -1229,40 +1830,35 @@ class DeployToolWindow(QMainWindow):
         self.ui.txt_wifi_country.setText(country)
         self.ui.txt_wifi_channel.setText(channel)
 
-    def update_network_info(self, hostname: str, ssid: str, password: str, country: str, channel: str):
-        self.update_net_info_sig.emit(hostname, ssid, password, country, channel)
-
-    def do_populate_network_settings(self):
-        _, stdout_host, _ = self.ssh.exec_command("dt-hostname.sh", timeout=self.command_timeout)
-        _, stdout_ap, _ = self.ssh.exec_command("dt-wifi_ap.sh", timeout=self.command_timeout)
-
-        hostname = stdout_host.readline().strip()
-
-        ssid = stdout_ap.readline().strip()
-        password = stdout_ap.readline().strip()
-        country = stdout_ap.readline().strip()
-        channel = stdout_ap.readline().strip()
-
-        self.update_network_info(hostname, ssid, password, country, channel)
-
-    def populate_network_settings(self):
-        self.show_progress(self.tr("Loading"), self.tr("Loading info from robot..."))
-        task = Task(self, self.do_populate_network_settings)
-        task.task_complete.connect(lambda res: self.hide_progress())
-        task.task_exception.connect(lambda e: self.hide_progress())
-        self.start_task(task)
+    def network_fields(self) -> NetworkConfig:
+        return NetworkConfig(self.ui.txt_hostname.text(), self.ui.txt_wifi_ssid.text(), self.ui.txt_wifi_pass.text(),
+            self.ui.txt_wifi_country.text(), self.ui.txt_wifi_channel.text())
+
+    def do_fetch_network_settings(self) -> NetworkConfig:
+        # Hostname and access point settings are read in one command
+        _, stdout, _ = self.ssh.exec_command(network_config.FETCH_COMMAND, timeout=self.timeout(OP_QUERY))
+        return network_config.parse_fetch_output(stdout.read().decode(errors="replace"))
+
+    def show_network_settings(self, config: NetworkConfig):
+        self.network_config = config
+        self.ui.btn_network_apply.setEnabled(True)
+        # A background refresh doesn't overwrite fields the user is editing
+        if self.network_fields() == self.network_config_shown:
+            self.do_update_network_info(config.hostname, config.ssid, config.password, config.country, config.channel)
+            self.network_config_shown = config
     
-    def do_apply_network_settings(self, ssid: str, psk: str, country: str, channel: int):
-        orig_state = self.do_writable_check()
-        if orig_state != WritableState.ReadWrite:
-            self.make_robot_writable()
-
-        _, stdout, _ = self.ssh.exec_command("nohup dt-wifi_ap.sh '{0}' '{1}' '{2}' '{3}'  > /dev/null 2>&1".format(ssid, psk, country, channel),
-                timeout=self.command_timeout)
-        stdout.channel.recv_exit_status()
-
-        if orig_state == WritableState.Readonly:
-            self.make_robot_readonly()
+    def do_apply_network_settings(self, old_config: NetworkConfig, new_config: NetworkConfig) -> Tuple[NetworkConfig, NetworkConfig]:
+        # Everything that changed is applied in one command during one writable session
+        # Returns (old config, new config). The UI's state is updated by post_apply_network_settings.
+        cmd = network_config.apply_command(old_config, new_config)
+        if cmd == "":
+            return old_config, new_config
+        with self.writable:
+            _, stdout, _ = self.ssh.exec_command(cmd, timeout=self.timeout(OP_COMMAND))
+            res = stdout.channel.recv_exit_status()
+        if res != 0:
+            raise Exception(self.tr("Failed to apply network settings."))
+        return old_config, new_config
 
     def apply_network_settings(self):
         ssid = self.ui.txt_wifi_ssid.text()
@@ -1280,6 +1876,7 @@ class DeployToolWindow(QMainWindow):
             dialog.setWindowTitle(self.tr("WiFi Settings Invalid"))
             dialog.setStandardButtons(QMessageBox.Ok)
             dialog.exec()
+            return
         
         if len(ssid) < 2:
             dialog = QMessageBox(parent=self)
@@ -1288,6 +1885,7 @@ class DeployToolWindow(QMainWindow):
             dialog.setWindowTitle(self.tr("WiFi Settings Invalid"))
             dialog.setStandardButtons(QMessageBox.Ok)
             dialog.exec()
+            return
         
         if len(psk) < 8:
             dialog = QMessageBox(parent=self)
@@ -1296,6 +1894,7 @@ class DeployToolWindow(QMainWindow):
             dialog.setWindowTitle(self.tr("WiFi Settings Invalid"))
             dialog.setStandardButtons(QMessageBox.Ok)
             dialog.exec()
+            return
         
         if len(country) < 2 or country not in WIFI_COUNTRY_CODES:
             dialog = QMessageBox(parent=self)
@@ -1304,15 +1903,24 @@ class DeployToolWindow(QMainWindow):
             dialog.setWindowTitle(self.tr("WiFi Settings Invalid"))
             dialog.setStandardButtons(QMessageBox.Ok)
             dialog.exec()
+            return
         
+        config = NetworkConfig(self.ui.txt_hostname.text(), ssid, psk, country, str(channel))
         self.show_progress(self.tr("Applying Network Settings"), self.tr("Applying network setting changes on robot..."))
-        task = Task(self, self.do_apply_network_settings, ssid, psk, country, channel)
-        task.task_complete.connect(lambda res: self.hide_progress())
-        task.task_exception.connect(lambda e: self.hide_progress())
-        self.start_task(task)
+        task = Task(self, self.do_apply_network_settings, self.network_config, config)
+        task.task_complete.connect(self.post_apply_network_settings)
+        task.task_exception.connect(self.apply_network_settings_failed)
+        self.start_task(task, SSH_QUEUE)
 
-    def post_apply_reboot(self):
+    def post_apply_network_settings(self, configs: Tuple[NetworkConfig, NetworkConfig]):
+        old_config, new_config = configs
         self.hide_progress()
+        self.network_config = new_config
+        self.network_config_shown = new_config
+        self.tab_data.put(tab_cache.NETWORK, new_config)
+        # A reboot is needed for a new hostname to take effect
+        if not new_config.hostname_changed(old_config):
+            return
         dialog = QMessageBox(parent=self)
         dialog.setIcon(QMessageBox.Question)
         dialog.setText(self.tr("The hostname was successfully changed, however a reboot is necessary for changes to take effect. Reboot now?"))
@@ -1322,108 +1930,160 @@ class DeployToolWindow(QMainWindow):
         if res == QMessageBox.Yes:
             self.reboot_robot()
 
-    def do_apply_hostname(self, hostname: str):
-        orig_state = self.do_writable_check()
-        if orig_state != WritableState.ReadWrite:
-            self.make_robot_writable()
-        
-        _, stdout, _ = self.ssh.exec_command("nohup dt-hostname.sh '{0}' > /dev/null 2>&1".format(hostname),timeout=self.command_timeout)
-        stdout.channel.recv_exit_status()
+    def apply_network_settings_failed(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(str(e))
+        dialog.setWindowTitle(self.tr("Applying Network Settings Failed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
 
-        if orig_state == WritableState.Readonly:
-            self.make_robot_readonly()
+    def do_survey_wifi_channels(self) -> List[wifi_survey.AccessPoint]:
+        # Output is parsed as it arrives so the number of networks found can be shown
+        token = current_task().token
+        parser = wifi_survey.ScanParser()
+        _, stdout, stderr = self.ssh.exec_command(wifi_survey.SCAN_COMMAND, timeout=self.timeout(OP_SCAN))
+        shown = 0
+        for line in stdout:
+            token.check()
+            parser.feed_line(line)
+            # Only update the message when the count changes (scan output has many lines per network)
+            count = len(parser.networks_2ghz)
+            if count != shown:
+                shown = count
+                self.change_progress_msg(self.tr("Scanning for nearby networks... {0} found").format(shown))
+        if stdout.channel.recv_exit_status() != 0:
+            print(stderr.read().decode(errors="replace"))
+            raise Exception(self.tr("Failed to scan for nearby networks."))
+        return parser.networks_2ghz
+
+    def handle_survey_complete(self, aps: List[wifi_survey.AccessPoint]):
+        self.hide_progress()
+        from wifi_survey_dialog import WifiSurveyDialog
+        scores = wifi_survey.score_channels(aps, wifi_survey.allowed_channels(self.ui.txt_wifi_country.text()))
+        dialog = WifiSurveyDialog(aps, scores, self.ui.txt_wifi_channel.text(), self)
+        if dialog.exec() == QDialog.Accepted and dialog.selected_channel() is not None:
+            # Applied like any other change to the network settings
+            self.ui.txt_wifi_channel.setText(str(dialog.selected_channel()))
+            self.apply_network_settings()
+
+    def handle_survey_failure(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(str(e))
+        dialog.setWindowTitle(self.tr("Wi-Fi Survey Failed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
 
-    def apply_hostname(self):
-        self.show_progress(self.tr("Changing Hostname"), self.tr("Changing robot hostname..."))
-        task = Task(self, self.do_apply_hostname, self.ui.txt_hostname.text())
-        task.task_exception.connect(self.hide_progress)
-        task.task_complete.connect(self.post_apply_reboot)
-        self.start_task(task)
+    def survey_wifi_channels(self):
+        self.show_progress(self.tr("Wi-Fi Survey"), self.tr("Scanning for nearby networks..."))
+        task = Task(self, self.do_survey_wifi_channels)
+        task.task_complete.connect(self.handle_survey_complete)
+        task.task_exception.connect(self.handle_survey_failure)
+        self.start_task(task, SSH_QUEUE)
 
 
     ############################################################################
     # Camera streaming tab
     ############################################################################
     
-    def write_camstream_config(self, name: str, config: str):
+    def read_camstream_config(self, name: str) -> str:
+        # Configs are normally prefetched by do_fetch_streams
+        config = self.camstream_configs.get(name)
+        if config is not None:
+            return config
         username = self.ui.txt_username.text()
-        orig_state = self.do_writable_check()
-        if orig_state != WritableState.ReadWrite:
-            self.make_robot_writable()
-        
-        sftp = None
+        sftp = self.ssh.open_sftp()
         try:
-            sftp = self.ssh.open_sftp()
-            with sftp.open("/home/{1}/camstream/{0}.txt".format(name, username), "w") as file:
-                file.write(config.encode())
+            with sftp.open("/home/{1}/camstream/{0}.txt".format(name, username), "r") as file:
+                config = file.read().decode()
+        finally:
             sftp.close()
-        except (SSHException, SFTPError) as e:
+        self.camstream_configs.put(name, config)
+        return config
+
+    def do_write_camstream_config(self, username: str, name: str, config: str):
+        try:
+            with self.writable:
+                sftp = self.ssh.open_sftp()
+                try:
+                    with sftp.open("/home/{1}/camstream/{0}.txt".format(name, username), "w") as file:
+                        file.write(config.encode())
+                finally:
+                    sftp.close()
+        except (SSHException, SFTPError, OSError) as e:
+            # OSError includes socket.timeout (eg from the remount)
             print(e)
-            if sftp is not None:
-                sftp.close()
-        
-        if orig_state == WritableState.Readonly:
-            self.make_robot_readonly()
+            raise Exception(self.tr("Failed to save stream '{0}'.").format(name))
+        self.camstream_configs.put(name, config)
+
+    def do_delete_camstream(self, username: str, name: str):
+        try:
+            with self.writable:
+                sftp = self.ssh.open_sftp()
+                try:
+                    sftp.remove("/home/{1}/camstream/{0}.txt".format(name, username))
+                finally:
+                    sftp.close()
+        except (SSHException, SFTPError, OSError) as e:
+            print(e)
+            raise Exception(self.tr("Failed to delete stream '{0}'.").format(name))
+        self.camstream_configs.remove(name)
+
+    def handle_camstream_changed(self, res: Any):
+        self.hide_progress()
+        self.populate_streams()
+
+    def handle_camstream_change_failure(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(str(e))
+        dialog.setWindowTitle(self.tr("SFTP Error"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+        self.populate_streams()
+
+    def write_camstream_config(self, name: str, config: str):
+        # Streams are reloaded once written
+        self.show_progress(self.tr("Saving Stream"), self.tr("Saving stream '{0}'...").format(name))
+        task = Task(self, self.do_write_camstream_config, self.ui.txt_username.text(), name, config)
+        task.task_complete.connect(self.handle_camstream_changed)
+        task.task_exception.connect(self.handle_camstream_change_failure)
+        self.start_task(task, SSH_QUEUE)
 
     def new_camstream(self):
+        from camstream_dialog import CamstreamDialog
         dialog = CamstreamDialog(self)
         res = dialog.exec()
         if res == QDialog.Accepted:
             name = dialog.get_config_name()
             config = dialog.to_config()
             self.write_camstream_config(name, config)
-            self.populate_streams()
     
     def delete_camstream(self):
-        username = self.ui.txt_username.text()
+        name = self.ui.combox_stream_source.currentText()
         dialog = QMessageBox(parent=self)
         dialog.setIcon(QMessageBox.Question)
-        dialog.setText(self.tr("Are you sure you want to delete '{0}'?".format(self.ui.combox_stream_source.currentText())))
+        dialog.setText(self.tr("Are you sure you want to delete '{0}'?".format(name)))
         dialog.setWindowTitle(self.tr("Confirm Delete"))
         dialog.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
         res = dialog.exec()
         if res == QMessageBox.Yes:
-            orig_state = self.do_writable_check()
-            if orig_state != WritableState.ReadWrite:
-                self.make_robot_writable()
-
-            sftp = None
-            try:
-                sftp = self.ssh.open_sftp()
-                sftp.remove("/home/{1}/camstream/{0}.txt".format(self.ui.combox_stream_source.currentText(), username))
-                sftp.close()
-            except (SSHException, SFTPError) as e:
-                print(e)
-                if sftp is not None:
-                    sftp.close()
-
-            if orig_state == WritableState.Readonly:
-                self.make_robot_readonly()
-
-            self.populate_streams()
+            self.show_progress(self.tr("Deleting Stream"), self.tr("Deleting stream '{0}'...").format(name))
+            task = Task(self, self.do_delete_camstream, self.ui.txt_username.text(), name)
+            task.task_complete.connect(self.handle_camstream_changed)
+            task.task_exception.connect(self.handle_camstream_change_failure)
+            self.start_task(task, SSH_QUEUE)
     
     def edit_camstream(self):
-        username = self.ui.txt_username.text()
         if self.ui.combox_stream_source.currentText() != "":
-            sftp = None
             try:
-                sftp = self.ssh.open_sftp()
-                with sftp.open("/home/{1}/camstream/{0}.txt".format(self.ui.combox_stream_source.currentText(), username), "r") as file:
-                    config = file.read().decode()
-                dialog = CamstreamDialog(self)
-                dialog.set_config_name(self.ui.combox_stream_source.currentText())
-                dialog.disable_edit_config_name()
-                dialog.from_config(config)
-                res = dialog.exec()
-                if res == QDialog.Accepted:
-                    name = dialog.get_config_name()
-                    new_config = dialog.to_config()
-                    self.write_camstream_config(name, new_config)
-                sftp.close()
-            except (SSHException, SFTPError) as e:
+                config = self.read_camstream_config(self.ui.combox_stream_source.currentText())
+            except (SSHException, SFTPError, IOError) as e:
                 print(e)
-                if sftp is not None:
-                    sftp.close()
                 dialog = QMessageBox(parent=self)
                 dialog.setIcon(QMessageBox.Warning)
                 dialog.setTextFormat(Qt.RichText)
@@ -1431,6 +2091,19 @@ class DeployToolWindow(QMainWindow):
                 dialog.setWindowTitle(self.tr("SFTP Error"))
                 dialog.setStandardButtons(QMessageBox.Ok)
                 dialog.exec()
+                return
+            from camstream_dialog import CamstreamDialog
+            dialog = CamstreamDialog(self)
+            dialog.set_config_name(self.ui.combox_stream_source.currentText())
+            dialog.disable_edit_config_name()
+            dialog.from_config(config)
+            res = dialog.exec()
+            if res == QDialog.Accepted:
+                name = dialog.get_config_name()
+                new_config = dialog.get_config()
+                # Only write back (and remount) if something actually changed
+                if new_config != CamstreamConfig.parse(config):
+                    self.write_camstream_config(name, new_config.serialize())
     
     def change_player_download_link(self, text: str):
         if text == self.tr("ffplay"):
@@ -1440,125 +2113,128 @@ class DeployToolWindow(QMainWindow):
         elif text == self.tr("mplayer"):
             self.ui.lbl_camstream_download.setText("<a href=\"http://www.mplayerhq.hu/design7/news.html\">Download Player</a>")
 
-    def do_populate_streams(self):
-        # Load list of streams from the remote device
-        sftp = None
+    def do_fetch_streams(self) -> Tuple[List[str], Dict[str, services.ServiceState]]:
+        # Load service states and list of streams (and their configs) from the remote device in one command
         username = self.ui.txt_username.text()
-        try:
-            sftp = self.ssh.open_sftp()
-            paths = self.sftp_list_directory(sftp, "/home/{0}/camstream/".format(username))
-            sftp.close()
-        except (SSHException, SFTPError) as e:
-            print(e)
-            paths = []
-            if sftp is not None:
-                sftp.close()
-            return
-        
-        streams = []
-        for entry in paths:
-            if entry.endswith(".txt"):
-                streams.append(entry[:-4])
-
-        # Clear old items
+        cmd = "{0}; echo @@configs; {1}".format(
+            services.query_command(services.STREAM_SERVICES),
+            self.camstream_configs.fetch_command("/home/{0}/camstream/".format(username)))
+        _, stdout, _ = self.ssh.exec_command(cmd, timeout=self.timeout(OP_QUERY))
+        data = stdout.read()
+        service_data, _, config_data = data.partition(b"@@configs\n")
+        streams = self.camstream_configs.apply_fetch_output(config_data)
+        states = services.parse_query_output(service_data.decode(errors="replace"), services.STREAM_SERVICES)
+        return streams, states
+
+    def show_streams(self, data: Tuple[List[str], Dict[str, services.ServiceState]]):
+        streams, states = data
+
+        # Keep the selected stream if it still exists
+        selected = self.ui.combox_stream_source.currentText()
         self.ui.combox_stream_source.clear()
-        
-        # Add items
         for stream in streams:
             self.ui.combox_stream_source.addItem(stream)
+        if selected in streams:
+            self.ui.combox_stream_source.setCurrentIndex(streams.index(selected))
+        elif len(streams) > 0:
+            self.ui.combox_stream_source.setCurrentIndex(0)
         
-        # Check if services are running
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl is-enabled camstream.service")
-        stdout.channel.recv_exit_status()
-        data = stdout.read().decode().strip().lower()
-        self.ui.cbx_camstream_boot.setChecked(data == "enabled")
+        self.do_update_service_states(states)
 
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl is-enabled rtsp-simple-server.service")
-        stdout.channel.recv_exit_status()
-        data = stdout.read().decode().strip().lower()
-        self.ui.cbx_enable_rtsp.setChecked(data == "enabled")
-
-    def handle_popstreams_complete(self, res):
+    def handle_popstreams_complete(self, data: Tuple[List[str], Dict[str, services.ServiceState]]):
         self.hide_progress()
-        if self.ui.combox_stream_source.count() > 0:
-            self.ui.combox_stream_source.setCurrentIndex(0)
+        self.tab_data.put(tab_cache.STREAMS, data)
+        self.show_streams(data)
 
     def handle_popstreams_exc(self, e):
         self.hide_progress()
         print(e)
 
     def populate_streams(self):
+        # Reads streams again now (after streams or services were changed)
         self.show_progress(self.tr("Loading"), self.tr("Loading info from robot..."))
-        task = Task(self, self.do_populate_streams)
+        task = Task(self, self.do_fetch_streams)
         task.task_complete.connect(self.handle_popstreams_complete)
         task.task_exception.connect(self.handle_popstreams_exc)
-        self.start_task(task)
+        self.start_task(task, SSH_QUEUE)
+
+    def do_update_service_states(self, states: Dict[str, services.ServiceState]):
+        camstream = states[services.CAMSTREAM_SERVICE]
+        rtsp = states[services.RTSP_SERVICE]
+        self.ui.cbx_camstream_boot.setChecked(camstream.enabled)
+        self.ui.cbx_enable_rtsp.setChecked(rtsp.enabled)
+        self.ui.btn_camstream_start.setEnabled(not camstream.active)
+        self.ui.btn_camstream_stop.setEnabled(camstream.active)
+        self.ui.btn_rtsp_start.setEnabled(not rtsp.active)
+        self.ui.btn_rtsp_stop.setEnabled(rtsp.active)
+
+    def update_service_states(self, states: Dict[str, services.ServiceState]):
+        self.update_service_states_sig.emit(states)
+
+    def do_change_services(self, changes: List[Tuple[str, str]]) -> Dict[str, services.ServiceState]:
+        # Apply all changes in one command, then read back the state of the services
+        cmd = "{0}; res=$?; {1}; exit $res".format(services.apply_command(changes), services.query_command(services.STREAM_SERVICES))
+        if services.needs_writable(changes):
+            with self.writable:
+                _, stdout, _ = self.ssh.exec_command(cmd, timeout=self.timeout(OP_COMMAND))
+                data = stdout.read().decode(errors="replace")
+                res = stdout.channel.recv_exit_status()
+        else:
+            _, stdout, _ = self.ssh.exec_command(cmd, timeout=self.timeout(OP_COMMAND))
+            data = stdout.read().decode(errors="replace")
+            res = stdout.channel.recv_exit_status()
+
+        if res != 0:
+            raise Exception(self.tr("Failed to change system services."))
+        return services.parse_query_output(data, services.STREAM_SERVICES)
+
+    def handle_change_services_complete(self, states: Dict[str, services.ServiceState]):
+        self.hide_progress()
+        self.do_update_service_states(states)
+        cached = self.tab_data.get(tab_cache.STREAMS)
+        if cached is not None:
+            self.tab_data.put(tab_cache.STREAMS, (cached[0], states))
+
+    def handle_change_services_failure(self, e: Exception):
+        self.hide_progress()
+        dialog = QMessageBox(parent=self)
+        dialog.setIcon(QMessageBox.Warning)
+        dialog.setText(str(e))
+        dialog.setWindowTitle(self.tr("Modifying System Services Failed"))
+        dialog.setStandardButtons(QMessageBox.Ok)
+        dialog.exec()
+        self.populate_streams()
+
+    def change_services(self, changes: List[Tuple[str, str]]):
+        self.show_progress(self.tr("Modifying system services"), self.tr("Changing services..."))
+        task = Task(self, self.do_change_services, changes)
+        task.task_complete.connect(self.handle_change_services_complete)
+        task.task_exception.connect(self.handle_change_services_failure)
+        self.start_task(task, SSH_QUEUE)
 
     def start_camstream(self):
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl start camstream.service")
-        stdout.channel.recv_exit_status()
+        self.change_services([("start", services.CAMSTREAM_SERVICE)])
 
     def stop_camstream(self):
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl stop camstream.service")
-        stdout.channel.recv_exit_status()
+        self.change_services([("stop", services.CAMSTREAM_SERVICE)])
 
     def start_rtsp(self):
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl start rtsp-simple-server.service")
-        stdout.channel.recv_exit_status()
+        self.change_services([("start", services.RTSP_SERVICE)])
 
     def stop_rtsp(self):
-        _, stdout, _ = self.ssh.exec_command("sudo systemctl stop rtsp-simple-server.service")
-        stdout.channel.recv_exit_status()
-
-    def do_enable_camstream_changed(self, state: int):
-        orig_state = self.do_writable_check()
-        if orig_state != WritableState.ReadWrite:
-            self.make_robot_writable()
-
-        if state == Qt.Checked:
-            _, stdout, _ = self.ssh.exec_command("sudo systemctl enable camstream.service")
-            stdout.channel.recv_exit_status()
-        else:
-            _, stdout, _ = self.ssh.exec_command("sudo systemctl disable camstream.service")
-            stdout.channel.recv_exit_status()
-        
-        if orig_state == WritableState.Readonly:
-            self.make_robot_readonly()
+        self.change_services([("stop", services.RTSP_SERVICE)])
 
     def enable_camstream_changed(self, checked: bool):
-        self.show_progress(self.tr("Modifying system services"), self.tr("Changing boot services..."))
-        task = Task(self, self.do_enable_camstream_changed, self.ui.cbx_camstream_boot.checkState())
-        task.task_complete.connect(lambda res: self.hide_progress())
-        task.task_exception.connect(lambda e: self.hide_progress())
-        self.start_task(task)
-    
-    def do_enable_rtsp_changed(self, state: int):
-        orig_state = self.do_writable_check()
-        if orig_state != WritableState.ReadWrite:
-            self.make_robot_writable()
-        
-        if state == Qt.Checked:
-            _, stdout, _ = self.ssh.exec_command("sudo systemctl enable rtsp-simple-server.service")
-            stdout.channel.recv_exit_status()
-        else:
-            _, stdout, _ = self.ssh.exec_command("sudo systemctl disable rtsp-simple-server.service")
-            stdout.channel.recv_exit_status()
-        
-        if orig_state == WritableState.Readonly:
-            self.make_robot_readonly()
+        self.change_services([("enable" if checked else "disable", services.CAMSTREAM_SERVICE)])
     
     def enable_rtsp_changed(self, checked: bool):
-        self.show_progress(self.tr("Modifying system services"), self.tr("Changing boot services..."))
-        task = Task(self, self.do_enable_rtsp_changed, self.ui.cbx_enable_rtsp.checkState())
-        task.task_complete.connect(lambda res: self.hide_progress())
-        task.task_exception.connect(lambda e: self.hide_progress())
-        self.start_task(task)
+        self.change_services([("enable" if checked else "disable", services.RTSP_SERVICE)])
 
     def play_stream(self):
         # Check to make sure player is installed
         player = self.ui.combox_camstream_player.currentText()
         stream = self.ui.combox_stream_source.currentText()
-        path = shutil.which(player)
+        path = path_index.which(player)
 
         # Make sure player is in PATH
         if path == "" or path == None:
@@ -1581,41 +2257,19 @@ class DeployToolWindow(QMainWindow):
             dialog.exec()
             return
 
-        username = self.ui.txt_username.text()
-        sftp = None
         try:
-            sftp = self.ssh.open_sftp()
-            with sftp.open("/home/{1}/camstream/{0}.txt".format(stream, username), "r") as file:
-                selected_config = file.read().decode()
-            sftp.close()
-        except (SSHException, SFTPError) as e:
+            selected_config = self.read_camstream_config(stream)
+        except (SSHException, SFTPError, IOError) as e:
             print(e)
-            if sftp is not None:
-                sftp.close()
+            selected_config = ""
 
         # Parse selected config to determine arguments for the playback script
-        selected_config = re.sub("\s", " ", selected_config)
-        items = selected_config.split(" ")
-
-        netmode = "rtsp"
-        port = ""
-        rtsp_key = "stream"
-        format = "h264"
-        framerate = 30
-        for i in range(len(items)):
-            if items[i] == "--netmode":
-                netmode = items[i+1]
-            elif items[i] == "--port":
-                port = items[i+1]
-            elif items[i] == "--rtspkey":
-                rtsp_key = items[i+1]
-            elif items[i] == "--format":
-                format = items[i+1]
-            elif items[i] == "--framerate":
-                try:
-                    framerate = int(items[i+1])
-                except:
-                    pass
+        config = CamstreamConfig.parse(selected_config)
+        netmode = config.get_text("--netmode", "rtsp")
+        port = config.get_text("--port", "")
+        rtsp_key = config.get_text("--rtspkey", "stream")
+        format = config.get_text("--format", "h264")
+        framerate = config.get("--framerate", 30)
         
         # Double framerate for playback if enabled
         if self.ui.cbx_camstream_2fr.isChecked():
@@ -1642,12 +2296,64 @@ class DeployToolWindow(QMainWindow):
             startupinfo = None
         cmd = self.construct_play_command(address, netmode, port, rtsp_key, player, framerate, format)
         print(cmd)
-        p = subprocess.Popen(cmd, startupinfo=startupinfo, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        pdialog = PlayStreamDialog("Playing Stream", "Playing stream '{0}' using {1}...".format(stream, player), p, self)
+        if platform.system() != "Windows":
+            # Popen only accepts a command string on Windows
+            cmd = shlex.split(cmd)
+        # Player output is read by the dialog to show stream statistics
+        p = subprocess.Popen(cmd, startupinfo=startupinfo, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        from playstream_dialog import PlayStreamDialog
+        pdialog = PlayStreamDialog("Playing Stream", "Playing stream '{0}' using {1}...".format(stream, player), p, player, self)
         self.camstreams.append(pdialog)
         pdialog.finished.connect(lambda res: self.camstreams.remove(pdialog))
         pdialog.show()
     
+    def measure_latency(self):
+        import latency
+        stream = self.ui.combox_stream_source.currentText()
+        ffmpeg = path_index.which("ffmpeg")
+
+        # ffmpeg is used to decode the stream
+        if ffmpeg == "" or ffmpeg == None:
+            dialog = QMessageBox(parent=self)
+            dialog.setIcon(QMessageBox.Warning)
+            dialog.setTextFormat(Qt.RichText)
+            dialog.setText(self.tr("<p>Measuring latency requires ffmpeg, which was not found on your system. Download and install <a href=\"https://ffmpeg.org/\">ffmpeg</a> and make sure the command is in your system path. You will need to restart the deploy tool after chaning the path environment variable.</p>"))
+            dialog.setWindowTitle(self.tr("ffmpeg not found"))
+            dialog.setStandardButtons(QMessageBox.Ok)
+            dialog.exec()
+            return
+
+        # Make sure a stream is selected
+        if stream == "":
+            dialog = QMessageBox(parent=self)
+            dialog.setIcon(QMessageBox.Warning)
+            dialog.setText(self.tr("No steam was selected. Select a stream before measuring its latency."))
+            dialog.setWindowTitle(self.tr("Cannot Measure Latency"))
+            dialog.setStandardButtons(QMessageBox.Ok)
+            dialog.exec()
+            return
+
+        try:
+            selected_config = self.read_camstream_config(stream)
+        except (SSHException, SFTPError, IOError) as e:
+            print(e)
+            selected_config = ""
+
+        config = CamstreamConfig.parse(selected_config)
+        address = self.ui.txt_address.text()
+        cmd = latency.decode_command(ffmpeg, config.stream_url(address), config.get("--framerate", 30))
+
+        if platform.system() == "Windows":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        else:
+            startupinfo = None
+        from latency_dialog import LatencyDialog
+        ldialog = LatencyDialog(stream, config.serialize(), address, cmd, startupinfo, self)
+        self.latency_dialogs.append(ldialog)
+        ldialog.finished.connect(lambda res: self.latency_dialogs.remove(ldialog))
+        ldialog.show()
+
     def construct_play_command(self, address, netmode, port, rtspkey, player, framerate, format):
         if address == "auto":
             if netmode == "udp":
@@ -1671,27 +2377,27 @@ class DeployToolWindow(QMainWindow):
             print("ERROR: Unknown netmode.")
 
         if player == "auto":
-            if shutil.which("ffplay") is not None:
+            if path_index.which("ffplay") is not None:
                 player = "ffplay"
-            elif shutil.which("mpv") is not None:
+            elif path_index.which("mpv") is not None:
                 player = "mpv"
-            elif shutil.which("mplayer") is not None:
+            elif path_index.which("mplayer") is not None:
                 player = "mplayer"
             else:
                 print("ERROR: No player found. Install either ffplay, mpv, or mplayer and make sure it is in your PATH.")
 
         if player == "ffplay":
-            if not shutil.which("ffplay"):
+            if not path_index.which("ffplay"):
                 print("ERROR: ffplay not found. Install ffmpeg and ensure ffplay is in your PATH.")
             
             if netmode != "rtsp":
-                cmd = "ffplay -probesize 32 -framerate {fps} -fflags nobuffer -flags low_delay -framedrop -sync ext {url}".format(fps=framerate, url=url)
+                cmd = "ffplay -stats -probesize 32 -framerate {fps} -fflags nobuffer -flags low_delay -framedrop -sync ext {url}".format(fps=framerate, url=url)
             else:
                 # Cannot use -framerate with rtsp
-                cmd = "ffplay -probesize 32 -fflags nobuffer -flags low_delay -framedrop -sync ext {url}".format(url=url)
+                cmd = "ffplay -stats -probesize 32 -fflags nobuffer -flags low_delay -framedrop -sync ext {url}".format(url=url)
                     
         if player == "mpv":
-            if not shutil.which("mpv"):
+            if not path_index.which("mpv"):
                 print("ERROR: mpv not found. Install mpv and ensure it is in your PATH.")
             
             # MPV cannot reliably detect MJPEG and rejects the stream by default
@@ -1701,10 +2407,13 @@ class DeployToolWindow(QMainWindow):
             else:
                 extra = "--demuxer-lavf-probescore=10"
 
-            cmd = "mpv --no-cache --untimed --profile=low-latency --no-correct-pts --fps={fps} --osc=no {extra} {url}".format(fps=framerate, url=url, extra=extra)
+            # Status line parsed by StreamStats (printed even though output is not a terminal)
+            status = "--term-osd=force --term-status-msg=DTSTATS,fps=${=estimated-vf-fps:},br=${=video-bitrate:},drop=${=frame-drop-count:},ddrop=${=decoder-frame-drop-count:},delayed=${=vo-delayed-frame-count:}"
+
+            cmd = "mpv --no-cache --untimed --profile=low-latency --no-correct-pts --fps={fps} --osc=no {status} {extra} {url}".format(fps=framerate, url=url, extra=extra, status=status)
         
         if player == "mplayer":
-            if not shutil.which("mplayer"):
+            if not path_index.which("mplayer"):
                 print("ERROR: mplayer not found. Install mplayer and ensure it is in your PATH.")
             if url.startswith("tcp") or url.startswith("udp"):
                 url = "ffmpeg://{0}".format(url)
@@ -1723,6 +2432,7 @@ class DeployToolWindow(QMainWindow):
         _, stdout, _ = self.ssh.exec_command("sudo journalctl --no-pager -u camstream.service")
         stdout.channel.recv_exit_status()
 
+        from log_dialog import LogDialog
         dialog = LogDialog(self, "Camstream Log", stdout.read().decode())
         dialog.exec()
 
@@ -1730,6 +2440,7 @@ class DeployToolWindow(QMainWindow):
         _, stdout, _ = self.ssh.exec_command("sudo journalctl --no-pager -u rtsp-simple-server.service")
         stdout.channel.recv_exit_status()
 
+        from log_dialog import LogDialog
         dialog = LogDialog(self, "RTSP Log", stdout.read().decode())
         dialog.exec()
 
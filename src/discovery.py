@@ -0,0 +1,297 @@
+import errno
+import ipaddress
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Robots are found by connecting to their SSH server (port 22) and by asking for hostnames using mDNS (avahi)
+SSH_PORT = 22
+MDNS_ADDRESS = ("224.0.0.251", 5353)
+SSH_SERVICE = "_ssh._tcp.local"
+
+# Subnets larger than this are only scanned around the computer's own address
+MAX_PREFIX = 22
+FALLBACK_PREFIX = 24
+
+# Default address of a robot's access point (always probed)
+DEFAULT_ROBOT_ADDRESS = "192.168.10.1"
+
+# Robot images are Raspberry Pi OS, whose sshd identifies itself as Raspbian (older releases) or Debian
+ROBOT_BANNER_MARKERS = ("Raspbian", "Debian")
+
+_TYPE_A = 1
+_TYPE_PTR = 12
+_TYPE_SRV = 33
+
+# Connect still in progress on a non-blocking socket (WSAEWOULDBLOCK on Windows)
+_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035)
+
+
+def subnet_addresses(address: str, prefix: int) -> List[str]:
+    # Host addresses of the subnet containing address (except address itself)
+    if prefix < MAX_PREFIX:
+        prefix = FALLBACK_PREFIX
+    network = ipaddress.IPv4Network("{0}/{1}".format(address, prefix), strict=False)
+    return [str(host) for host in network.hosts() if str(host) != address]
+
+
+def candidate_addresses(interfaces: Iterable[Tuple[str, int]]) -> List[str]:
+    # interfaces is a list of (IPv4 address, prefix length) of this computer
+    addresses = [DEFAULT_ROBOT_ADDRESS]
+    seen = set(addresses)
+    for address, prefix in interfaces:
+        if address.startswith("127.") or address.startswith("169.254."):
+            continue
+        for host in subnet_addresses(address, prefix):
+            if host not in seen:
+                seen.add(host)
+                addresses.append(host)
+    return addresses
+
+
+def likely_robot(address: str, banner: str, hostname: Optional[str]) -> bool:
+    # Robots run Raspberry Pi OS and avahi (so announce a hostname using mDNS). Other SSH servers are not logged in to.
+    # The robot's own access point address is always assumed to be a robot.
+    if address == DEFAULT_ROBOT_ADDRESS:
+        return True
+    return hostname is not None and any(marker in banner for marker in ROBOT_BANNER_MARKERS)
+
+
+def probe_ssh(addresses: List[str], found: Callable[[str, str], None], timeout: float = 0.8, banner_timeout: float = 0.5,
+        max_concurrent: int = 200, port: int = SSH_PORT, cancelled: Callable[[], bool] = lambda: False):
+    """
+    Connects to port 22 of many addresses at once (non-blocking, at most max_concurrent at a time).
+    found(address, banner) is called for each SSH server found, with its identification line ("SSH-2.0-...").
+    Servers on port 22 that don't send one soon after connecting are not SSH servers (or not usable).
+    """
+    sel = selectors.DefaultSelector()
+    pending = list(reversed(addresses))
+    # socket -> [address, deadline, connected]
+    active: Dict[socket.socket, list] = {}
+
+    def finish(sock: socket.socket, banner: Optional[str]):
+        address = active.pop(sock)[0]
+        sel.unregister(sock)
+        sock.close()
+        if banner is not None:
+            found(address, banner)
+
+    try:
+        while (len(pending) > 0 or len(active) > 0) and not cancelled():
+            while len(pending) > 0 and len(active) < max_concurrent:
+                address = pending.pop()
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                if sock.connect_ex((address, port)) in _IN_PROGRESS:
+                    active[sock] = [address, time.monotonic() + timeout, False]
+                    sel.register(sock, selectors.EVENT_WRITE)
+                else:
+                    sock.close()
+
+            for key, _ in sel.select(timeout=0.05):
+                sock = key.fileobj
+                state = active[sock]
+                if not state[2]:
+                    # Connect finished (or failed)
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+                        finish(sock, None)
+                    else:
+                        state[1] = time.monotonic() + banner_timeout
+                        state[2] = True
+                        sel.modify(sock, selectors.EVENT_READ)
+                else:
+                    # The server sends its identification line first
+                    try:
+                        data = sock.recv(256)
+                    except OSError:
+                        data = b""
+                    line = data.split(b"\n")[0].strip().decode(errors="replace")
+                    finish(sock, line if line.startswith("SSH-") else None)
+
+            now = time.monotonic()
+            for sock, state in list(active.items()):
+                if now > state[1]:
+                    finish(sock, None)
+    finally:
+        for sock in list(active.keys()):
+            sock.close()
+        sel.close()
+
+
+def _encode_name(name: str) -> bytes:
+    return b"".join(bytes([len(part)]) + part.encode() for part in name.rstrip(".").split(".")) + b"\0"
+
+
+def _decode_name(data: bytes, offset: int) -> Tuple[str, int]:
+    # Returns (name, offset after the name). Follows compression pointers.
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            if jumps > 32:
+                raise ValueError("Bad name compression")
+        elif length == 0:
+            offset += 1
+            break
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode(errors="replace"))
+            offset += 1 + length
+    return ".".join(labels), end if end is not None else offset
+
+
+def build_query(questions: List[Tuple[str, int]]) -> bytes:
+    # Query asking for unicast responses (QU bit), so responses come straight back to the query's socket
+    packet = struct.pack("!HHHHHH", 0, 0, len(questions), 0, 0, 0)
+    for name, qtype in questions:
+        packet += _encode_name(name) + struct.pack("!HH", qtype, 0x8001)
+    return packet
+
+
+def parse_response(data: bytes) -> List[Tuple[str, int, object]]:
+    # Resource records in a DNS message as (name, type, value). value is an IPv4 address (A), a name (PTR),
+    # or the target host (SRV). Other types are skipped.
+    _, flags, qdcount, ancount, nscount, arcount = struct.unpack("!HHHHHH", data[:12])
+    if not flags & 0x8000:
+        # Query (from another computer), not a response
+        return []
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _decode_name(data, offset)
+        offset += 4
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, offset = _decode_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        rdata = offset
+        offset += rdlength
+        if rtype == _TYPE_A and rdlength == 4:
+            records.append((name, rtype, socket.inet_ntoa(data[rdata:rdata + 4])))
+        elif rtype == _TYPE_PTR:
+            records.append((name, rtype, _decode_name(data, rdata)[0]))
+        elif rtype == _TYPE_SRV:
+            records.append((name, rtype, _decode_name(data, rdata + 6)[0]))
+    return records
+
+
+def reverse_name(address: str) -> str:
+    return "{0}.in-addr.arpa".format(".".join(reversed(address.split("."))))
+
+
+def short_hostname(name: str) -> str:
+    # robot.local -> robot
+    name = name.rstrip(".")
+    if name.endswith(".local"):
+        name = name[:-len(".local")]
+    return name
+
+
+def mdns_lookup(found: Callable[[str, str], None], addresses: Iterable[str] = (), duration: float = 1.5,
+        cancelled: Callable[[], bool] = lambda: False, failed: Callable[[OSError], None] = lambda e: None):
+    """
+    Asks (using mDNS) for SSH servers and for the hostnames of the given addresses.
+    found(address, hostname) is called for each address a hostname is learned for.
+    failed(error) is called if mDNS can't be used (no network, or multicast not allowed).
+    """
+    questions = [(SSH_SERVICE, _TYPE_PTR)] + [(reverse_name(a), _TYPE_PTR) for a in addresses]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    reported: Set[Tuple[str, str]] = set()
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        sock.settimeout(0.1)
+        # Keep each packet well below the MTU
+        for i in range(0, len(questions), 20):
+            sock.sendto(build_query(questions[i:i + 20]), MDNS_ADDRESS)
+        # Hosts answering the service query send SRV (instance -> host) and A (host -> address) records
+        end = time.monotonic() + duration
+        while time.monotonic() < end and not cancelled():
+            try:
+                data, _ = sock.recvfrom(9000)
+            except socket.timeout:
+                continue
+            try:
+                records = parse_response(data)
+            except (ValueError, IndexError, struct.error):
+                continue
+            for name, rtype, value in records:
+                if rtype == _TYPE_A:
+                    address, hostname = value, short_hostname(name)
+                elif rtype == _TYPE_PTR and name.endswith(".in-addr.arpa"):
+                    address, hostname = ".".join(reversed(name.split(".")[:4])), short_hostname(value)
+                else:
+                    continue
+                if (address, hostname) not in reported:
+                    reported.add((address, hostname))
+                    found(address, hostname)
+    except OSError as e:
+        failed(e)
+    finally:
+        sock.close()
+
+
+class Discovery:
+    """
+    Finds robots on the local network. The SSH probe and mDNS lookup run at the same time, then hostnames
+    are looked up (mDNS reverse lookup) for SSH servers found that did not announce themselves.
+    Callbacks are called from the discovery's threads. mdns_failed is called (at most once) if hostnames can't be looked up.
+    """
+    def __init__(self, addresses: List[str], host_found: Callable[[str, str], None], hostname_found: Callable[[str, str], None],
+            mdns_failed: Callable[[OSError], None] = lambda e: None):
+        self.__addresses = addresses
+        self.__host_found = host_found
+        self.__hostname_found = hostname_found
+        self.__mdns_failed = mdns_failed
+        self.__mdns_error: Optional[OSError] = None
+        self.__lock = threading.Lock()
+        self.__hosts: Set[str] = set()
+        self.__named: Set[str] = set()
+        self.__cancelled = threading.Event()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+    def __on_host(self, address: str, banner: str):
+        if self.cancelled:
+            return
+        with self.__lock:
+            self.__hosts.add(address)
+        self.__host_found(address, banner)
+
+    def __on_hostname(self, address: str, hostname: str):
+        if self.cancelled:
+            return
+        with self.__lock:
+            self.__named.add(address)
+        self.__hostname_found(address, hostname)
+
+    def __on_mdns_error(self, e: OSError):
+        with self.__lock:
+            first = self.__mdns_error is None
+            self.__mdns_error = e
+        if first and not self.cancelled:
+            self.__mdns_failed(e)
+
+    def run(self):
+        mdns = threading.Thread(target=mdns_lookup, args=(self.__on_hostname,),
+            kwargs={"cancelled": self.__cancelled.is_set, "failed": self.__on_mdns_error}, daemon=True)
+        mdns.start()
+        probe_ssh(self.__addresses, self.__on_host, cancelled=self.__cancelled.is_set)
+        mdns.join()
+        with self.__lock:
+            unnamed = sorted(self.__hosts - self.__named)
+        if len(unnamed) > 0 and not self.cancelled:
+            mdns_lookup(self.__on_hostname, unnamed, duration=1.0, cancelled=self.__cancelled.is_set, failed=self.__on_mdns_error)
@@ -0,0 +1,211 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from ui_discovery_dialog import Ui_DiscoveryDialog
+from PySide6.QtWidgets import QDialog, QDialogButtonBox, QTableWidgetItem, QWidget
+from PySide6.QtCore import Signal
+from PySide6.QtNetwork import QAbstractSocket, QNetworkInterface
+from discovery import Discovery, candidate_addresses, likely_robot
+import ipaddress
+import threading
+
+
+class DiscoveryDialog(QDialog):
+    """
+    Finds robots on the local network (see discovery.Discovery) and lets the user pick one to connect to.
+    Image versions are read (using the given credentials) from hosts that look like robots (see likely_robot).
+    """
+    host_found_sig = Signal(str, str)
+    hostname_found_sig = Signal(str, str)
+    version_found_sig = Signal(str, str)
+    mdns_failed_sig = Signal(str)
+    discovery_done_sig = Signal()
+
+    # Columns of tbl_robots
+    ADDRESS_COL = 0
+    HOSTNAME_COL = 1
+    VERSION_COL = 2
+    SERVER_COL = 3
+
+    def __init__(self, user: str, password: str, connect_timeout: float, query_timeout: float, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+
+        self.ui = Ui_DiscoveryDialog()
+        self.ui.setupUi(self)
+
+        self.user = user
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.query_timeout = query_timeout
+        self.rows: Dict[str, int] = {}
+        # SSH banner and mDNS hostname of each address (decide whether to read its version)
+        self.banners: Dict[str, str] = {}
+        self.hostnames: Dict[str, str] = {}
+        self.version_requested: Set[str] = set()
+        # Why hostnames couldn't be looked up ("" if they could)
+        self.mdns_error = ""
+        self.discovery: Optional[Discovery] = None
+        # Reads image versions (logging in to each robot found)
+        self.version_pool = ThreadPoolExecutor(max_workers=8)
+
+        self.host_found_sig.connect(self.do_host_found)
+        self.hostname_found_sig.connect(self.do_hostname_found)
+        self.version_found_sig.connect(self.do_version_found)
+        self.mdns_failed_sig.connect(self.do_mdns_failed)
+        self.discovery_done_sig.connect(self.do_discovery_done)
+
+        self.ui.btn_rescan.clicked.connect(self.start)
+        self.ui.tbl_robots.itemSelectionChanged.connect(self.selection_changed)
+        self.ui.tbl_robots.itemDoubleClicked.connect(lambda item: self.accept())
+        self.finished.connect(self.close_dialog)
+
+        self.selection_changed()
+        self.start()
+
+    def local_interfaces(self) -> List[Tuple[str, int]]:
+        # (IPv4 address, prefix length) of each active network interface
+        interfaces = []
+        for iface in QNetworkInterface.allInterfaces():
+            flags = iface.flags()
+            if not (flags & QNetworkInterface.IsUp) or (flags & QNetworkInterface.IsLoopBack):
+                continue
+            for entry in iface.addressEntries():
+                if entry.ip().protocol() == QAbstractSocket.IPv4Protocol:
+                    interfaces.append((entry.ip().toString(), entry.prefixLength()))
+        return interfaces
+
+    def start(self):
+        self.stop()
+        self.rows.clear()
+        self.banners.clear()
+        self.hostnames.clear()
+        self.version_requested.clear()
+        self.mdns_error = ""
+        self.ui.tbl_robots.setRowCount(0)
+        self.ui.btn_rescan.setEnabled(False)
+
+        addresses = candidate_addresses(self.local_interfaces())
+        self.ui.lbl_status.setText(self.tr("Searching {0} addresses...").format(len(addresses)))
+        self.discovery = Discovery(addresses, self.host_found, self.hostname_found, self.mdns_failed)
+        threading.Thread(target=self.run_discovery, args=(self.discovery,), daemon=True).start()
+
+    def stop(self):
+        if self.discovery is not None:
+            self.discovery.cancel()
+            self.discovery = None
+
+    def run_discovery(self, discovery: Discovery):
+        try:
+            discovery.run()
+        finally:
+            if not discovery.cancelled:
+                self.discovery_done_sig.emit()
+
+    def host_found(self, address: str, banner: str):
+        # Can call from any thread
+        self.host_found_sig.emit(address, banner)
+
+    def hostname_found(self, address: str, hostname: str):
+        # Can call from any thread
+        self.hostname_found_sig.emit(address, hostname)
+
+    def mdns_failed(self, e: OSError):
+        # Can call from any thread
+        self.mdns_failed_sig.emit(str(e))
+
+    def read_version(self, address: str):
+        # Runs on the version pool. Robots that reject the login are shown without a version.
+        # Host keys are not saved (the user has not chosen to connect to this robot).
+        from ssh_support import new_client
+        client = new_client(save_host_keys=False)
+        try:
+            client.connect(hostname=address, port=22, username=self.user, password=self.password, allow_agent=False,
+                look_for_keys=False, timeout=self.connect_timeout, auth_timeout=self.connect_timeout)
+            _, stdout, _ = client.exec_command("dt-getversions.sh", timeout=self.query_timeout)
+            version = stdout.readline().strip()
+        except Exception as e:
+            print("{0}: {1}".format(address, e))
+            version = ""
+        finally:
+            client.close()
+        self.version_found_sig.emit(address, version if version != "" else self.tr("Unknown"))
+
+    def row_for(self, address: str) -> int:
+        # Rows are kept in address order
+        row = self.rows.get(address)
+        if row is not None:
+            return row
+        key = ipaddress.IPv4Address(address)
+        row = len([a for a in self.rows if ipaddress.IPv4Address(a) < key])
+        for a in self.rows:
+            if self.rows[a] >= row:
+                self.rows[a] += 1
+        self.rows[address] = row
+        self.ui.tbl_robots.insertRow(row)
+        for col in range(self.ui.tbl_robots.columnCount()):
+            self.ui.tbl_robots.setItem(row, col, QTableWidgetItem(""))
+        self.ui.tbl_robots.item(row, self.ADDRESS_COL).setText(address)
+        return row
+
+    def request_version(self, address: str):
+        # Once the address is known to be a robot (banner and hostname can be found in either order)
+        banner = self.banners.get(address)
+        if self.password == "" or banner is None or address in self.version_requested or \
+                not likely_robot(address, banner, self.hostnames.get(address)):
+            return
+        self.version_requested.add(address)
+        self.ui.tbl_robots.item(self.rows[address], self.VERSION_COL).setText(self.tr("Reading..."))
+        self.version_pool.submit(self.read_version, address)
+
+    def do_host_found(self, address: str, banner: str):
+        row = self.row_for(address)
+        self.banners[address] = banner
+        self.ui.tbl_robots.item(row, self.SERVER_COL).setText(banner)
+        self.ui.tbl_robots.item(row, self.HOSTNAME_COL).setText(self.hostnames.get(address, ""))
+        self.request_version(address)
+        self.ui.tbl_robots.resizeColumnsToContents()
+        if self.ui.tbl_robots.currentRow() < 0:
+            self.ui.tbl_robots.selectRow(row)
+
+    def do_hostname_found(self, address: str, hostname: str):
+        # Hosts without an SSH server (printers, other computers) aren't listed. Their hostname is kept
+        # in case the SSH probe finds them later.
+        self.hostnames[address] = hostname
+        row = self.rows.get(address)
+        if row is None:
+            return
+        self.ui.tbl_robots.item(row, self.HOSTNAME_COL).setText(hostname)
+        self.request_version(address)
+        self.ui.tbl_robots.resizeColumnsToContents()
+
+    def do_mdns_failed(self, error: str):
+        self.mdns_error = error
+
+    def do_version_found(self, address: str, version: str):
+        row = self.rows.get(address)
+        if row is not None:
+            self.ui.tbl_robots.item(row, self.VERSION_COL).setText(version)
+            self.ui.tbl_robots.resizeColumnsToContents()
+
+    def do_discovery_done(self):
+        self.ui.btn_rescan.setEnabled(True)
+        if len(self.rows) == 0:
+            status = self.tr("No robots found. Make sure this computer is on the same network as the robot.")
+        else:
+            status = self.tr("Found {0} robot(s). Select one to connect to.").format(len(self.rows))
+        if self.mdns_error != "":
+            status += " " + self.tr("Hostnames could not be looked up ({0}).").format(self.mdns_error)
+        self.ui.lbl_status.setText(status)
+
+    def selection_changed(self):
+        self.ui.buttonBox.button(QDialogButtonBox.Ok).setEnabled(self.selected_address() is not None)
+
+    def selected_address(self) -> Optional[str]:
+        row = self.ui.tbl_robots.currentRow()
+        if row < 0 or len(self.ui.tbl_robots.selectedItems()) == 0:
+            return None
+        return self.ui.tbl_robots.item(row, self.ADDRESS_COL).text()
+
+    def close_dialog(self, res: int):
+        # Version reads not started yet are dropped. Those running finish in the background (results are ignored).
+        self.stop()
+        self.version_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,317 @@
+import os
+import posixpath
+import shutil
+import stat
+import tarfile
+import time
+import zipfile
+import zlib
+from typing import BinaryIO, Callable, Optional
+
+from manifest import ManifestBuilder, hash_and_crc_file, new_hasher, read_manifest
+
+
+# Called with (bytes done, bytes total, current member name)
+ProgressCallback = Callable[[int, int, str], None]
+
+
+class ProgressReporter:
+    """
+    Rate limits progress callbacks so extraction of many small files does not flood the UI
+    """
+    def __init__(self, callback: Optional[ProgressCallback], interval: float = 0.1):
+        self.__callback = callback
+        self.__interval = interval
+        self.__last = 0.0
+
+    def report(self, done: int, total: int, name: str, force: bool = False):
+        if self.__callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self.__last >= self.__interval:
+            self.__last = now
+            self.__callback(done, total, name)
+
+
+class CountingReader:
+    """
+    File object wrapper that counts bytes read from the underlying (compressed) file
+    """
+    def __init__(self, fileobj: BinaryIO):
+        self.__fileobj = fileobj
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.__fileobj.read(size)
+        self.count += len(data)
+        return data
+
+
+def safe_join(root: str, name: str) -> str:
+    # Join an archive member name to the extraction root, refusing names that escape it
+    name = name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".")]
+    if name.startswith("/") or ".." in parts or (len(parts) > 0 and ":" in parts[0]):
+        raise Exception("Archive member '{0}' has an unsafe path.".format(name))
+    return os.path.join(root, *parts)
+
+
+def check_no_symlinks(root: str, path: str):
+    # Refuse to write through a symlink created by the archive (eg "a -> /home/user" followed by "a/.bashrc")
+    current = root
+    for part in os.path.relpath(path, root).split(os.sep)[:-1]:
+        current = os.path.join(current, part)
+        if os.path.islink(current):
+            raise Exception("Archive member '{0}' is inside a symlink.".format(os.path.relpath(path, root)))
+
+
+def relative_link_target(name: str, target: str) -> str:
+    # Absolute symlinks (common in toolchain sysroots, eg usr/lib/libm.so -> /lib/libm.so.6) are made relative
+    # to the extraction root, so they point into the installed copy instead of the host's filesystem.
+    # name is the link's member name in the archive.
+    if not target.startswith("/"):
+        return target
+    link_dir = posixpath.dirname("/" + name.replace("\\", "/").lstrip("/"))
+    return posixpath.relpath(posixpath.normpath(target), link_dir)
+
+
+def check_link_target(root: str, link: str, target: str):
+    # Refuse symlinks that point outside the extraction root (resolved from the link's directory)
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(os.path.dirname(link), target))
+    if os.path.isabs(target) or os.path.commonpath([resolved, root]) != root:
+        raise Exception("Archive link '{0}' points outside the archive.".format(os.path.relpath(link, root)))
+
+
+def prepare_target(root: str, path: str):
+    # Create the parent directories of path and remove anything already there
+    # (so new data never goes through an existing link)
+    check_no_symlinks(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.lexists(path) and not os.path.isdir(path):
+        os.remove(path)
+
+
+def copy_stream(src: BinaryIO, dest_file: str, on_chunk: Callable[[bytes], None], chunk_size: int = 1024 * 1024):
+    # Copy a member's data to a file, calling on_chunk for each block written
+    with open(dest_file, "wb") as dest:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            dest.write(chunk)
+            on_chunk(chunk)
+
+
+def apply_mode(path: str, mode: int):
+    # Apply permission bits from archive metadata (setuid / setgid / sticky are never applied)
+    mode &= 0o777
+    if mode != 0:
+        os.chmod(path, mode | stat.S_IRUSR | stat.S_IWUSR)
+
+
+def extract_tar(filename: str, dest: str, progress: Optional[ProgressCallback] = None, manifest: Optional[ManifestBuilder] = None):
+    # Stream a (possibly compressed) tar archive member by member
+    # Progress is measured in bytes of the archive file read
+    # If a manifest is given, each file is hashed as it is written
+    reporter = ProgressReporter(progress)
+    total = os.path.getsize(filename)
+    with open(filename, "rb") as raw:
+        reader = CountingReader(raw)
+        with tarfile.open(fileobj=reader, mode="r|*") as tar:
+            dir_modes = []
+            for member in tar:
+                if member.issym():
+                    member.linkname = relative_link_target(member.name, member.linkname)
+                if hasattr(tarfile, "data_filter") and (member.isdir() or member.isreg() or member.issym() or member.islnk()):
+                    # Rejects absolute paths and links leaving dest (Python 3.12, backported to some earlier versions)
+                    mode = member.mode
+                    member = tarfile.data_filter(member, dest)
+                    if member.mode is None:
+                        member.mode = mode
+                target = safe_join(dest, member.name)
+                if member.isdir():
+                    check_no_symlinks(dest, target)
+                    os.makedirs(target, exist_ok=True)
+                    dir_modes.append((target, member.mode))
+                elif member.isreg():
+                    prepare_target(dest, target)
+                    src = tar.extractfile(member)
+                    hasher = new_hasher()
+                    crc = 0
+                    def on_chunk(chunk: bytes):
+                        nonlocal crc
+                        hasher.update(chunk)
+                        crc = zlib.crc32(chunk, crc)
+                        reporter.report(reader.count, total, member.name)
+                    copy_stream(src, target, on_chunk)
+                    apply_mode(target, member.mode)
+                    os.utime(target, (member.mtime, member.mtime))
+                    if manifest is not None:
+                        manifest.add_file(target, hasher.hexdigest(), crc)
+                elif member.issym():
+                    prepare_target(dest, target)
+                    check_link_target(dest, target, member.linkname)
+                    os.symlink(member.linkname, target)
+                elif member.islnk():
+                    source = safe_join(dest, member.linkname)
+                    check_no_symlinks(dest, source)
+                    if os.path.islink(source):
+                        raise Exception("Archive hard link '{0}' refers to a symlink.".format(member.name))
+                    prepare_target(dest, target)
+                    os.link(source, target)
+                # Device files, fifos, etc are not needed in toolchains
+                reporter.report(reader.count, total, member.name)
+
+            # Directory permissions last so read-only directories can still be populated
+            for target, mode in reversed(dir_modes):
+                apply_mode(target, mode | stat.S_IXUSR)
+    reporter.report(total, total, "", force=True)
+
+
+def reuse_file(member: zipfile.ZipInfo, target: str, reuse_dir: Optional[str], reuse_manifest: Optional[dict],
+        manifest: Optional[ManifestBuilder]) -> bool:
+    # Try to avoid extracting a member whose data is already on disk, either left in the staging
+    # directory by an interrupted install (target) or in the currently installed copy (reuse_dir)
+    # Returns True if target now holds the member's data
+    if os.path.isfile(target) and not os.path.islink(target) and os.path.getsize(target) == member.file_size:
+        digest, crc = hash_and_crc_file(target)
+        if crc == member.CRC:
+            if manifest is not None:
+                manifest.add_file(target, digest, crc)
+            return True
+
+    if reuse_dir is None:
+        return False
+    relpath = member.filename.replace("\\", "/").lstrip("/")
+    installed = os.path.join(reuse_dir, *relpath.split("/"))
+    if not os.path.isfile(installed) or os.path.islink(installed):
+        return False
+    st = os.stat(installed)
+    if st.st_size != member.file_size:
+        return False
+
+    # Use the installed manifest if the file is unchanged since it was written, otherwise read the file
+    entry = None if reuse_manifest is None else reuse_manifest.get(relpath, None)
+    if entry is not None and entry.get("crc", None) is not None and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+        digest, crc = entry["hash"], entry["crc"]
+    else:
+        digest, crc = hash_and_crc_file(installed)
+    if crc != member.CRC:
+        return False
+
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        # Installed copy is removed once the new one is swapped in, so sharing the data is safe
+        os.link(installed, target)
+    except OSError:
+        shutil.copy2(installed, target)
+    if manifest is not None:
+        manifest.add_file(target, digest, crc)
+    return True
+
+
+def extract_zip(filename: str, dest: str, progress: Optional[ProgressCallback] = None, manifest: Optional[ManifestBuilder] = None,
+        reuse_dir: Optional[str] = None):
+    # Extract a zip archive member by member
+    # Progress is measured in uncompressed bytes (written or reused)
+    # If a manifest is given, each file is hashed as it is written
+    # Members already present in dest (resume) or unchanged in reuse_dir (re-applying an update) are not extracted again
+    # Anything in dest that is not part of the archive is removed
+    reporter = ProgressReporter(progress)
+    reuse_manifest = None if reuse_dir is None else read_manifest(reuse_dir)
+    with zipfile.ZipFile(filename) as zfile:
+        members = zfile.infolist()
+        total = sum(m.file_size for m in members)
+        done = 0
+        expected = set()
+        for member in members:
+            target = safe_join(dest, member.filename)
+            expected.add(os.path.normcase(os.path.abspath(target)))
+            # Unix permissions are stored in the high 16 bits (zero if created on Windows)
+            mode = member.external_attr >> 16
+            if member.is_dir():
+                check_no_symlinks(dest, target)
+                os.makedirs(target, exist_ok=True)
+                continue
+            check_no_symlinks(dest, target)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if stat.S_ISLNK(mode):
+                if os.path.lexists(target):
+                    os.remove(target)
+                link_target = relative_link_target(member.filename, zfile.read(member).decode())
+                check_link_target(dest, target, link_target)
+                os.symlink(link_target, target)
+                done += member.file_size
+            elif reuse_file(member, target, reuse_dir, reuse_manifest, manifest):
+                done += member.file_size
+            else:
+                hasher = new_hasher()
+                crc = 0
+                def on_chunk(chunk: bytes):
+                    nonlocal done, crc
+                    done += len(chunk)
+                    hasher.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    reporter.report(done, total, member.filename)
+                if os.path.lexists(target):
+                    os.remove(target)
+                with zfile.open(member) as src:
+                    # zipfile checks the CRC of the data as it is read
+                    copy_stream(src, target, on_chunk)
+                apply_mode(target, mode)
+                if manifest is not None:
+                    manifest.add_file(target, hasher.hexdigest(), crc)
+            reporter.report(done, total, member.filename)
+
+    # Remove leftovers from an interrupted install of a different package
+    for root, dirs, files in os.walk(dest, topdown=False):
+        for name in files + dirs:
+            path = os.path.join(root, name)
+            if os.path.normcase(os.path.abspath(path)) in expected:
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                if len(os.listdir(path)) == 0:
+                    os.rmdir(path)
+            else:
+                os.remove(path)
+    reporter.report(total, total, "", force=True)
+
+
+def extract_archive(filename: str, dest: str, progress: Optional[ProgressCallback] = None, manifest: Optional[ManifestBuilder] = None):
+    # Extract any archive format supported by shutil.unpack_archive into dest
+    os.makedirs(dest, exist_ok=True)
+    if zipfile.is_zipfile(filename):
+        extract_zip(filename, dest, progress, manifest)
+    else:
+        extract_tar(filename, dest, progress, manifest)
+
+
+def old_directory(final: str) -> str:
+    # Hidden sibling used to hold the previous install while swapping
+    final = final.rstrip("/\\")
+    return os.path.join(os.path.dirname(final), ".{0}-old".format(os.path.basename(final)))
+
+
+def recover_interrupted_swap(final: str):
+    # If a previous swap was interrupted between renames, put the old install back
+    old = old_directory(final)
+    if not os.path.exists(final) and os.path.exists(old):
+        os.rename(old, final)
+
+
+def swap_directory(staging: str, final: str):
+    # Replace final with staging using renames so a complete install is always in place
+    # staging and final must be on the same filesystem
+    final = final.rstrip("/\\")
+    old = old_directory(final)
+    recover_interrupted_swap(final)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    if os.path.exists(final):
+        os.rename(final, old)
+    os.rename(staging, final)
+    if os.path.exists(old):
+        shutil.rmtree(old, ignore_errors=True)
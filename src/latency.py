@@ -0,0 +1,180 @@
+import datetime
+import json
+import os
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from PySide6.QtCore import QDir
+
+from util import percentile
+
+
+# Size of the frames ffmpeg is asked to produce. Only overall brightness is used, so frames are tiny.
+FRAME_WIDTH = 32
+FRAME_HEIGHT = 24
+
+# Brightness range (0 - 255) required before transitions are detected
+MIN_CONTRAST = 12
+
+# Flash intervals are randomized so a transition can't be matched to the wrong flash
+# Latencies longer than the shortest interval cannot be measured
+MIN_FLASH_INTERVAL = 1.5
+MAX_FLASH_INTERVAL = 2.5
+
+
+def decode_command(ffmpeg: str, url: str, framerate: Optional[int]) -> List[str]:
+    # ffmpeg decodes the stream to small raw grayscale frames written to stdout
+    # Same low latency input options as used for ffplay
+    cmd = [ffmpeg, "-hide_banner", "-loglevel", "error", "-probesize", "32", "-fflags", "nobuffer", "-flags", "low_delay"]
+    if framerate is not None and not url.startswith("rtsp"):
+        # Cannot use -framerate with rtsp
+        cmd.extend(["-framerate", str(framerate)])
+    cmd.extend(["-i", url, "-an", "-vf", "scale={0}:{1},format=gray".format(FRAME_WIDTH, FRAME_HEIGHT), "-f", "rawvideo", "-"])
+    return cmd
+
+
+class LatencyDetector:
+    """
+    Matches brightness transitions in received frames to the times the PC screen flashed.
+    The camera must be pointed at the flashing area, so the measured latency is glass-to-glass
+    (camera exposure, encode, network, and decode) plus the PC's display latency.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # (time, white) for each flash not yet detected
+        self.__flashes: Deque[Tuple[float, bool]] = deque()
+        self.__min: Optional[float] = None
+        self.__max: Optional[float] = None
+        self.__white: Optional[bool] = None
+        self.__latencies: List[float] = []
+        self.frames = 0
+
+    def flash(self, timestamp: float, white: bool):
+        # Called when the flash area has been repainted
+        with self.__lock:
+            self.__flashes.append((timestamp, white))
+            while len(self.__flashes) > 4:
+                self.__flashes.popleft()
+
+    def frame(self, timestamp: float, data: bytes) -> Optional[float]:
+        # Called for each received frame. Returns the measured latency if a flash was detected.
+        brightness = sum(data) / len(data)
+        with self.__lock:
+            self.frames += 1
+            self.__min = brightness if self.__min is None else min(self.__min, brightness)
+            self.__max = brightness if self.__max is None else max(self.__max, brightness)
+            contrast = self.__max - self.__min
+            if contrast < MIN_CONTRAST:
+                return None
+
+            # Hysteresis so noise near the threshold is not seen as a transition
+            if brightness > self.__min + contrast * 0.6:
+                white = True
+            elif brightness < self.__min + contrast * 0.4:
+                white = False
+            else:
+                return None
+            if white == self.__white:
+                return None
+            first = self.__white is None
+            self.__white = white
+            if first:
+                return None
+
+            # Most recent flash to this state that happened before the frame was received
+            match = None
+            for flash in self.__flashes:
+                if flash[1] == white and flash[0] <= timestamp:
+                    match = flash
+            if match is None:
+                return None
+            self.__flashes.remove(match)
+            latency = timestamp - match[0]
+            if latency > MIN_FLASH_INTERVAL:
+                return None
+            self.__latencies.append(latency)
+            return latency
+
+    def latencies(self) -> List[float]:
+        with self.__lock:
+            return list(self.__latencies)
+
+
+class LatencyResult:
+    def __init__(self, latencies: List[float]):
+        # Latencies in seconds
+        self.samples = len(latencies)
+        self.minimum = min(latencies) if len(latencies) > 0 else None
+        self.maximum = max(latencies) if len(latencies) > 0 else None
+        self.p50 = percentile(latencies, 50)
+        self.p90 = percentile(latencies, 90)
+        self.p99 = percentile(latencies, 99)
+
+
+class LatencyResults:
+    """
+    Measured latencies stored per camera stream config and link (robot address)
+    """
+    def __init__(self):
+        # Constants
+        self.__RESULTS_FILE = QDir.homePath() + "/.arpirobot/latency-results.json"
+        self.__RESULTS_VERSION = 1
+
+        self.__lock = threading.Lock()
+        self.__results: Optional[List[dict]] = None
+
+    def __load(self):
+        # Must be called with lock held
+        if self.__results is not None:
+            return
+        self.__results = []
+        try:
+            with open(self.__RESULTS_FILE, "r") as fp:
+                data = json.load(fp)
+            if data.get("version", None) == self.__RESULTS_VERSION:
+                self.__results = data.get("results", [])
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def __save(self):
+        # Must be called with lock held
+        data = {
+            "version": self.__RESULTS_VERSION,
+            "results": self.__results
+        }
+        try:
+            os.makedirs(os.path.dirname(self.__RESULTS_FILE), exist_ok=True)
+            with open(self.__RESULTS_FILE + ".tmp", "w") as fp:
+                json.dump(data, fp, indent=1)
+            os.replace(self.__RESULTS_FILE + ".tmp", self.__RESULTS_FILE)
+        except OSError:
+            pass
+
+    def add(self, name: str, config: str, address: str, result: LatencyResult):
+        # config is the serialized config, so results for an edited config are kept separate
+        entry = {
+            "name": name,
+            "config": config,
+            "address": address,
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "samples": result.samples,
+            "min": result.minimum,
+            "max": result.maximum,
+            "p50": result.p50,
+            "p90": result.p90,
+            "p99": result.p99
+        }
+        with self.__lock:
+            self.__load()
+            self.__results.append(entry)
+            self.__save()
+
+    def all(self) -> List[dict]:
+        # All results, lowest median latency first
+        with self.__lock:
+            self.__load()
+            return sorted(self.__results, key=lambda r: r["p50"] if r["p50"] is not None else float("inf"))
+
+
+latency_results: LatencyResults = LatencyResults()
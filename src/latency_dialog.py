@@ -0,0 +1,156 @@
+from typing import List, Optional
+from ui_latency_dialog import Ui_LatencyDialog
+from PySide6.QtWidgets import QDialog, QTableWidgetItem, QWidget
+from PySide6.QtCore import QTimer, Qt
+from latency import LatencyDetector, LatencyResult, latency_results, FRAME_WIDTH, FRAME_HEIGHT, MIN_FLASH_INTERVAL, MAX_FLASH_INTERVAL
+import subprocess
+import threading
+import random
+import time
+
+
+class LatencyDialog(QDialog):
+    """
+    Measures glass-to-glass latency of a camera stream by flashing part of the screen
+    in front of the camera and detecting the flashes in the received stream
+    """
+    # Measurement stops automatically after this many samples
+    TARGET_SAMPLES = 40
+
+    def __init__(self, name: str, config: str, address: str, cmd: List[str], startupinfo, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowFlags(self.windowFlags() | Qt.Tool)
+
+        self.name = name
+        self.config = config
+        self.address = address
+        self.cmd = cmd
+        self.startupinfo = startupinfo
+        self.proc: Optional[subprocess.Popen] = None
+        self.detector: Optional[LatencyDetector] = None
+        self.white = False
+        self.last_error = ""
+
+        self.ui = Ui_LatencyDialog()
+        self.ui.setupUi(self)
+        self.setWindowTitle(self.tr("Measure Stream Latency ({0})").format(name))
+
+        self.flash_timer = QTimer()
+        self.flash_timer.setSingleShot(True)
+        self.flash_timer.timeout.connect(self.toggle_flash)
+
+        self.status_timer = QTimer()
+        self.status_timer.timeout.connect(self.update_status)
+
+        self.ui.btn_start.clicked.connect(self.start_stop)
+        self.populate_results()
+
+    def populate_results(self):
+        results = latency_results.all()
+        self.ui.tbl_results.setRowCount(len(results))
+        for row, res in enumerate(results):
+            values = [res["name"], res["address"]]
+            values.extend("-" if res[p] is None else "{0:.0f}".format(res[p] * 1000) for p in ["p50", "p90", "p99"])
+            values.extend([str(res["samples"]), res["time"]])
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if col == 0:
+                    # Full config as tooltip so different versions of a config can be told apart
+                    item.setToolTip(res["config"])
+                self.ui.tbl_results.setItem(row, col, item)
+        self.ui.tbl_results.resizeColumnsToContents()
+
+    def start_stop(self):
+        if self.proc is None:
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        self.detector = LatencyDetector()
+        try:
+            self.proc = subprocess.Popen(self.cmd, startupinfo=self.startupinfo, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            self.ui.lbl_status.setText(self.tr("Failed to start ffmpeg: {0}").format(e))
+            self.proc = None
+            return
+        self.reader = threading.Thread(target=self.read_frames, args=(self.proc, self.detector), daemon=True)
+        self.reader.start()
+        # stderr is drained separately so decode errors can't fill the pipe and stall ffmpeg
+        self.last_error = ""
+        self.error_reader = threading.Thread(target=self.read_errors, args=(self.proc,), daemon=True)
+        self.error_reader.start()
+
+        self.ui.btn_start.setText(self.tr("Stop"))
+        self.ui.lbl_status.setText(self.tr("Waiting for stream..."))
+        self.toggle_flash()
+        self.status_timer.start(250)
+
+    def stop(self):
+        self.flash_timer.stop()
+        self.status_timer.stop()
+        self.ui.btn_start.setText(self.tr("Start"))
+        if self.proc is None:
+            return
+        self.proc.kill()
+        self.proc = None
+
+        result = LatencyResult(self.detector.latencies())
+        if result.samples == 0:
+            self.ui.lbl_status.setText(self.tr("No flashes were detected in the stream. Make sure the camera can see the flashing box."))
+            return
+        latency_results.add(self.name, self.config, self.address, result)
+        self.ui.lbl_status.setText(self.format_result(result))
+        self.populate_results()
+
+    def format_result(self, result: LatencyResult) -> str:
+        return self.tr("{0} samples: p50 {1:.0f} ms, p90 {2:.0f} ms, p99 {3:.0f} ms (min {4:.0f} ms, max {5:.0f} ms)").format(
+            result.samples, result.p50 * 1000, result.p90 * 1000, result.p99 * 1000, result.minimum * 1000, result.maximum * 1000)
+
+    def read_frames(self, proc: subprocess.Popen, detector: LatencyDetector):
+        # Runs on a background thread. Frames are timestamped as soon as they are read.
+        frame_size = FRAME_WIDTH * FRAME_HEIGHT
+        while True:
+            data = proc.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            detector.frame(time.monotonic(), data)
+
+    def read_errors(self, proc: subprocess.Popen):
+        for line in proc.stderr:
+            line = line.decode(errors="replace").strip()
+            if line != "":
+                self.last_error = line
+
+    def toggle_flash(self):
+        self.white = not self.white
+        self.ui.frame_flash.setStyleSheet("background-color: {0};".format("white" if self.white else "black"))
+        # Paint immediately so the recorded time is as close as possible to when the screen changes
+        self.ui.frame_flash.repaint()
+        self.detector.flash(time.monotonic(), self.white)
+        self.flash_timer.start(int(random.uniform(MIN_FLASH_INTERVAL, MAX_FLASH_INTERVAL) * 1000))
+
+    def update_status(self):
+        if self.proc is not None and self.proc.poll() is not None:
+            self.error_reader.join(1)
+            error = self.last_error
+            self.stop()
+            if error != "":
+                self.ui.lbl_status.setText(self.tr("ffmpeg exited: {0}").format(error))
+            return
+        latencies = self.detector.latencies()
+        if len(latencies) >= self.TARGET_SAMPLES:
+            self.stop()
+        elif len(latencies) > 0:
+            self.ui.lbl_status.setText(self.tr("Measuring... {0} / {1} samples (last {2:.0f} ms)").format(
+                len(latencies), self.TARGET_SAMPLES, latencies[-1] * 1000))
+        elif self.detector.frames > 0:
+            self.ui.lbl_status.setText(self.tr("Receiving stream ({0} frames). Waiting for flashes to be detected...").format(self.detector.frames))
+
+    def reject(self):
+        self.stop()
+        super().reject()
+
+    def accept(self):
+        self.stop()
+        super().accept()
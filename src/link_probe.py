@@ -0,0 +1,223 @@
+import math
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from util import percentile
+
+
+# Sent as an SSH global request to time round trips. Servers reply (with a failure) without running anything
+# on the robot, so this measures the link and sshd only.
+KEEPALIVE_REQUEST = "keepalive@openssh.com"
+
+# Defaults for a link test
+RTT_SAMPLES = 20
+THROUGHPUT_BYTES = 2 * 1024 * 1024
+
+# Size of each write when measuring upload throughput
+_CHUNK_SIZE = 32 * 1024
+
+# paramiko tracks one outstanding global request per transport at a time. Held until the reply arrives.
+_request_lock = threading.Lock()
+
+
+def measure_rtt(transport, timeout: float) -> Optional[float]:
+    # Time (seconds) of one round trip over a paramiko transport. None if the transport closed, no reply
+    # arrived within timeout, or an earlier request is still waiting for its reply.
+    # paramiko only asks for a reply when waiting (and then has no timeout), so the request waits on its own
+    # thread and this gives up on it after timeout.
+    if not _request_lock.acquire(blocking=False):
+        return None
+    done = threading.Event()
+    result: List[float] = []
+
+    def request():
+        try:
+            start = time.perf_counter()
+            transport.global_request(KEEPALIVE_REQUEST, wait=True)
+            result.append(time.perf_counter() - start)
+        finally:
+            _request_lock.release()
+            done.set()
+
+    threading.Thread(target=request, daemon=True).start()
+    if not done.wait(timeout) or not transport.is_active():
+        return None
+    return result[0] if len(result) > 0 else None
+
+
+def measure_upload(transport, count: int, timeout: float) -> float:
+    # Bytes / sec sending count bytes to the robot (discarded there)
+    chan = transport.open_session(timeout=timeout)
+    try:
+        chan.settimeout(timeout)
+        chan.exec_command("cat > /dev/null")
+        data = bytes(_CHUNK_SIZE)
+        start = time.perf_counter()
+        sent = 0
+        while sent < count:
+            chunk = data[:min(_CHUNK_SIZE, count - sent)]
+            chan.sendall(chunk)
+            sent += len(chunk)
+        chan.shutdown_write()
+        # cat exits once everything sent has been read
+        chan.recv_exit_status()
+        return count / max(time.perf_counter() - start, 1e-6)
+    finally:
+        chan.close()
+
+
+def measure_download(transport, count: int, timeout: float) -> float:
+    # Bytes / sec receiving count bytes from the robot
+    chan = transport.open_session(timeout=timeout)
+    try:
+        chan.settimeout(timeout)
+        start = time.perf_counter()
+        chan.exec_command("head -c {0} /dev/zero".format(count))
+        received = 0
+        while True:
+            data = chan.recv(_CHUNK_SIZE)
+            if len(data) == 0:
+                break
+            received += len(data)
+        return received / max(time.perf_counter() - start, 1e-6)
+    finally:
+        chan.close()
+
+
+# Operations that timeouts are computed for: (seconds of work on the robot, round trips)
+OP_QUERY = "query"        # Status scripts, reading settings
+OP_COMMAND = "command"    # Remounts, starting / stopping the program, services, applying settings
+OP_PROGRAM = "program"    # Restarting the program (stop scripts wait for the old process to exit)
+OP_UPDATE = "update"      # Deleting / updating the program (file operations on the robot)
+OP_SCAN = "scan"          # Wi-Fi scan (nothing is printed until it finishes)
+OP_CONNECT = "connect"    # TCP connect, key exchange, and authentication
+TIMEOUT_PROFILES = {
+    OP_QUERY: (2.0, 3),
+    OP_COMMAND: (5.0, 3),
+    OP_PROGRAM: (10.0, 3),
+    OP_UPDATE: (15.0, 3),
+    OP_SCAN: (15.0, 3),
+    OP_CONNECT: (2.0, 6)
+}
+
+
+class RttEstimator:
+    """
+    Smoothed round trip time and its variation, computed as TCP does (RFC 6298). Timeouts derived from
+    it are short on a clean link (so failures are noticed quickly) and grow on a slow or noisy one.
+    """
+    __ALPHA = 1.0 / 8
+    __BETA = 1.0 / 4
+    __K = 4
+    __GRANULARITY = 0.01
+
+    def __init__(self, initial_rto: float = 1.0, min_rto: float = 0.2, max_rto: float = 15.0):
+        self.__lock = threading.Lock()
+        self.__initial_rto = initial_rto
+        self.__min_rto = min_rto
+        self.__max_rto = max_rto
+        self.__srtt: Optional[float] = None
+        self.__rttvar: Optional[float] = None
+
+    def add(self, rtt: float):
+        with self.__lock:
+            if self.__srtt is None:
+                self.__srtt = rtt
+                self.__rttvar = rtt / 2
+            else:
+                self.__rttvar = (1 - self.__BETA) * self.__rttvar + self.__BETA * abs(self.__srtt - rtt)
+                self.__srtt = (1 - self.__ALPHA) * self.__srtt + self.__ALPHA * rtt
+
+    @property
+    def srtt(self) -> Optional[float]:
+        return self.__srtt
+
+    @property
+    def rto(self) -> float:
+        with self.__lock:
+            if self.__srtt is None:
+                return self.__initial_rto
+            rto = self.__srtt + max(self.__GRANULARITY, self.__K * self.__rttvar)
+        return min(max(rto, self.__min_rto), self.__max_rto)
+
+    def timeout(self, operation: str) -> float:
+        work, round_trips = TIMEOUT_PROFILES[operation]
+        return work + round_trips * self.rto
+
+    def save(self) -> str:
+        # Saved between runs so the first connection to the same network starts from a sensible estimate
+        with self.__lock:
+            if self.__srtt is None:
+                return ""
+            return "{0:.6f},{1:.6f}".format(self.__srtt, self.__rttvar)
+
+    def restore(self, value: str):
+        try:
+            srtt, rttvar = [float(v) for v in value.split(",")]
+        except ValueError:
+            return
+        # Ignore corrupt settings (a NaN or infinite estimate would never recover through add)
+        if not (math.isfinite(srtt) and math.isfinite(rttvar)) or srtt < 0 or rttvar < 0:
+            return
+        with self.__lock:
+            self.__srtt = srtt
+            self.__rttvar = rttvar
+
+
+class LinkSample:
+    def __init__(self, rtts: List[float], upload: Optional[float], download: Optional[float]):
+        self.time = time.strftime("%H:%M:%S")
+        self.rtts = rtts
+        self.rtt_min = min(rtts) if len(rtts) > 0 else None
+        self.rtt_p50 = percentile(rtts, 50)
+        self.rtt_p90 = percentile(rtts, 90)
+        self.rtt_max = max(rtts) if len(rtts) > 0 else None
+        # bytes / sec (None if not measured)
+        self.upload = upload
+        self.download = download
+
+
+def probe_link(transport, timeout: float, samples: int = RTT_SAMPLES, count: int = THROUGHPUT_BYTES,
+        status: Optional[Callable[[str], None]] = None) -> LinkSample:
+    """
+    Measures round trip time (several samples) then upload and download throughput over an existing connection.
+    status is called before each step with a short description (not translated).
+    """
+    if status is not None:
+        status("rtt")
+    rtts = []
+    for _ in range(samples):
+        rtt = measure_rtt(transport, timeout)
+        if rtt is None:
+            if transport.is_active():
+                raise socket.timeout("No reply to round trip request")
+            raise EOFError("Connection closed")
+        rtts.append(rtt)
+    if status is not None:
+        status("upload")
+    upload = measure_upload(transport, count, timeout)
+    if status is not None:
+        status("download")
+    download = measure_download(transport, count, timeout)
+    return LinkSample(rtts, upload, download)
+
+
+class LinkHistory:
+    """
+    Results of the last few link tests for the current connection
+    """
+    def __init__(self, size: int = 10):
+        self.__samples: Deque[LinkSample] = deque(maxlen=size)
+
+    def add(self, sample: LinkSample):
+        self.__samples.append(sample)
+
+    def clear(self):
+        self.__samples.clear()
+
+    def all(self) -> List[LinkSample]:
+        # Newest first
+        return list(reversed(self.__samples))
@@ -4,67 +4,166 @@ import platform
 import multiprocessing
 import os
 import subprocess
+from profiler import profiler
 
+with profiler.span("import PySide6", "startup"):
+    from PySide6.QtWidgets import QApplication, QStyleFactory, QWidget
+    from PySide6.QtGui import QGuiApplication, QPalette, QColor, QStyleHints
+    from PySide6.QtCore import Qt, QFile, QIODevice, QEventLoop, QEvent, QObject, qVersion
+from typing import Optional
 
-from PySide6.QtWidgets import QApplication, QStyleFactory
-from PySide6.QtGui import QGuiApplication, QPalette, QColor, QStyleHints
-from PySide6.QtCore import Qt, QFile, QIODevice, QEventLoop
 
-from deploy_tool import DeployToolWindow
+# Runs in a subprocess to determine the platform plugin Qt will use (see below)
+def mp_target(argv, conn):
+    tmp = QApplication(argv)
+    conn.send(QGuiApplication.platformName())
+    conn.close()
+    tmp.quit()
 
-QApplication.setAttribute(Qt.AA_DontUseNativeMenuBar)
 
-# TODO: Stdout and Stderr redirect to log file (along with log data shown in DS log window)
+# Platform plugin Qt will use, determined from the environment if possible
+# Returns None if it depends on Qt's defaults for the session
+def env_platform_name() -> Optional[str]:
+    qpa = os.environ.get("QT_QPA_PLATFORM", "")
+    if qpa != "":
+        if ";" in qpa:
+            # List of fallbacks. Depends on which one works.
+            return None
+        name = qpa.split(":")[0]
+        return "wayland" if name.startswith("wayland") else name
+    has_wayland = os.environ.get("WAYLAND_DISPLAY", "") != "" or os.environ.get("XDG_SESSION_TYPE", "") == "wayland"
+    has_x11 = os.environ.get("DISPLAY", "") != ""
+    if has_wayland and not has_x11:
+        return "wayland"
+    if has_x11 and not has_wayland:
+        return "xcb"
+    # Wayland session with XWayland. Which one Qt picks depends on its version.
+    return None
 
-try:
-    import ctypes
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("com.arpirobot.arpirobot-deploytool")
-except AttributeError:
-    pass
 
-app = None
+# Identifies the things that decide which platform plugin is used, so a probe result can be reused
+def env_fingerprint() -> str:
+    keys = ["QT_QPA_PLATFORM", "XDG_SESSION_TYPE", "XDG_CURRENT_DESKTOP", "WAYLAND_DISPLAY", "DISPLAY"]
+    return "|".join([qVersion()] + [os.environ.get(k, "") for k in keys])
 
-# Fix gnome wayland things
-if platform.system() == "Linux":
+
+def probe_platform_name() -> str:
     # QGuiApplication.platformName() is empty until app instantiated
     # So need to create app first, but need to change things before app create
     # Logical solution is to create app, read platform, then destroy app
     # But this is impossible with PySide...
     # And multiple apps is not allowed
     # So instead, use a subprocess. Killing subprocess kills it's app
-    def mp_target(argv, return_dict):
-        tmp = QApplication(argv)
-        return_dict['plat_name'] = QGuiApplication.platformName()
-        tmp.quit()
-    manager = multiprocessing.Manager()
-    return_dict = manager.dict()
-    p = multiprocessing.Process(target=mp_target, daemon=True, args=(sys.argv, return_dict))
+    # The result is cached, so this only happens once for each environment
+    from util import settings_manager
+    fingerprint = env_fingerprint()
+    cached, _, plat_name = settings_manager.platform_probe.rpartition("=")
+    if cached == fingerprint:
+        return plat_name
+
+    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+    p = multiprocessing.Process(target=mp_target, daemon=True, args=(sys.argv, send_conn))
     p.start()
+    send_conn.close()
+    try:
+        plat_name = recv_conn.recv()
+    except EOFError:
+        # Child failed to create an app
+        plat_name = ""
     p.join()
-    plat_name = return_dict['plat_name']
-    if plat_name == "wayland" and os.environ['XDG_CURRENT_DESKTOP'].find("GNOME") != -1:
-        # Running with wayland platform plugin in a gnome session
-        text_scale_factor = float(subprocess.check_output(["gsettings", "get", "org.gnome.desktop.interface", "text-scaling-factor"]))
-        if 'QT_FONT_DPI' not in os.environ:
+    if plat_name != "":
+        settings_manager.platform_probe = "{0}={1}".format(fingerprint, plat_name)
+    return plat_name
+
+
+class ProfilingApplication(QApplication):
+    # Used instead of QApplication when profiling is enabled
+    # Records the main window's first paint and every GUI thread event (including queued slot calls
+    # from background tasks) that takes longer than the profiler's threshold
+    def __init__(self, argv):
+        super().__init__(argv)
+        self.main_window: Optional[QWidget] = None
+        self.painted = False
+
+    def notify(self, receiver: QObject, event: QEvent) -> bool:
+        start = profiler.now()
+        res = super().notify(receiver, event)
+        end = profiler.now()
+        if not self.painted and event.type() == QEvent.Paint and self.main_window is not None \
+                and isinstance(receiver, QWidget) and receiver.window() is self.main_window:
+            self.painted = True
+            profiler.instant("First paint", "startup")
+        if end - start >= profiler.threshold:
+            name = receiver.objectName() or type(receiver).__name__
+            profiler.complete("{0} -> {1}".format(event.type().name, name), "gui", start, end)
+        return res
+
+
+if __name__ == "__main__":
+    # The platform probe runs in a child process (see probe_platform_name). In frozen builds the child starts this
+    # executable again, and freeze_support stops it from running the app.
+    multiprocessing.freeze_support()
+
+    sys.argv = profiler.configure(sys.argv)
+
+    with profiler.span("import deploy_tool", "startup"):
+        from deploy_tool import DeployToolWindow
+
+    QApplication.setAttribute(Qt.AA_DontUseNativeMenuBar)
+
+    # TODO: Stdout and Stderr redirect to log file (along with log data shown in DS log window)
+
+    try:
+        import ctypes
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("com.arpirobot.arpirobot-deploytool")
+    except AttributeError:
+        pass
+
+    app = None
+
+    # Fix gnome wayland things
+    if platform.system() == "Linux":
+        # Only matters in a gnome session where the font DPI has not been set manually
+        if os.environ.get("XDG_CURRENT_DESKTOP", "").find("GNOME") != -1 and 'QT_FONT_DPI' not in os.environ:
+            plat_name = env_platform_name()
+            if plat_name is None:
+                with profiler.span("Platform probe", "startup"):
+                    plat_name = probe_platform_name()
+        else:
+            plat_name = ""
+        if plat_name == "wayland":
+            # Running with wayland platform plugin in a gnome session
+            text_scale_factor = float(subprocess.check_output(["gsettings", "get", "org.gnome.desktop.interface", "text-scaling-factor"]))
             os.environ['QT_FONT_DPI'] = str(int(text_scale_factor * 96))
 
 
 
-app = QApplication(sys.argv)
-app.setStyle("fusion")
+    with profiler.span("Create QApplication", "startup"):
+        if profiler.enabled:
+            app = ProfilingApplication(sys.argv)
+        else:
+            app = QApplication(sys.argv)
+        app.setStyle("fusion")
+
+    # Theme fixes (only needed for dark theme; light always works properly)
+    if app.styleHints().colorScheme() == Qt.ColorScheme.Dark:
+        if platform.system() == "Windows":
+            # Somehow, this fixes checkboxes being blue on windows dark theme.
+            # Not really sure why, but it does.
+            app = QApplication.instance()
+            p = app.palette()
+            for cg in [QPalette.ColorGroup.Active, QPalette.ColorGroup.Current, QPalette.ColorGroup.Disabled, QPalette.ColorGroup.Inactive]:
+                p.setColor(cg, QPalette.ColorRole.Base, p.color(cg, QPalette.ColorRole.Base))
+            app.setPalette(p)
 
-# Theme fixes (only needed for dark theme; light always works properly)
-if app.styleHints().colorScheme() == Qt.ColorScheme.Dark:
-    if platform.system() == "Windows":
-        # Somehow, this fixes checkboxes being blue on windows dark theme.
-        # Not really sure why, but it does.
-        app = QApplication.instance()
-        p = app.palette()
-        for cg in [QPalette.ColorGroup.Active, QPalette.ColorGroup.Current, QPalette.ColorGroup.Disabled, QPalette.ColorGroup.Inactive]:
-            p.setColor(cg, QPalette.ColorRole.Base, p.color(cg, QPalette.ColorRole.Base))
-        app.setPalette(p)
+    with profiler.span("Construct DeployToolWindow", "startup"):
+        dt = DeployToolWindow()
 
-dt = DeployToolWindow()
+    if profiler.enabled:
+        app.main_window = dt
+    dt.show()
+    app.exec()
 
-dt.show()
-app.exec()
+    path = profiler.save()
+    if path is not None:
+        print("Profile written to {0}".format(path))
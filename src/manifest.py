@@ -0,0 +1,165 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+# Written to the root of each installed component (toolchain or update package)
+MANIFEST_NAME = ".arpirobot-manifest.json"
+MANIFEST_VERSION = 1
+HASH_ALGORITHM = "blake2b"
+
+# Files are handed to worker threads in batches
+_BATCH_SIZE = 256
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_file(path: str) -> Optional[str]:
+    # Returns None if the file cannot be read
+    hasher = new_hasher()
+    try:
+        with open(path, "rb") as fp:
+            while True:
+                chunk = fp.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+def hash_and_crc_file(path: str) -> Tuple[Optional[str], Optional[int]]:
+    # Hash and zip CRC-32 of a file in a single read
+    hasher = new_hasher()
+    crc = 0
+    try:
+        with open(path, "rb") as fp:
+            while True:
+                chunk = fp.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+    except OSError:
+        return None, None
+    return hasher.hexdigest(), crc
+
+
+def _hash_batch(paths: List[str]) -> List[Optional[str]]:
+    # Runs in worker threads
+    return [hash_file(p) for p in paths]
+
+
+def hash_files(paths: List[str], workers: Optional[int] = None) -> List[Optional[str]]:
+    # Hash many files using a pool of worker threads (in the same order as paths)
+    # Threads, not processes: hashlib releases the GIL while hashing, and forking a multithreaded Qt
+    # process (this runs from a task) can deadlock
+    if len(paths) <= _BATCH_SIZE:
+        # Not worth starting threads
+        return _hash_batch(paths)
+    batches = [paths[i:i+_BATCH_SIZE] for i in range(0, len(paths), _BATCH_SIZE)]
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for res in pool.map(_hash_batch, batches):
+            results.extend(res)
+    return results
+
+
+class ManifestBuilder:
+    """
+    Collects per-file hashes while a component is being installed
+    """
+    def __init__(self, root: str):
+        self.__root = root
+        self.__files: Dict[str, dict] = {}
+
+    def add_file(self, path: str, digest: str, crc: Optional[int] = None):
+        # path must be a file under root that has been completely written
+        # crc (zip CRC-32) lets later update packages skip files that are unchanged
+        st = os.stat(path)
+        relpath = os.path.relpath(path, self.__root).replace("\\", "/")
+        self.__files[relpath] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "hash": digest
+        }
+        if crc is not None:
+            self.__files[relpath]["crc"] = crc
+
+    def write(self):
+        # Written last, so an install without a manifest is known to be incomplete (or from an older version)
+        data = {
+            "version": MANIFEST_VERSION,
+            "algorithm": HASH_ALGORITHM,
+            "files": self.__files
+        }
+        path = os.path.join(self.__root, MANIFEST_NAME)
+        with open(path + ".tmp", "w") as fp:
+            json.dump(data, fp)
+        os.replace(path + ".tmp", path)
+
+
+def read_manifest(root: str) -> Optional[Dict[str, dict]]:
+    # Returns None if there is no (usable) manifest
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), "r") as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if data.get("version", None) != MANIFEST_VERSION or data.get("algorithm", None) != HASH_ALGORITHM:
+        return None
+    return data.get("files", None)
+
+
+class VerifyResult:
+    def __init__(self, root: str):
+        self.root = root
+        self.has_manifest = False
+        self.checked = 0
+        self.missing: List[str] = []
+        self.modified: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return self.has_manifest and len(self.missing) == 0 and len(self.modified) == 0
+
+
+def verify_tree(root: str, full: bool = False, workers: Optional[int] = None) -> VerifyResult:
+    # Check an installed tree against its manifest
+    # A quick check only re-hashes files whose size or mtime changed since install
+    # A full check re-hashes every file
+    # A tree without a manifest is not ok (incomplete install, or installed by an older version)
+    result = VerifyResult(root)
+    files = read_manifest(root)
+    if files is None:
+        return result
+    result.has_manifest = True
+
+    to_hash: List[Tuple[str, str]] = []
+    for relpath, entry in files.items():
+        path = os.path.join(root, relpath)
+        try:
+            st = os.stat(path)
+        except OSError:
+            result.missing.append(relpath)
+            continue
+        if st.st_size != entry["size"]:
+            result.modified.append(relpath)
+        elif full or st.st_mtime_ns != entry["mtime"]:
+            to_hash.append((relpath, path))
+        result.checked += 1
+
+    digests = hash_files([p for _, p in to_hash], workers)
+    for (relpath, _), digest in zip(to_hash, digests):
+        if digest != files[relpath]["hash"]:
+            result.modified.append(relpath)
+
+    result.missing.sort()
+    result.modified.sort()
+    return result
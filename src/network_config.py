@@ -0,0 +1,56 @@
+import shlex
+from typing import List
+
+
+# Separates the output of the scripts in FETCH_COMMAND
+_AP_MARKER = "@@ap"
+
+# Reads hostname and access point settings in one command
+FETCH_COMMAND = "dt-hostname.sh; echo {0}; dt-wifi_ap.sh".format(_AP_MARKER)
+
+
+class NetworkConfig:
+    """
+    Hostname and access point settings of the robot
+    """
+    def __init__(self, hostname: str = "", ssid: str = "", password: str = "", country: str = "", channel: str = ""):
+        self.hostname = hostname
+        self.ssid = ssid
+        self.password = password
+        self.country = country
+        self.channel = channel
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, NetworkConfig) and not self.hostname_changed(other) and not self.ap_changed(other)
+
+    def __hash__(self) -> int:
+        return hash((self.hostname, *self.ap_settings()))
+
+    def ap_settings(self) -> List[str]:
+        # In the order dt-wifi_ap.sh takes (and prints) them
+        return [self.ssid, self.password, self.country, self.channel]
+
+    def hostname_changed(self, other: 'NetworkConfig') -> bool:
+        return self.hostname != other.hostname
+
+    def ap_changed(self, other: 'NetworkConfig') -> bool:
+        return self.ap_settings() != other.ap_settings()
+
+
+def parse_fetch_output(text: str) -> NetworkConfig:
+    host_part, _, ap_part = text.replace("\r", "").partition("{0}\n".format(_AP_MARKER))
+    host_lines = host_part.split("\n")
+    ap_lines = ap_part.split("\n") + [""] * 4
+    return NetworkConfig(host_lines[0].strip(), *[line.strip() for line in ap_lines[:4]])
+
+
+def apply_command(old: NetworkConfig, new: NetworkConfig) -> str:
+    # Applies everything that changed in one command (empty if nothing changed). Stops at the first failure.
+    # The hostname is changed first since changing the access point may restart the robot's network.
+    # nohup so the scripts finish even if the connection drops while the network is restarted.
+    cmds = []
+    if new.hostname_changed(old):
+        cmds.append("nohup dt-hostname.sh {0} > /dev/null 2>&1".format(shlex.quote(new.hostname)))
+    if new.ap_changed(old):
+        cmds.append("nohup dt-wifi_ap.sh {0} > /dev/null 2>&1".format(" ".join(shlex.quote(s) for s in new.ap_settings())))
+    return " && ".join(cmds)
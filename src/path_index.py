@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class PathIndex:
+    """
+    Index of the executables in the directories on PATH.
+    Each directory is listed once and a map of name -> paths is built. The index is rebuilt
+    only when PATH changes or one of the directories on it is modified. Directories are checked
+    for changes at most once every RECHECK_INTERVAL seconds, so a batch of lookups costs one check.
+    Lookups mimic shutil.which (and Linux "which -a"), including PATHEXT handling on Windows.
+    """
+    RECHECK_INTERVAL = 2.0
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__checked = 0.0
+        self.__path: Optional[str] = None
+        self.__dirs: List[Tuple[str, Optional[int]]] = []
+        self.__names: Dict[str, List[Tuple[int, str]]] = {}
+
+    def __search_path(self) -> str:
+        path = os.environ.get("PATH", None)
+        if path is None:
+            try:
+                path = os.confstr("CS_PATH")
+            except (AttributeError, ValueError):
+                # os.confstr() or CS_PATH is not available
+                path = os.defpath
+        # Don't use os.defpath if the PATH environment variable is set to an empty string
+        return path
+
+    def __dir_list(self, path: str) -> List[str]:
+        # PATH='' doesn't match, whereas PATH=':' looks in the current directory
+        if not path:
+            return []
+        dirs = path.split(os.pathsep)
+        if sys.platform == "win32":
+            # The current directory takes precedence on Windows.
+            if os.curdir not in dirs:
+                dirs.insert(0, os.curdir)
+
+        # Only list each directory once
+        unique = []
+        seen = set()
+        for dir in dirs:
+            normdir = os.path.normcase(dir)
+            if normdir not in seen:
+                seen.add(normdir)
+                unique.append(dir)
+        return unique
+
+    def __mtime(self, dir: str) -> Optional[int]:
+        try:
+            return os.stat(dir or os.curdir).st_mtime_ns
+        except OSError:
+            return None
+
+    def __is_stale(self, path: str) -> bool:
+        if path != self.__path:
+            return True
+        now = time.monotonic()
+        if now - self.__checked < self.RECHECK_INTERVAL:
+            return False
+        self.__checked = now
+        for dir, mtime in self.__dirs:
+            if self.__mtime(dir) != mtime:
+                return True
+        return False
+
+    def __rebuild(self, path: str):
+        dirs = []
+        names: Dict[str, List[Tuple[int, str]]] = {}
+        for idx, dir in enumerate(self.__dir_list(path)):
+            # Record mtime before listing so changes made during the listing cause a rebuild next time
+            dirs.append((dir, self.__mtime(dir)))
+            try:
+                with os.scandir(dir or os.curdir) as it:
+                    for entry in it:
+                        try:
+                            # Directories pass the os.access check on Windows
+                            if entry.is_dir():
+                                continue
+                        except OSError:
+                            continue
+                        names.setdefault(os.path.normcase(entry.name), []).append((idx, os.path.join(dir, entry.name)))
+            except OSError:
+                # Directory does not exist or is not readable
+                pass
+        self.__path = path
+        self.__checked = time.monotonic()
+        self.__dirs = dirs
+        self.__names = names
+
+    def __candidates(self, cmd: str) -> List[str]:
+        if sys.platform == "win32":
+            # PATHEXT is necessary to check on Windows.
+            pathext_source = os.getenv("PATHEXT") or ".COM;.EXE;.BAT;.CMD;.VBS;.JS;.WS;.MSC"
+            pathext = [ext for ext in pathext_source.split(os.pathsep) if ext]
+            # See if the given file matches any of the expected path extensions.
+            # This will allow us to short circuit when given "python.exe".
+            if any(cmd.lower().endswith(ext.lower()) for ext in pathext):
+                return [cmd]
+            return [cmd + ext for ext in pathext]
+        # On other platforms you don't have things like PATHEXT to tell you
+        # what file suffixes are executable, so just pass on cmd as-is.
+        return [cmd]
+
+    def which_all(self, cmd: str, mode: int = os.F_OK | os.X_OK) -> List[str]:
+        # Return all instances of cmd in PATH, in PATH order
+        if os.path.dirname(cmd):
+            # Given a path with a directory part, look it up directly
+            if os.path.exists(cmd) and os.access(cmd, mode) and not os.path.isdir(cmd):
+                return [cmd]
+            return []
+
+        with self.__lock:
+            path = self.__search_path()
+            if self.__is_stale(path):
+                self.__rebuild(path)
+            matches = []
+            for ext_idx, name in enumerate(self.__candidates(cmd)):
+                for dir_idx, fullpath in self.__names.get(os.path.normcase(name), []):
+                    matches.append((dir_idx, ext_idx, fullpath))
+        matches.sort()
+
+        # Only the (few) matches need to be checked for access
+        return [m[2] for m in matches if os.access(m[2], mode)]
+
+    def which(self, cmd: str, mode: int = os.F_OK | os.X_OK) -> Optional[str]:
+        # Drop in replacement for shutil.which
+        found = self.which_all(cmd, mode)
+        if len(found) == 0:
+            return None
+        return found[0]
+
+
+path_index: PathIndex = PathIndex()
@@ -3,37 +3,90 @@ from ui_playstream_dialog import Ui_PlayStreamDialog
 from PySide6.QtWidgets import QDialog, QWidget
 from PySide6.QtCore import QTimer, Qt
 from PySide6.QtGui import QCloseEvent
+from stream_stats import StreamStats
 import subprocess
+import threading
 import signal
 
 
 class PlayStreamDialog(QDialog):
-    def __init__(self, title: str, message: str, proc: subprocess.Popen, parent: Optional[QWidget] = None):
+    def __init__(self, title: str, message: str, proc: subprocess.Popen, player: str, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.setWindowFlags(self.windowFlags() | Qt.Tool)
 
         self.proc = proc
+        self.stats = StreamStats(player)
 
         self.ui = Ui_PlayStreamDialog()
         self.ui.setupUi(self)
 
         self.timer = QTimer()
         self.timer.timeout.connect(self.poll_proc)
-    
+
         self.setWindowTitle(title)
         self.ui.lbl_message.setText(message)
 
+        # Player output is read on a background thread so a full pipe never blocks the player
+        if self.proc.stdout is not None:
+            self.reader = threading.Thread(target=self.read_output, daemon=True)
+            self.reader.start()
+
         self.timer.start(500)
-    
+
+    def read_output(self):
+        while True:
+            data = self.proc.stdout.read1(4096)
+            if not data:
+                break
+            self.stats.feed(data.decode(errors="replace"))
+
+    def format_value(self, value: Optional[float], fmt: str) -> str:
+        return "-" if value is None else fmt.format(value)
+
+    def format_bitrate(self, value: Optional[float]) -> str:
+        if value is None:
+            return "-"
+        if value >= 1000000:
+            return "{0:.2f} Mbit/s".format(value / 1000000)
+        return "{0:.0f} kbit/s".format(value / 1000)
+
+    def update_stats(self):
+        sample = self.stats.sample()
+
+        fps = self.format_value(sample.fps, "{0:.1f}")
+        if self.stats.nominal_fps is not None:
+            fps += self.tr(" (stream: {0:g})").format(self.stats.nominal_fps)
+        self.ui.lbl_fps.setText(fps)
+        self.ui.lbl_bitrate.setText(self.format_bitrate(sample.bitrate))
+        drop_rate = self.stats.drop_rate()
+        drops = self.format_value(sample.dropped, "{0}")
+        if drop_rate is not None:
+            drops += self.tr(" ({0:.1f} / sec)").format(drop_rate)
+        self.ui.lbl_dropped.setText(drops)
+        self.ui.lbl_delay.setText(self.format_value(sample.delay, "{0:g} " + self.stats.delay_unit))
+
+        # Rolling history
+        fps_summary = self.stats.summary("fps")
+        if fps_summary is not None:
+            self.ui.lbl_fps_history.setText(self.tr("min {0:.1f} / avg {1:.1f} / max {2:.1f}").format(*fps_summary))
+        br_summary = self.stats.summary("bitrate")
+        if br_summary is not None:
+            self.ui.lbl_bitrate_history.setText(self.tr("min {0} / avg {1} / max {2}").format(*[self.format_bitrate(v) for v in br_summary]))
+        delay_summary = self.stats.summary("delay")
+        if delay_summary is not None:
+            self.ui.lbl_delay_history.setText(self.tr("min {0:g} / avg {1:.1f} / max {2:g}").format(*delay_summary))
+
     def poll_proc(self):
         if self.proc.poll() is not None:
             self.close()
+            return
+        self.update_stats()
 
     def closeEvent(self, arg__1: QCloseEvent):
         self.proc.kill()
-    
+
     def reject(self):
         self.proc.kill()
-    
+
     def accept(self):
         self.proc.kill()
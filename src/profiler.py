@@ -0,0 +1,110 @@
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class Profiler:
+    """
+    Opt-in timeline of startup phases, background tasks, and slow GUI thread events.
+    Enabled with the --profile[=file] command line flag or the ARPIROBOT_PROFILE environment variable
+    (set to 1 or to the output file). Saved in Chrome trace format (open with chrome://tracing or ui.perfetto.dev).
+    Only uses the standard library so it can time imports of everything else.
+    """
+    def __init__(self):
+        # Constants
+        self.__ENV_VAR = "ARPIROBOT_PROFILE"
+        self.__THRESHOLD_ENV_VAR = "ARPIROBOT_PROFILE_THRESHOLD_MS"
+        self.__DEFAULT_THRESHOLD = 0.016
+
+        self.__lock = threading.Lock()
+        self.__origin = time.perf_counter()
+        self.__events: List[dict] = []
+        self.__thread_names: Dict[int, str] = {}
+
+        self.enabled = False
+        self.path = ""
+        # GUI thread events taking longer than this (seconds) are recorded
+        self.threshold = self.__DEFAULT_THRESHOLD
+
+    def configure(self, argv: List[str]) -> List[str]:
+        # Enable from command line / environment. Returns argv without profiler arguments.
+        path = os.environ.get(self.__ENV_VAR, "")
+        args = []
+        for arg in argv:
+            if arg == "--profile":
+                path = path or "1"
+            elif arg.startswith("--profile="):
+                path = arg[len("--profile="):]
+            else:
+                args.append(arg)
+        if path not in ["", "0"]:
+            self.enabled = True
+            if path == "1":
+                path = os.path.join(os.path.expanduser("~"), ".arpirobot", "profile-{0}.json".format(
+                    datetime.datetime.now().strftime("%Y%m%d-%H%M%S")))
+            self.path = path
+        try:
+            self.threshold = float(os.environ[self.__THRESHOLD_ENV_VAR]) / 1000
+        except (KeyError, ValueError):
+            pass
+        return args
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def __add(self, event: dict):
+        thread = threading.current_thread()
+        event["pid"] = os.getpid()
+        event["tid"] = thread.ident
+        with self.__lock:
+            self.__thread_names[thread.ident] = thread.name
+            self.__events.append(event)
+
+    def __us(self, t: float) -> float:
+        return (t - self.__origin) * 1000000
+
+    def complete(self, name: str, category: str, start: float, end: float, args: Optional[dict] = None):
+        # Something that ran from start to end (times from now()) on the current thread
+        event = {"name": name, "cat": category, "ph": "X", "ts": self.__us(start), "dur": self.__us(end) - self.__us(start)}
+        if args is not None:
+            event["args"] = args
+        self.__add(event)
+
+    def instant(self, name: str, category: str):
+        self.__add({"name": name, "cat": category, "ph": "i", "s": "p", "ts": self.__us(self.now())})
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str) -> Iterator[None]:
+        # Startup phases are always recorded (there are only a few) so imports done before
+        # the command line is parsed are included. They are only written if profiling is enabled.
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, self.now())
+
+    def save(self) -> Optional[str]:
+        # Returns the path written (None if profiling is not enabled or writing failed)
+        if not self.enabled:
+            return None
+        with self.__lock:
+            events = list(self.__events)
+            names = dict(self.__thread_names)
+        pid = os.getpid()
+        for tid, name in names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w") as fp:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
+        except OSError as e:
+            print("Failed to write profile: {0}".format(e))
+            return None
+        return self.path
+
+
+profiler: Profiler = Profiler()
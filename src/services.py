@@ -0,0 +1,53 @@
+import shlex
+from typing import Dict, List, Tuple
+
+
+CAMSTREAM_SERVICE = "camstream.service"
+RTSP_SERVICE = "rtsp-simple-server.service"
+
+# Services shown on the camera streaming tab
+STREAM_SERVICES = [CAMSTREAM_SERVICE, RTSP_SERVICE]
+
+# Verbs that change which services start at boot (these modify the root filesystem)
+BOOT_VERBS = ["enable", "disable"]
+
+# UnitFileState values of units that start at boot. enabled-runtime is enabled until reboot, alias is shown for
+# a unit queried by an alias name, and static / generated / transient units can't be disabled.
+# Anything else (disabled, masked, indirect, linked, ...) does not start at boot by itself.
+BOOT_ENABLED_STATES = ["enabled", "enabled-runtime", "alias", "static", "generated", "transient"]
+
+
+class ServiceState:
+    def __init__(self, unit: str, enabled: bool = False, active: bool = False):
+        self.unit = unit
+        self.enabled = enabled
+        self.active = active
+
+
+def query_command(units: List[str]) -> str:
+    # Enabled and active state of all units in one command
+    return "systemctl show --property=Id,UnitFileState,ActiveState -- {0}".format(" ".join(shlex.quote(u) for u in units))
+
+
+def parse_query_output(text: str, units: List[str]) -> Dict[str, ServiceState]:
+    # systemctl show prints one block of key=value lines per unit (in argument order) separated by blank lines
+    # Results are keyed by the requested name, even if it is an alias (Id is the unit's real name)
+    states = {unit: ServiceState(unit) for unit in units}
+    blocks = [b for b in text.replace("\r", "").split("\n\n") if b.strip() != ""]
+    for unit, block in zip(units, blocks):
+        props = {}
+        for line in block.split("\n"):
+            key, _, value = line.partition("=")
+            props[key.strip()] = value.strip()
+        states[unit] = ServiceState(unit, props.get("UnitFileState", "").lower() in BOOT_ENABLED_STATES,
+            props.get("ActiveState", "").lower() == "active")
+    return states
+
+
+def apply_command(changes: List[Tuple[str, str]]) -> str:
+    # Apply several (verb, unit) changes in one command. Stops at the first failure.
+    return " && ".join("sudo systemctl {0} {1}".format(verb, shlex.quote(unit)) for verb, unit in changes)
+
+
+def needs_writable(changes: List[Tuple[str, str]]) -> bool:
+    return any(verb in BOOT_VERBS for verb, _ in changes)
@@ -0,0 +1,98 @@
+import os
+import shlex
+import threading
+from paramiko.client import AutoAddPolicy, SSHClient, MissingHostKeyPolicy
+from paramiko.ecdsakey import ECDSAKey
+from paramiko.pkey import PKey
+from paramiko.sftp import SFTPError
+from paramiko.ssh_exception import AuthenticationException, BadHostKeyException, SSHException
+
+
+# paramiko is slow to import, so this module is only imported when it is first needed
+# (see load_paramiko in deploy_tool.py)
+
+# paramiko's exception types are re-exported for deploy_tool
+__all__ = [
+    "SSHClient", "PKey", "SFTPError", "SSHException", "BadHostKeyException", "AuthenticationException",
+    "TrustOnFirstUsePolicy", "new_client", "forget_host_key", "load_key", "public_key_line", "authorize_key_command",
+    "CONFIG_DIR", "KNOWN_HOSTS_FILE", "KEY_FILE", "KEY_COMMENT"
+]
+
+# Stored with the deploy tool's settings
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".arpirobot")
+KNOWN_HOSTS_FILE = os.path.join(CONFIG_DIR, "known_hosts")
+KEY_FILE = os.path.join(CONFIG_DIR, "id_ecdsa")
+
+# Comment on the public key installed on robots
+KEY_COMMENT = "arpirobot-deploytool"
+
+# Clients on several threads may add host keys at once
+_known_hosts_lock = threading.Lock()
+_key_lock = threading.Lock()
+
+
+class TrustOnFirstUsePolicy(MissingHostKeyPolicy):
+    """
+    Accepts (and remembers) the key of a robot not connected to before. A robot that later presents a different
+    key is rejected by paramiko with BadHostKeyException (see forget_host_key).
+    """
+    def missing_host_key(self, client: SSHClient, hostname: str, key: PKey):
+        client.get_host_keys().add(hostname, key.get_name(), key)
+        with _known_hosts_lock:
+            os.makedirs(CONFIG_DIR, exist_ok=True)
+            # Appended (not rewritten) so keys added by other clients at the same time are kept
+            with open(KNOWN_HOSTS_FILE, "a") as file:
+                file.write("{0} {1} {2}\n".format(hostname, key.get_name(), key.get_base64()))
+
+
+def new_client(save_host_keys: bool = True) -> SSHClient:
+    # Keys of robots not connected to before are only remembered by this client if save_host_keys is False
+    ssh = SSHClient()
+    with _known_hosts_lock:
+        if os.path.exists(KNOWN_HOSTS_FILE):
+            ssh.get_host_keys().load(KNOWN_HOSTS_FILE)
+    ssh.set_missing_host_key_policy(TrustOnFirstUsePolicy() if save_host_keys else AutoAddPolicy())
+    return ssh
+
+
+def forget_host_key(hostname: str):
+    # Used when a robot's key changed for a known reason (eg the SD card was re-imaged)
+    with _known_hosts_lock:
+        if not os.path.exists(KNOWN_HOSTS_FILE):
+            return
+        with open(KNOWN_HOSTS_FILE, "r") as file:
+            lines = file.readlines()
+        with open(KNOWN_HOSTS_FILE, "w") as file:
+            for line in lines:
+                fields = line.split()
+                if len(fields) == 0 or hostname not in fields[0].split(","):
+                    file.write(line)
+
+
+def load_key(create: bool = False) -> PKey:
+    # Key used to log in to robots (created on first use if create is True)
+    with _key_lock:
+        if not os.path.exists(KEY_FILE):
+            if not create:
+                raise FileNotFoundError(KEY_FILE)
+            os.makedirs(CONFIG_DIR, exist_ok=True)
+            key = ECDSAKey.generate(bits=256)
+            key.write_private_key_file(KEY_FILE)
+            os.chmod(KEY_FILE, 0o600)
+            with open(KEY_FILE + ".pub", "w") as file:
+                file.write(public_key_line(key) + "\n")
+            return key
+        return ECDSAKey.from_private_key_file(KEY_FILE)
+
+
+def public_key_line(key: PKey) -> str:
+    # As written to authorized_keys
+    return "{0} {1} {2}".format(key.get_name(), key.get_base64(), KEY_COMMENT)
+
+
+def authorize_key_command(key: PKey) -> str:
+    # Adds the key to the user's authorized_keys on the robot (unless already there)
+    line = shlex.quote(public_key_line(key))
+    return "mkdir -p ~/.ssh && chmod 700 ~/.ssh && touch ~/.ssh/authorized_keys && " \
+        "chmod 600 ~/.ssh/authorized_keys && (grep -qxF {0} ~/.ssh/authorized_keys || echo {0} >> ~/.ssh/authorized_keys)" \
+        .format(line)
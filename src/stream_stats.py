@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+
+class StreamSample:
+    def __init__(self, timestamp: float, fps: Optional[float] = None, bitrate: Optional[float] = None,
+            dropped: Optional[int] = None, delay: Optional[float] = None):
+        self.timestamp = timestamp
+        self.fps = fps              # Frames per second actually decoded / shown
+        self.bitrate = bitrate      # Bits per second of the video stream
+        self.dropped = dropped      # Total dropped frames since playback started
+        self.delay = delay          # Frames queued for decode / display (ffplay: KB in video queue)
+
+
+class StreamStats:
+    """
+    Incrementally parses the output of a player (ffplay, mpv, or mplayer) into stream health metrics.
+    feed() is called from the thread reading the player's output. sample() is called periodically
+    from the UI thread and records a rolling history of samples.
+    """
+    # Window used to compute frame rate from frame counters
+    RATE_WINDOW = 2.0
+
+    # ffplay status line: "  12.34 M-V:  0.003 fd=   3 aq=    0KB vq=   12KB sq=    0B f=0/0"
+    # (playback clock, A/V difference, frames dropped, audio / video / subtitle queue sizes)
+    # ffplay has no frame counter, so frame rate is estimated from the nominal rate, how fast the playback
+    # clock advances (it stops when the stream stalls), and how fast frames are dropped
+    FFPLAY_STATUS = re.compile(r"^\s*(\S+)\s.*fd=\s*(\d+)\s+aq=\s*(\d+)KB\s+vq=\s*(\d+)KB")
+    # Stream info printed when playback starts
+    FFMPEG_STREAM_FPS = re.compile(r"Stream #.*Video:.*?([\d.]+) fps")
+    FFMPEG_STREAM_BITRATE = re.compile(r"Stream #.*Video:.*?(\d+) kb/s")
+    # Custom status line requested with --term-status-msg
+    MPV_STATUS = re.compile(r"DTSTATS,fps=([\d.]*),br=([\d.]*),drop=(\d*),ddrop=(\d*),delayed=(\d*)")
+    # mplayer -benchmark status: "V:   2.4  72/ 72  15%  4%  0.0% 0 0"
+    MPLAYER_STATUS = re.compile(r"V:\s*([\d.]+)\s+(\d+)/\s*(\d+)\s+\S+\s+\S+\s+\S+\s+(\d+)\s+(\d+)")
+
+    def __init__(self, player: str, history_seconds: float = 60.0):
+        self.__player = player
+        self.__history_seconds = history_seconds
+        self.__lock = threading.Lock()
+        self.__partial = ""
+
+        # Most recent values parsed from output
+        self.__frames: Deque[Tuple[float, int]] = deque()
+        # (time, playback clock, frames dropped) from ffplay status lines
+        self.__clock: Deque[Tuple[float, float, int]] = deque()
+        self.__fps: Optional[float] = None
+        self.__nominal_fps: Optional[float] = None
+        self.__bitrate: Optional[float] = None
+        self.__dropped: Optional[int] = None
+        self.__delay: Optional[float] = None
+
+        self.__history: Deque[StreamSample] = deque()
+
+    def feed(self, text: str):
+        # Players rewrite status lines using \r, so treat both \r and \n as line endings
+        lines = re.split(r"[\r\n]", self.__partial + text)
+        self.__partial = lines.pop()
+        now = time.monotonic()
+        with self.__lock:
+            for line in lines:
+                if line.strip() != "":
+                    self.__parse_line(line, now)
+
+    def __add_frame_count(self, frames: int, now: float):
+        # Keep frame counts for the rate window. A count lower than before means playback restarted.
+        if len(self.__frames) > 0 and frames < self.__frames[-1][1]:
+            self.__frames.clear()
+        self.__frames.append((now, frames))
+        while len(self.__frames) > 2 and now - self.__frames[0][0] > self.RATE_WINDOW:
+            self.__frames.popleft()
+
+    def __add_clock(self, clock: float, dropped: int, now: float):
+        # Same as __add_frame_count for ffplay status. A clock going backwards means playback restarted (or seeked).
+        if len(self.__clock) > 0 and (clock < self.__clock[-1][1] or dropped < self.__clock[-1][2]):
+            self.__clock.clear()
+        self.__clock.append((now, clock, dropped))
+        while len(self.__clock) > 2 and now - self.__clock[0][0] > self.RATE_WINDOW:
+            self.__clock.popleft()
+
+    def __ffplay_fps(self, now: float) -> Optional[float]:
+        # Must be called with lock held
+        if self.__nominal_fps is None or len(self.__clock) < 2:
+            return None
+        (t0, c0, d0), (t1, c1, d1) = self.__clock[0], self.__clock[-1]
+        if now - t1 > self.RATE_WINDOW:
+            # No status recently
+            return 0.0
+        if t1 <= t0:
+            return None
+        progress = min(max((c1 - c0) / (t1 - t0), 0.0), 1.0)
+        return max(0.0, self.__nominal_fps * progress - (d1 - d0) / (t1 - t0))
+
+    def __parse_line(self, line: str, now: float):
+        if self.__player == "ffplay":
+            m = self.FFPLAY_STATUS.search(line)
+            if m is not None:
+                self.__dropped = int(m.group(2))
+                self.__delay = float(m.group(4))
+                try:
+                    clock = float(m.group(1))
+                except ValueError:
+                    # nan before playback starts
+                    clock = None
+                if clock is not None and clock == clock:
+                    self.__add_clock(clock, self.__dropped, now)
+                return
+            m = self.FFMPEG_STREAM_FPS.search(line)
+            if m is not None:
+                self.__nominal_fps = float(m.group(1))
+            m = self.FFMPEG_STREAM_BITRATE.search(line)
+            if m is not None:
+                self.__bitrate = float(m.group(1)) * 1000
+        elif self.__player == "mpv":
+            m = self.MPV_STATUS.search(line)
+            if m is not None:
+                fps, br, drop, ddrop, delayed = m.groups()
+                self.__fps = float(fps) if fps != "" else None
+                self.__bitrate = float(br) if br != "" else None
+                if drop != "" or ddrop != "":
+                    self.__dropped = int(drop or 0) + int(ddrop or 0)
+                self.__delay = float(delayed) if delayed != "" else None
+        elif self.__player == "mplayer":
+            m = self.MPLAYER_STATUS.search(line)
+            if m is not None:
+                self.__add_frame_count(int(m.group(2)), now)
+                self.__dropped = int(m.group(4))
+
+    def sample(self) -> StreamSample:
+        # Current metrics. Also appended to the rolling history.
+        now = time.monotonic()
+        with self.__lock:
+            fps = self.__fps
+            if self.__player == "ffplay":
+                fps = self.__ffplay_fps(now)
+            elif len(self.__frames) >= 2:
+                (t0, f0), (t1, f1) = self.__frames[0], self.__frames[-1]
+                if now - t1 > self.RATE_WINDOW:
+                    # No frames recently
+                    fps = 0.0
+                elif t1 > t0:
+                    fps = (f1 - f0) / (t1 - t0)
+            sample = StreamSample(now, fps, self.__bitrate, self.__dropped, self.__delay)
+            self.__history.append(sample)
+            while now - self.__history[0].timestamp > self.__history_seconds:
+                self.__history.popleft()
+        return sample
+
+    @property
+    def delay_unit(self) -> str:
+        # Unit of StreamSample.delay for this player
+        return "KB" if self.__player == "ffplay" else "frames"
+
+    @property
+    def nominal_fps(self) -> Optional[float]:
+        return self.__nominal_fps
+
+    def history(self) -> List[StreamSample]:
+        with self.__lock:
+            return list(self.__history)
+
+    def drop_rate(self) -> Optional[float]:
+        # Dropped frames per second over the history
+        history = [s for s in self.history() if s.dropped is not None]
+        if len(history) < 2 or history[-1].timestamp <= history[0].timestamp:
+            return None
+        return max(0, history[-1].dropped - history[0].dropped) / (history[-1].timestamp - history[0].timestamp)
+
+    def summary(self, attr: str) -> Optional[Tuple[float, float, float]]:
+        # (min, average, max) of one sample attribute over the history
+        values = [getattr(s, attr) for s in self.history() if getattr(s, attr) is not None]
+        if len(values) == 0:
+            return None
+        return min(values), sum(values) / len(values), max(values)
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+# Keys of data shown on robot tabs
+VERSIONS = "versions"
+NETWORK = "network"
+STREAMS = "streams"
+
+# Cached data older than this (seconds) is refreshed in the background when its tab is shown
+STALE_AFTER = 30.0
+
+
+class TabDataCache:
+    """
+    Data read from the robot for its tabs, with the time it was read. Tabs show cached data immediately
+    and refresh it in the background once stale, instead of blocking while it is read again.
+    Also tracks which keys are being fetched so the same data isn't requested twice at once.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # key -> (time read, value)
+        self.__entries: Dict[str, Tuple[float, Any]] = {}
+        # key -> number of the fetch in progress (so a cancelled fetch finishing late can't end a newer one)
+        self.__fetching: Dict[str, int] = {}
+        self.__fetch_count = 0
+
+    def put(self, key: str, value: Any):
+        with self.__lock:
+            self.__entries[key] = (time.monotonic(), value)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+        return None if entry is None else entry[1]
+
+    def is_stale(self, key: str, max_age: float = STALE_AFTER) -> bool:
+        # True if missing or older than max_age
+        with self.__lock:
+            entry = self.__entries.get(key)
+        return entry is None or time.monotonic() - entry[0] > max_age
+
+    def start_fetch(self, key: str) -> Optional[int]:
+        # Returns the fetch's number (pass to end_fetch), or None if key is already being fetched
+        with self.__lock:
+            if key in self.__fetching:
+                return None
+            self.__fetch_count += 1
+            self.__fetching[key] = self.__fetch_count
+            return self.__fetch_count
+
+    def end_fetch(self, key: str, fetch: int):
+        with self.__lock:
+            if self.__fetching.get(key) == fetch:
+                del self.__fetching[key]
+
+    def cancel_fetches(self):
+        # Fetches from a closed connection. Data read so far is kept.
+        with self.__lock:
+            self.__fetching.clear()
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__fetching.clear()
@@ -0,0 +1,167 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from profiler import profiler
+
+
+# Queues tasks can be started on (see TaskExecutor)
+DEFAULT_QUEUE = "default"
+SSH_QUEUE = "ssh"
+STREAM_QUEUE = "streams"
+FETCH_QUEUE = "fetch"
+
+
+class TaskCancelled(Exception):
+    # Raised by CancellationToken.check() to end a cancelled task
+    pass
+
+
+class CancellationToken:
+    def __init__(self):
+        self.__event = threading.Event()
+
+    def cancel(self):
+        self.__event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__event.is_set()
+
+    def check(self):
+        if self.__event.is_set():
+            raise TaskCancelled()
+
+    def wait(self, timeout: float) -> bool:
+        # Use instead of time.sleep in tasks. Returns True if cancelled while waiting.
+        return self.__event.wait(timeout)
+
+
+# Task running on the current thread (if any)
+_current = threading.local()
+
+
+def current_task() -> Optional['Task']:
+    return getattr(_current, "task", None)
+
+
+def report_progress(done: int, total: int):
+    # Report progress of the task running on this thread (does nothing if not called from a task)
+    task = current_task()
+    if task is not None:
+        task.report_progress(done, total)
+
+
+class Task(QRunnable, QObject):
+    task_complete = Signal(object)
+    task_exception = Signal(Exception)
+    # done, total (total of zero if unknown). qint64 so byte counts fit.
+    task_progress = Signal("qint64", "qint64")
+    # Emitted last, whether the task completed, failed, or was cancelled
+    task_finished = Signal()
+
+    def __init__(self, parent, target: Callable, *args, **kwargs):
+        QRunnable.__init__(self)
+        QObject.__init__(self, parent=parent)
+        self.__target = target
+        self.__args = args
+        self.__kwargs = kwargs
+        self.token = CancellationToken()
+        self.queue = DEFAULT_QUEUE
+
+        # Released by the executor once finished (see TaskExecutor.release)
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        # Tasks stop at their next cancellation check. Cancelled tasks do not emit task_exception.
+        self.token.cancel()
+
+    def report_progress(self, done: int, total: int):
+        # Can call from any thread
+        self.task_progress.emit(done, total)
+
+    def __profile(self, start: float, result: str):
+        if profiler.enabled:
+            name = getattr(self.__target, "__qualname__", repr(self.__target))
+            profiler.complete(name, "task", start, profiler.now(), {"result": result, "queue": self.queue})
+
+    def run(self):
+        start = profiler.now()
+        _current.task = self
+        try:
+            self.token.check()
+            res = self.__target(*self.__args, **self.__kwargs)
+            self.__profile(start, "complete")
+            self.task_complete.emit(res)
+        except TaskCancelled:
+            self.__profile(start, "cancelled")
+        except Exception as e:
+            self.__profile(start, "cancelled" if self.token.cancelled else "exception")
+            if not self.token.cancelled:
+                try:
+                    self.task_exception.emit(e)
+                except:
+                    pass
+        finally:
+            _current.task = None
+            try:
+                self.task_finished.emit()
+            except:
+                pass
+
+
+class TaskExecutor(QObject):
+    """
+    Runs tasks on one of several queues
+      default: short local work (global thread pool)
+      ssh:     one-shot operations on the robot, run one at a time so they can't interfere with each other
+      streams: long running loops (log, status) that live for the whole connection
+      fetch:   read-only queries for tab data, several at once (see tab_cache)
+    Finished tasks are released so they do not accumulate.
+    """
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        ssh_pool = QThreadPool(self)
+        ssh_pool.setMaxThreadCount(1)
+        stream_pool = QThreadPool(self)
+        stream_pool.setMaxThreadCount(4)
+        fetch_pool = QThreadPool(self)
+        fetch_pool.setMaxThreadCount(4)
+        self.__pools: Dict[str, QThreadPool] = {
+            DEFAULT_QUEUE: QThreadPool.globalInstance(),
+            SSH_QUEUE: ssh_pool,
+            STREAM_QUEUE: stream_pool,
+            FETCH_QUEUE: fetch_pool
+        }
+
+        # Tasks started and not yet released (owned here until finished)
+        self.__tasks: List[Task] = []
+
+    def start(self, task: Task, queue: str = DEFAULT_QUEUE):
+        # Must be called from the UI thread
+        task.queue = queue
+        self.__tasks.append(task)
+        task.task_finished.connect(lambda: self.release(task))
+        self.__pools[queue].start(task)
+
+    def release(self, task: Task):
+        # Must be called from the UI thread
+        if task in self.__tasks:
+            self.__tasks.remove(task)
+            task.deleteLater()
+
+    def tasks(self, queue: Optional[str] = None) -> List[Task]:
+        return [t for t in self.__tasks if queue is None or t.queue == queue]
+
+    def wait(self, queue: str, msecs: int) -> bool:
+        # Wait (at most msecs) for a queue's tasks to finish. Returns False on timeout.
+        return self.__pools[queue].waitForDone(msecs)
+
+    def cancel(self, queue: Optional[str] = None):
+        # Cancel all tasks on a queue (or all queues). Tasks that have not started yet are removed.
+        for task in self.tasks(queue):
+            task.cancel()
+            if self.__pools[task.queue].tryTake(task):
+                self.release(task)
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from PySide6.QtCore import QFile, QIODevice, QDir, QSettings, Qt
 from PySide6.QtGui import QPalette, QColor, QFont
@@ -8,6 +8,29 @@ from PySide6.QtWidgets import  QApplication, QStyleFactory
 WIFI_COUNTRY_CODES = ["AF", "AL", "DZ", "AS", "AD", "AO", "AI", "AQ", "AG", "AR", "AM", "AW", "AU", "AT", "AZ", "BS", "BH", "BD", "BB", "BY", "BE", "BZ", "BJ", "BM", "BT", "BO", "BQ", "BA", "BW", "BV", "BR", "IO", "BN", "BG", "BF", "BI", "KH", "CM", "CA", "CV", "KY", "CF", "TD", "CL", "CN", "CX", "CC", "CO", "KM", "CG", "CD", "CK", "CR", "CI", "HR", "CU", "CW", "CY", "CZ", "DK", "DJ", "DM", "DO", "EC", "EG", "SV", "GQ", "ER", "EE", "SZ", "ET", "FK", "FO", "FJ", "FI", "FR", "GF", "PF", "TF", "GA", "GM", "GE", "DE", "GH", "GI", "GR", "GL", "GD", "GP", "GU", "GT", "GG", "GN", "GW", "GY", "HT", "HM", "VA", "HN", "HK", "HU", "IS", "IN", "ID", "IR", "IQ", "IE", "IM", "IL", "IT", "JM", "JP", "JE", "JO", "KZ", "KE", "KI", "KP", "KR", "KW", "KG", "LA", "LV", "LB", "LS", "LR", "LY", "LI", "LT", "LU", "MO", "MG", "MW", "MY", "MV", "ML", "MT", "MH", "MQ", "MR", "MU", "YT", "MX", "FM", "MD", "MC", "MN", "ME", "MS", "MA", "MZ", "MM", "NA", "NR", "NP", "NL", "NC", "NZ", "NI", "NE", "NG", "NU", "NF", "MK", "MP", "NO", "OM", "PK", "PW", "PS", "PA", "PG", "PY", "PE", "PH", "PN", "PL", "PT", "PR", "QA", "RE", "RO", "RU", "RW", "BL", "SH", "KN", "LC", "MF", "PM", "VC", "WS", "SM", "ST", "SA", "SN", "RS", "SC", "SL", "SG", "SX", "SK", "SI", "SB", "SO", "ZA", "GS", "SS", "ES", "LK", "SD", "SR", "SJ", "SE", "CH", "SY", "TW", "TJ", "TZ", "TH", "TL", "TG", "TK", "TO", "TT", "TN", "TR", "TM", "TC", "TV", "UG", "UA", "AE", "GB", "UM", "US", "UY", "UZ", "VU", "VE", "VN", "VG", "VI", "WF", "EH", "YE", "ZM", "ZW", "AX"] 
 
 
+def percentile(values: List[float], p: float) -> Optional[float]:
+    # p-th percentile (0 - 100) of values using linear interpolation between closest ranks
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * p / 100.0
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+class ConnectionProfile:
+    """
+    Named set of connection settings for a robot
+    """
+    def __init__(self, name: str, address: str, user: str, use_key: bool = False):
+        self.name = name
+        self.address = address
+        self.user = user
+        # Log in with the deploy tool's key (see ssh_support.load_key), falling back to the password
+        self.use_key = use_key
+
+
 class SettingsManager:
     """
     Thin wrapper over QSettings object to manage deploy tool settings
@@ -18,14 +41,26 @@ class SettingsManager:
 
         self.__ROBOT_IP_KEY = "robot-address"
         self.__ROBOT_USER_KEY = "robot-user"
+        self.__ROBOT_USE_KEY_KEY = "robot-use-key"
+        self.__LAST_PROFILE_KEY = "last-profile"
+        self.__PREWARM_KEY = "prewarm-connection"
+        self.__PROFILES_GROUP = "profiles"
+        self.__PROFILE_ADDRESS_KEY = "address"
+        self.__PROFILE_USER_KEY = "user"
+        self.__PROFILE_USE_KEY_KEY = "use-key"
         self.__LARGE_FONTS_KEY = "larger-fonts"
-        self.__LONG_TIMEOUTS_KEY = "longer-timeouts"
+        self.__RTT_ESTIMATE_KEY = "rtt-estimate"
+        self.__AUTO_RECONNECT_KEY = "auto-reconnect"
         self.__LAST_PROJ_FOLDER_KEY = "proj-folder"
+        self.__PLATFORM_PROBE_KEY = "platform-probe"
 
         self.__DEFAULT_ROBOT_IP = "192.168.10.1"
         self.__DEFAULT_USER = "arpirobot"
+        self.__DEFAULT_USE_KEY = False
+        self.__DEFAULT_PREWARM = False
         self.__DEFAULT_LARGE_FONTS = False
-        self.__DEFAULT_LONG_TIMEOUT = False
+        self.__DEFAULT_RTT_ESTIMATE = ""
+        self.__DEFAULT_AUTO_RECONNECT = True
         self.__DEFAULT_PROJ_FOLDER = ""
 
         # Setup
@@ -38,10 +73,10 @@ class SettingsManager:
             self.__settings.setValue(self.__ROBOT_USER_KEY, self.__DEFAULT_USER)
         if self.__settings.value(self.__LARGE_FONTS_KEY, None) is None:
             self.__settings.setValue(self.__LARGE_FONTS_KEY, self.__DEFAULT_LARGE_FONTS)
-        if self.__settings.value(self.__LONG_TIMEOUTS_KEY, None) is None:
-            self.__settings.setValue(self.__LONG_TIMEOUTS_KEY, self.__DEFAULT_LONG_TIMEOUT)
         if self.__settings.value(self.__LAST_PROJ_FOLDER_KEY, None) is None:
             self.__settings.setValue(self.__LAST_PROJ_FOLDER_KEY, self.__DEFAULT_PROJ_FOLDER)
+        if self.__settings.value(self.__AUTO_RECONNECT_KEY, None) is None:
+            self.__settings.setValue(self.__AUTO_RECONNECT_KEY, self.__DEFAULT_AUTO_RECONNECT)
 
     @property
     def robot_address(self) -> str:
@@ -59,6 +94,61 @@ class SettingsManager:
     def robot_user(self, value: str):
         self.__settings.setValue(self.__ROBOT_USER_KEY, value)
 
+    @property
+    def robot_use_key(self) -> bool:
+        return str(self.__settings.value(self.__ROBOT_USE_KEY_KEY, self.__DEFAULT_USE_KEY)).lower() == "true"
+
+    @robot_use_key.setter
+    def robot_use_key(self, value: bool):
+        self.__settings.setValue(self.__ROBOT_USE_KEY_KEY, value)
+
+    @property
+    def last_profile(self) -> str:
+        # Name of the last used connection profile (empty if none)
+        return self.__settings.value(self.__LAST_PROFILE_KEY, "")
+
+    @last_profile.setter
+    def last_profile(self, value: str):
+        self.__settings.setValue(self.__LAST_PROFILE_KEY, value)
+
+    @property
+    def prewarm_connection(self) -> bool:
+        # Connect to the last used robot in the background at startup
+        return str(self.__settings.value(self.__PREWARM_KEY, self.__DEFAULT_PREWARM)).lower() == "true"
+
+    @prewarm_connection.setter
+    def prewarm_connection(self, value: bool):
+        self.__settings.setValue(self.__PREWARM_KEY, value)
+
+    def profile_names(self) -> List[str]:
+        # Each profile is a group within the profiles group
+        self.__settings.beginGroup(self.__PROFILES_GROUP)
+        names = self.__settings.childGroups()
+        self.__settings.endGroup()
+        return sorted(names, key=str.lower)
+
+    def profile(self, name: str) -> Optional[ConnectionProfile]:
+        if name not in self.profile_names():
+            return None
+        self.__settings.beginGroup("{0}/{1}".format(self.__PROFILES_GROUP, name))
+        profile = ConnectionProfile(name,
+            self.__settings.value(self.__PROFILE_ADDRESS_KEY, self.__DEFAULT_ROBOT_IP),
+            self.__settings.value(self.__PROFILE_USER_KEY, self.__DEFAULT_USER),
+            str(self.__settings.value(self.__PROFILE_USE_KEY_KEY, self.__DEFAULT_USE_KEY)).lower() == "true")
+        self.__settings.endGroup()
+        return profile
+
+    def save_profile(self, profile: ConnectionProfile):
+        # Replaces any profile with the same name. Names can't contain slashes (group separators).
+        self.__settings.beginGroup("{0}/{1}".format(self.__PROFILES_GROUP, profile.name))
+        self.__settings.setValue(self.__PROFILE_ADDRESS_KEY, profile.address)
+        self.__settings.setValue(self.__PROFILE_USER_KEY, profile.user)
+        self.__settings.setValue(self.__PROFILE_USE_KEY_KEY, profile.use_key)
+        self.__settings.endGroup()
+
+    def remove_profile(self, name: str):
+        self.__settings.remove("{0}/{1}".format(self.__PROFILES_GROUP, name))
+
     @property
     def larger_fonts(self) -> bool:
         return str(self.__settings.value(self.__LARGE_FONTS_KEY, self.__DEFAULT_LARGE_FONTS)).lower() == "true"
@@ -68,12 +158,21 @@ class SettingsManager:
         self.__settings.setValue(self.__LARGE_FONTS_KEY, value)
     
     @property
-    def longer_timeouts(self) -> bool:
-        return str(self.__settings.value(self.__LONG_TIMEOUTS_KEY, self.__DEFAULT_LONG_TIMEOUT)).lower() == "true"
+    def rtt_estimate(self) -> str:
+        # Round trip time estimate from the last connection (see RttEstimator.save)
+        return self.__settings.value(self.__RTT_ESTIMATE_KEY, self.__DEFAULT_RTT_ESTIMATE)
+    
+    @rtt_estimate.setter
+    def rtt_estimate(self, value: str):
+        self.__settings.setValue(self.__RTT_ESTIMATE_KEY, value)
+
+    @property
+    def auto_reconnect(self) -> bool:
+        return str(self.__settings.value(self.__AUTO_RECONNECT_KEY, self.__DEFAULT_AUTO_RECONNECT)).lower() == "true"
     
-    @longer_timeouts.setter
-    def longer_timeouts(self, value: bool):
-        self.__settings.setValue(self.__LONG_TIMEOUTS_KEY, value)
+    @auto_reconnect.setter
+    def auto_reconnect(self, value: bool):
+        self.__settings.setValue(self.__AUTO_RECONNECT_KEY, value)
     
     @property
     def last_proj_folder(self) -> str:
@@ -83,5 +182,14 @@ class SettingsManager:
     def last_proj_folder(self, value: str):
         self.__settings.setValue(self.__LAST_PROJ_FOLDER_KEY, value)
 
+    @property
+    def platform_probe(self) -> str:
+        # Cached result of the Qt platform plugin probe at startup ("<environment fingerprint>=<platform>")
+        return self.__settings.value(self.__PLATFORM_PROBE_KEY, "")
+
+    @platform_probe.setter
+    def platform_probe(self, value: str):
+        self.__settings.setValue(self.__PLATFORM_PROBE_KEY, value)
+
 
 settings_manager: SettingsManager = SettingsManager()
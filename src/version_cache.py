@@ -0,0 +1,110 @@
+import json
+import os
+import subprocess
+import threading
+from typing import Callable, Dict, Optional
+
+from PySide6.QtCore import QDir
+
+
+class VersionCache:
+    """
+    Persistent cache of tool and component versions.
+    Entries are keyed by the resolved path of the executable (or version file) and are only
+    considered valid while the file's mtime, size, and inode are unchanged.
+    """
+    def __init__(self):
+        # Constants
+        self.__CACHE_FILE = QDir.homePath() + "/.arpirobot/version-cache.json"
+        self.__CACHE_VERSION = 1
+
+        self.__lock = threading.Lock()
+        self.__entries: Optional[Dict[str, dict]] = None
+        self.__dirty = False
+
+    def __load(self):
+        # Must be called with lock held
+        if self.__entries is not None:
+            return
+        self.__entries = {}
+        try:
+            with open(self.__CACHE_FILE, "r") as fp:
+                data = json.load(fp)
+            if data.get("version", None) == self.__CACHE_VERSION:
+                self.__entries = data.get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def __identity(self, path: str) -> Optional[list]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def __lookup(self, key: str, resolved: str, probe: Callable[[], Optional[str]], failed: str) -> Optional[str]:
+        # probe returns None if it failed. Failures (eg a timeout) are not cached, so the next lookup probes again.
+        identity = self.__identity(resolved)
+        if identity is None:
+            return None
+        with self.__lock:
+            self.__load()
+            entry = self.__entries.get(key, None)
+            if entry is not None and entry.get("id", None) == identity:
+                return entry.get("version", "")
+
+        # Probe outside of the lock (may run a subprocess)
+        version = probe()
+        if version is None:
+            return failed
+        with self.__lock:
+            self.__entries[key] = {"id": identity, "version": version}
+            self.__dirty = True
+        return version
+
+    def tool_version(self, exe: str, args: list, parse: Callable[[str], str], startupinfo = None) -> Optional[str]:
+        # Version of an executable as reported by running it with the given args
+        # parse is given the first line of output and returns the version string
+        # Returns None if the executable does not exist
+        resolved = os.path.realpath(exe)
+        key = "exe:{0}:{1}".format(resolved, " ".join(args))
+        def probe() -> Optional[str]:
+            try:
+                res = subprocess.run([exe, *args], startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                        stdin=subprocess.DEVNULL, timeout=10)
+                return parse(res.stdout.decode(errors="replace").split("\n")[0])
+            except (OSError, subprocess.SubprocessError):
+                return None
+        return self.__lookup(key, resolved, probe, "")
+
+    def file_version(self, path: str) -> Optional[str]:
+        # Version from the first line of a version.txt file
+        # Returns None if the file does not exist
+        resolved = os.path.realpath(path)
+        key = "file:{0}".format(resolved)
+        def probe() -> Optional[str]:
+            try:
+                with open(resolved, 'r') as fp:
+                    return fp.readline().replace("\r", "").replace("\n", "")
+            except (OSError, UnicodeDecodeError):
+                return None
+        return self.__lookup(key, resolved, probe, "unknown")
+
+    def save(self):
+        # Write cache to disk if anything changed since the last save
+        with self.__lock:
+            if not self.__dirty:
+                return
+            data = {"version": self.__CACHE_VERSION, "entries": self.__entries}
+            self.__dirty = False
+        tmp_file = self.__CACHE_FILE + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.__CACHE_FILE), exist_ok=True)
+            with open(tmp_file, "w") as fp:
+                json.dump(data, fp)
+            os.replace(tmp_file, self.__CACHE_FILE)
+        except OSError:
+            pass
+
+
+version_cache: VersionCache = VersionCache()
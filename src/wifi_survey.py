@@ -0,0 +1,149 @@
+import re
+from typing import List, Optional
+
+
+# Scans from the robot's radio. ap-force is needed since wlan0 is running the robot's access point.
+SCAN_COMMAND = "sudo iw dev wlan0 scan ap-force"
+
+# Signal (dBm) treated as no interference at all
+NOISE_FLOOR = -95.0
+
+# Width (MHz) of a 2.4 GHz transmission. Channels are 5 MHz apart so neighbours up to 4 channels away overlap.
+CHANNEL_WIDTH = 22.0
+
+# Channels that don't overlap each other (preferred when scores are about equal)
+NON_OVERLAPPING = [1, 6, 11]
+
+# Scores closer than this are treated as equal when recommending a channel
+SCORE_RESOLUTION = 5.0
+
+
+def channel_freq(channel: int) -> int:
+    # Center frequency (MHz) of a 2.4 GHz channel
+    if channel == 14:
+        return 2484
+    return 2407 + 5 * channel
+
+
+def freq_channel(freq: float) -> Optional[int]:
+    # 2.4 GHz channel for a center frequency (None for other bands)
+    if freq == 2484:
+        return 14
+    if 2412 <= freq <= 2472:
+        return int(round((freq - 2407) / 5))
+    return None
+
+
+def allowed_channels(country: str) -> List[int]:
+    # Channels 12 and 13 can't be used in North America, channel 14 is only allowed in Japan
+    if country in ["US", "CA"]:
+        return list(range(1, 12))
+    elif country == "JP":
+        return list(range(1, 15))
+    return list(range(1, 14))
+
+
+class AccessPoint:
+    def __init__(self, bssid: str):
+        self.bssid = bssid
+        self.ssid = ""
+        self.freq = 0.0
+        self.signal = NOISE_FLOOR
+        # Offset (MHz) of the secondary 20 MHz channel of a 40 MHz network (0 if 20 MHz)
+        self.secondary_offset = 0
+
+    @property
+    def channel(self) -> Optional[int]:
+        return freq_channel(self.freq)
+
+    @property
+    def strength(self) -> float:
+        # dB above the noise floor
+        return max(0.0, self.signal - NOISE_FLOOR)
+
+    def overlap(self, channel: int) -> float:
+        # Fraction (0 to 1) of this network's transmission that overlaps the given channel
+        freq = channel_freq(channel)
+        centers = [self.freq]
+        if self.secondary_offset != 0:
+            centers.append(self.freq + self.secondary_offset)
+        return max(max(0.0, 1.0 - abs(freq - c) / CHANNEL_WIDTH) for c in centers)
+
+
+class ScanParser:
+    """
+    Parses "iw dev <dev> scan" output one line at a time so networks can be shown while the scan runs
+    """
+    __BSS_RE = re.compile(r"^BSS ([0-9a-fA-F:]{17})")
+    __FREQ_RE = re.compile(r"^\s*freq:\s*([0-9.]+)")
+    __SIGNAL_RE = re.compile(r"^\s*signal:\s*(-?[0-9.]+)\s*dBm")
+    __SSID_RE = re.compile(r"^\s*SSID:\s?(.*)$")
+    __SECONDARY_RE = re.compile(r"^\s*\*\s*secondary channel offset:\s*(\w+)")
+
+    def __init__(self):
+        self.access_points: List[AccessPoint] = []
+        self.__current: Optional[AccessPoint] = None
+
+    def feed_line(self, line: str):
+        line = line.rstrip("\r\n")
+        match = self.__BSS_RE.match(line)
+        if match is not None:
+            self.__current = AccessPoint(match.group(1).lower())
+            self.access_points.append(self.__current)
+            return
+        ap = self.__current
+        if ap is None:
+            return
+        match = self.__FREQ_RE.match(line)
+        if match is not None:
+            ap.freq = float(match.group(1))
+            return
+        match = self.__SIGNAL_RE.match(line)
+        if match is not None:
+            ap.signal = float(match.group(1))
+            return
+        match = self.__SSID_RE.match(line)
+        if match is not None and ap.ssid == "":
+            ap.ssid = match.group(1).strip()
+            return
+        match = self.__SECONDARY_RE.match(line)
+        if match is not None:
+            offset = match.group(1).lower()
+            if offset == "above":
+                ap.secondary_offset = 20
+            elif offset == "below":
+                ap.secondary_offset = -20
+
+    @property
+    def networks_2ghz(self) -> List[AccessPoint]:
+        return [ap for ap in self.access_points if ap.channel is not None]
+
+
+class ChannelScore:
+    def __init__(self, channel: int, networks: int, score: float):
+        self.channel = channel
+        # Networks that overlap this channel at all
+        self.networks = networks
+        # Sum of overlap * strength of all networks (lower is better)
+        self.score = score
+
+
+def score_channels(aps: List[AccessPoint], channels: List[int]) -> List[ChannelScore]:
+    scores = []
+    for channel in channels:
+        networks = 0
+        score = 0.0
+        for ap in aps:
+            overlap = ap.overlap(channel)
+            if overlap > 0:
+                networks += 1
+                score += overlap * ap.strength
+        scores.append(ChannelScore(channel, networks, score))
+    return scores
+
+
+def recommend(scores: List[ChannelScore]) -> Optional[ChannelScore]:
+    # Least interference. Ties go to non-overlapping channels, then fewer networks.
+    if len(scores) == 0:
+        return None
+    return min(scores, key=lambda s: (round(s.score / SCORE_RESOLUTION), s.channel not in NON_OVERLAPPING, s.networks, s.channel))
@@ -0,0 +1,74 @@
+from typing import List, Optional
+from ui_wifi_survey_dialog import Ui_WifiSurveyDialog
+from PySide6.QtWidgets import QDialog, QTableWidgetItem, QWidget
+from PySide6.QtGui import QFont
+from wifi_survey import AccessPoint, ChannelScore, recommend
+
+
+class WifiSurveyDialog(QDialog):
+    """
+    Shows the results of a Wi-Fi scan from the robot and lets the user pick a channel.
+    The dialog is accepted when a channel is chosen (see selected_channel).
+    """
+    def __init__(self, aps: List[AccessPoint], scores: List[ChannelScore], current_channel: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+
+        self.ui = Ui_WifiSurveyDialog()
+        self.ui.setupUi(self)
+
+        self.scores = scores
+        self.recommended = recommend(scores)
+
+        self.ui.btn_use_channel.clicked.connect(self.accept)
+        self.ui.tbl_channels.itemSelectionChanged.connect(self.selection_changed)
+
+        self.populate_channels(current_channel)
+        self.populate_networks(aps)
+
+    def populate_channels(self, current_channel: str):
+        if self.recommended is None:
+            self.ui.lbl_summary.setText(self.tr("No channels available."))
+            self.ui.btn_use_channel.setEnabled(False)
+            return
+
+        current = None
+        self.ui.tbl_channels.setRowCount(len(self.scores))
+        for row, score in enumerate(self.scores):
+            values = [str(score.channel), str(score.networks), "{0:.0f}".format(score.score)]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if score is self.recommended:
+                    font = QFont(item.font())
+                    font.setBold(True)
+                    item.setFont(font)
+                self.ui.tbl_channels.setItem(row, col, item)
+            if str(score.channel) == current_channel:
+                current = score
+        self.ui.tbl_channels.resizeColumnsToContents()
+
+        text = self.tr("Recommended channel: {0}.").format(self.recommended.channel)
+        if current is not None:
+            text += " " + self.tr("The robot currently uses channel {0}.").format(current.channel)
+        text += " " + self.tr("Interference is the total signal strength (dB above noise) of networks overlapping each channel. Lower is better.")
+        self.ui.lbl_summary.setText(text)
+
+        self.ui.tbl_channels.selectRow(self.scores.index(self.recommended))
+
+    def populate_networks(self, aps: List[AccessPoint]):
+        aps = sorted(aps, key=lambda ap: -ap.signal)
+        self.ui.lbl_networks.setText(self.tr("Networks Found ({0})").format(len(aps)))
+        self.ui.tbl_networks.setRowCount(len(aps))
+        for row, ap in enumerate(aps):
+            values = [ap.ssid, ap.bssid, str(ap.channel), "{0:.0f}".format(ap.signal)]
+            for col, value in enumerate(values):
+                self.ui.tbl_networks.setItem(row, col, QTableWidgetItem(value))
+        self.ui.tbl_networks.resizeColumnsToContents()
+
+    def selection_changed(self):
+        self.ui.btn_use_channel.setEnabled(self.selected_channel() is not None)
+
+    def selected_channel(self) -> Optional[int]:
+        rows = self.ui.tbl_channels.selectionModel().selectedRows()
+        if len(rows) == 0:
+            return None
+        return self.scores[rows[0].row()].channel
@@ -0,0 +1,236 @@
+import shlex
+import threading
+import traceback
+from enum import Enum, auto
+from typing import Callable, Optional
+
+
+class WritableState(Enum):
+    Unknown = auto()
+    Readonly = auto()
+    ReadWrite = auto()
+
+
+def parse_mount_options(options: str) -> WritableState:
+    # Comma separated mount options (as in mount output or /proc/self/mountinfo)
+    opts_list = options.strip().split(",")
+    if "ro" in opts_list:
+        return WritableState.Readonly
+    elif "rw" in opts_list:
+        return WritableState.ReadWrite
+    else:
+        return WritableState.Unknown
+
+
+# Prints the mount options of the root filesystem once, then again each time they change.
+# The kernel flags /proc/self/mountinfo (POLLPRI) when the mount table changes, so this does not wake
+# up unless something is remounted. Falls back to a slow shell loop on images without python3.
+_MOUNT_WATCH_PY = """
+import select
+f = open("/proc/self/mountinfo")
+p = select.poll()
+p.register(f, select.POLLPRI | select.POLLERR)
+prev = None
+while True:
+    f.seek(0)
+    cur = ""
+    for line in f.read().splitlines():
+        parts = line.split()
+        if len(parts) > 5 and parts[4] == "/":
+            cur = parts[5]
+    if cur != prev:
+        print(cur, flush=True)
+        prev = cur
+    p.poll(10000)
+"""
+
+_MOUNT_WATCH_SH = "prev=; while :; do cur=$(awk '$5==\"/\"{o=$6} END{print o}' /proc/self/mountinfo); " \
+    "if [ \"$cur\" != \"$prev\" ]; then echo \"$cur\"; prev=$cur; fi; sleep 1; done"
+
+MOUNT_WATCH_COMMAND = "if command -v python3 > /dev/null; then exec python3 -u -c {0}; else {1}; fi".format(
+    shlex.quote(_MOUNT_WATCH_PY), _MOUNT_WATCH_SH)
+
+
+class WritableStateCache:
+    """
+    Last known writable state of the robot's root filesystem. Updated by the mount watcher and
+    by our own rw / ro remounts so checking the state does not need a command on the robot.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__state = WritableState.Unknown
+
+    @property
+    def state(self) -> WritableState:
+        with self.__lock:
+            return self.__state
+
+    def set(self, state: WritableState):
+        with self.__lock:
+            self.__state = state
+
+    def clear(self):
+        self.set(WritableState.Unknown)
+
+
+class WritableSession:
+    """
+    Reference counted window during which the robot's root filesystem is writable.
+    Operations that modify the robot use "with session:" (on the ssh queue, as entering may remount and wait
+    for the session lock, so never on the UI thread). The filesystem is made writable when the
+    first operation starts (if needed). When the last one ends, the original read-only state is restored
+    after a short linger, so back to back operations share one rw window instead of remounting each time.
+    Restoring runs through schedule (which runs a function on the serial ssh queue). flush, reset, and
+    user_changed never wait for the session lock (held across remounts), so they are safe on the UI thread.
+    """
+    def __init__(self, check: Callable[[], WritableState], make_writable: Callable[[], None],
+            make_readonly: Callable[[], None], schedule: Callable[[Callable[[], None]], None], linger: float = 5.0):
+        self.__check = check
+        self.__make_writable = make_writable
+        self.__make_readonly = make_readonly
+        self.__schedule = schedule
+        self.__linger = linger
+
+        # Held by operations (including across remounts)
+        self.__lock = threading.RLock()
+        self.__count = 0
+        # True while this session has made the filesystem writable (or found it writable)
+        self.__active = False
+        # True if the filesystem was read-only before the session and must be restored
+        self.__restore = False
+
+        # Guards the linger timer and generation (never held for long)
+        self.__timer_lock = threading.Lock()
+        self.__timer: Optional[threading.Timer] = None
+        # Incremented to cancel a restore already handed to schedule
+        self.__timer_id = 0
+        # Incremented by reset. The session state is cleared by the next operation holding the lock.
+        self.__generation = 0
+        self.__seen_generation = 0
+
+        # Generations of the operations entered on each thread (see __enter__)
+        self.__held = threading.local()
+
+    def __cancel_timer(self):
+        # Must be called with timer lock held
+        self.__timer_id += 1
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def __sync(self) -> int:
+        # Must be called with lock held. Applies a reset made since the last call. Returns the current generation.
+        with self.__timer_lock:
+            generation = self.__generation
+        if generation != self.__seen_generation:
+            self.__seen_generation = generation
+            self.__count = 0
+            self.__active = False
+            self.__restore = False
+        return generation
+
+    def acquire(self) -> int:
+        # Returns the generation to pass to release
+        with self.__lock:
+            generation = self.__sync()
+            self.__count += 1
+            with self.__timer_lock:
+                self.__cancel_timer()
+            if self.__active:
+                return generation
+            try:
+                orig_state = self.__check()
+                if orig_state != WritableState.ReadWrite:
+                    self.__make_writable()
+            except:
+                self.__count -= 1
+                raise
+            self.__restore = orig_state == WritableState.Readonly
+            self.__active = True
+            return generation
+
+    def release(self, generation: int):
+        with self.__lock:
+            if self.__sync() != generation:
+                # Session was reset while this operation ran
+                return
+            self.__count -= 1
+            if self.__count == 0 and self.__active:
+                with self.__timer_lock:
+                    self.__cancel_timer()
+                    timer_id = self.__timer_id
+                    # The timer only hands the restore to schedule
+                    self.__timer = threading.Timer(self.__linger, self.__schedule, args=(lambda: self.__expire(generation, timer_id),))
+                    self.__timer.daemon = True
+                    self.__timer.start()
+
+    def __expire(self, generation: int, timer_id: int):
+        with self.__lock:
+            with self.__timer_lock:
+                if timer_id != self.__timer_id:
+                    # Cancelled after being scheduled
+                    return
+                self.__timer = None
+            if self.__sync() != generation or self.__count != 0 or not self.__active:
+                return
+            try:
+                self.__end()
+            except Exception:
+                traceback.print_exc()
+
+    def __end(self):
+        # Must be called with lock held
+        self.__active = False
+        if self.__restore:
+            self.__restore = False
+            self.__make_readonly()
+
+    def __flush(self, generation: int):
+        with self.__lock:
+            if self.__sync() != generation or not self.__active:
+                return
+            try:
+                self.__end()
+            except Exception:
+                traceback.print_exc()
+
+    def flush(self):
+        # Restore the original state now (eg before disconnecting), even if operations are still running.
+        # Does not wait. The restore runs through schedule.
+        with self.__timer_lock:
+            self.__cancel_timer()
+            generation = self.__generation
+        self.__schedule(lambda: self.__flush(generation))
+
+    def reset(self):
+        # Forget the session without changing the robot (connection closed or lost)
+        with self.__timer_lock:
+            self.__cancel_timer()
+            self.__generation += 1
+
+    def __user_changed(self, generation: int):
+        with self.__lock:
+            if self.__sync() != generation:
+                return
+            self.__restore = False
+            if self.__count == 0:
+                # Check the state again at the start of the next session
+                self.__active = False
+
+    def user_changed(self):
+        # The user changed the state manually. It is not restored at the end of the session.
+        # A pending restore is cancelled now. The rest is done through schedule.
+        with self.__timer_lock:
+            self.__cancel_timer()
+            generation = self.__generation
+        self.__schedule(lambda: self.__user_changed(generation))
+
+    def __enter__(self) -> 'WritableSession':
+        generation = self.acquire()
+        if not hasattr(self.__held, "generations"):
+            self.__held.generations = []
+        self.__held.generations.append(generation)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release(self.__held.generations.pop())
@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from camstream_config import CamstreamConfig
+
+
+class CamstreamConfigTest(unittest.TestCase):
+    def test_edit_keeps_extra_arguments(self):
+        text = "--driver libcamera\n--width 640\n--height 480\n--vflip\n--foo bar\n"
+        model = CamstreamConfig.parse(text)
+
+        # As CamstreamDialog.get_config does: UI fields set on top of a copy of the parsed config
+        edited = model.copy()
+        edited.set("--width", "1280")
+        edited.set("--height", "720")
+        edited.set("--vflip", False)
+
+        self.assertEqual(edited.serialize(), "--driver libcamera\n--width 1280\n--height 720\n--foo bar\n")
+        self.assertEqual(edited.diff(model), {
+            "--width": ("1280", "640"),
+            "--height": ("720", "480"),
+            "--vflip": (None, "")
+        })
+        # The parsed config is not changed by editing the copy
+        self.assertEqual(model.serialize(), text)
+
+    def test_unchanged_config_is_equal(self):
+        text = "--driver libcamera\n--foo bar\n"
+        model = CamstreamConfig.parse(text)
+        self.assertEqual(model.copy(), model)
+        self.assertEqual(CamstreamConfig.parse(model.copy().serialize()), model)
+
+
+if __name__ == "__main__":
+    unittest.main()